@@ -2,9 +2,12 @@ from dotenv import load_dotenv
 from flask import Flask
 from flask_cors import CORS
 from routes.upload_post import upload_bp
+from routes.resumable_upload import resumable_bp
 from routes.openrouter import openrouter_bp
 from routes.spoof import spoof_bp
 from routes.job_checker import job_checker_bp
+from routes.metrics import metrics_bp
+from routes.thumbnails import thumbnail_bp
 from internal.video import video_bp
 from internal.account import account_bp
 from internal.group import group_bp
@@ -26,12 +29,15 @@ app = Flask(__name__)
 CORS(app)
 
 app.register_blueprint(upload_bp)
+app.register_blueprint(resumable_bp)
 app.register_blueprint(openrouter_bp)
 app.register_blueprint(video_bp)
 app.register_blueprint(account_bp)
 app.register_blueprint(group_bp)
 app.register_blueprint(spoof_bp)
 app.register_blueprint(job_checker_bp)
+app.register_blueprint(metrics_bp)
+app.register_blueprint(thumbnail_bp)
 
 if __name__ == '__main__':
     start_scheduler()
@@ -0,0 +1,397 @@
+"""
+Offline simulation of autoposting over days of operation.
+
+Run from the endpoints directory:
+    python -m benchmarks.autopost_sim [--accounts 100] [--days 7] [--demand 1.0] [--failure-rate 0.02]
+
+A population of autoposting accounts sends `scheduled_date=auto` uploads at
+random times (Poisson, --demand times the account's posts per day summed over
+its platforms). Each
+upload goes through the real @auto_schedule and @track_upload decorators and
+the upload event subscribers. The job checker runs every 5 simulated minutes.
+Everything runs on a virtual clock against an in-memory SQLite DB. A fake
+Upload-Post accepts the uploads and reports scheduled jobs as posted (or
+failed, at --failure-rate) once their slot has passed.
+
+Reported per simulated day: uploads, posts, DB statements and planner time.
+The summary covers the slot distribution by CET hour, gaps between an
+account's posts on a platform, posts per day against each platform's
+daily_posts, downtime violations and the busiest minute for Upload-Post.
+Scheduling changes can be compared by running it before and after, with the
+same --seed.
+"""
+import os
+
+# The import-time init_db runs against a throwaway DB, the simulation gets its own below
+os.environ['DB_PATH'] = ':memory:'
+
+import argparse
+import heapq
+import logging
+import random
+import sqlite3
+import statistics
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta, timezone
+from flask import Flask, jsonify, g
+import models.db as db
+import scheduling_core.slots as slot_planner
+from scheduling_core import parse_iso, get_zone
+import utils.auto_schedule as auto_schedule_module
+import utils.events as events
+import utils.job_checker as job_checker
+import utils.schedule_horizon as schedule_horizon
+import utils.upload_subscribers as upload_subscribers
+import utils.bulk_planner as bulk_planner
+import utils.schedule_load as schedule_load
+from utils.auto_schedule import auto_schedule
+from utils.external_wrapper import track_upload
+
+CET = get_zone('Europe/Berlin')
+JOB_CHECK_MINUTES = 5
+MEMORY_DB = 'file:autopost_sim?mode=memory&cache=shared'
+
+
+# ===== VIRTUAL CLOCK =====
+
+class VirtualClock:
+    """Simulated UTC time, moved forward by the event loop"""
+
+    def __init__(self, start):
+        self.now = start
+
+    def advance_to(self, moment):
+        self.now = max(self.now, moment)
+
+
+def clocked_datetime(clock):
+    """A datetime class whose utcnow/now read the virtual clock"""
+
+    class ClockedDatetime(datetime):
+        @classmethod
+        def utcnow(cls):
+            return clock.now
+
+        @classmethod
+        def now(cls, tz=None):
+            aware = clock.now.replace(tzinfo=timezone.utc)
+            return aware.astimezone(tz) if tz else aware.replace(tzinfo=None)
+
+    return ClockedDatetime
+
+
+def install_clock(clock):
+    """Point every module that reads the time during scheduling at the virtual clock"""
+    clocked = clocked_datetime(clock)
+    for module in (db, slot_planner, auto_schedule_module, events, job_checker,
+                   schedule_horizon, upload_subscribers, bulk_planner, schedule_load):
+        module.datetime = clocked
+
+
+# ===== INSTRUMENTATION =====
+
+class Stats:
+    """Counters the simulation collects, bucketed by simulated day"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.day = 0
+        self.db_ops = Counter()
+        self.db_ops_by_kind = Counter()
+        self.planner_seconds = Counter()
+        self.planner_calls = Counter()
+        self.uploads = Counter()
+        self.posts = Counter()
+        self.failures = Counter()
+
+    def count_statement(self, sql):
+        kind = sql.lstrip().split(None, 1)[0].upper() if sql.strip() else 'OTHER'
+        with self._lock:
+            self.db_ops[self.day] += 1
+            self.db_ops_by_kind[kind] += 1
+
+    def add_planner_time(self, seconds):
+        with self._lock:
+            self.planner_seconds[self.day] += seconds
+            self.planner_calls[self.day] += 1
+
+
+def install_memory_db(stats):
+    """An in-memory DB shared by all connections, with every statement counted"""
+    anchor = sqlite3.connect(MEMORY_DB, uri=True)
+
+    def get_connection():
+        conn = sqlite3.connect(MEMORY_DB, uri=True)
+        conn.row_factory = sqlite3.Row
+        conn.set_trace_callback(stats.count_statement)
+        return conn
+
+    db.get_connection = get_connection
+    db.init_db()
+    return anchor
+
+
+def install_planner_timer(stats):
+    """Time every call into the slot planner, wherever it comes from"""
+    plan = slot_planner.plan_upload_times
+
+    def timed_plan(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return plan(*args, **kwargs)
+        finally:
+            stats.add_planner_time(time.perf_counter() - started)
+
+    slot_planner.plan_upload_times = timed_plan
+    schedule_horizon.plan_upload_times = timed_plan
+
+
+# ===== FAKE UPLOAD-POST =====
+
+class FakeUploadPost:
+    """Accepts uploads like Upload-Post and reports scheduled jobs once their time has come"""
+
+    def __init__(self, clock, stats, failure_rate, rnd):
+        self.clock = clock
+        self.stats = stats
+        self.failure_rate = failure_rate
+        self.rnd = rnd
+        self.jobs = {}
+        self.results = {}
+        # (account key, platform, UTC datetime, scheduled) of every post that went out
+        self.posted = []
+
+    def upload(self, account_key, platforms, scheduled_date):
+        if scheduled_date:
+            job_id = uuid.uuid4().hex
+            self.jobs[job_id] = (account_key, platforms, scheduled_date)
+            return {'job_id': job_id, 'scheduled_date': scheduled_date}
+
+        self._post(account_key, platforms, self.clock.now, scheduled=False)
+        return {'results': {p: {'success': True, 'url': f'https://example.com/{uuid.uuid4().hex[:8]}'}
+                            for p in platforms}}
+
+    def _post(self, account_key, platforms, moment, scheduled=True):
+        for platform in platforms:
+            self.posted.append((account_key, platform, moment, scheduled))
+            self.stats.posts[self.stats.day] += 1
+
+    def history(self, limit=100):
+        """Jobs whose slot has passed, decided once each"""
+        now = self.clock.now
+        for job_id, (account_key, platforms, scheduled_date) in list(self.jobs.items()):
+            slot = parse_iso(scheduled_date).astimezone(timezone.utc).replace(tzinfo=None)
+            if slot > now:
+                continue
+            del self.jobs[job_id]
+            success = self.rnd.random() >= self.failure_rate
+            if success:
+                self._post(account_key, platforms, slot)
+            else:
+                self.stats.failures[self.stats.day] += 1
+            self.results[job_id] = {'job_id': job_id, 'success': success, 'platform': platforms[0],
+                                    'post_url': f'https://example.com/{job_id[:8]}' if success else ''}
+        # Like the real /history, only the latest `limit` items
+        for job_id in list(self.results)[:-limit]:
+            del self.results[job_id]
+        return list(self.results.values())
+
+
+# ===== POPULATION =====
+
+def random_downtime(rnd, downtime_hours):
+    """A window of downtime_hours around 02:00 CET, like the bot generates"""
+    center = 2 + rnd.uniform(-1, 1)
+    start = (center - downtime_hours / 2) % 24
+    end = (center + downtime_hours / 2) % 24
+    return f'{int(start):02d}:{rnd.randint(0, 59):02d}', f'{int(end):02d}:{rnd.randint(0, 59):02d}'
+
+
+def create_population(n, rnd):
+    accounts = []
+    for i in range(n):
+        platforms = rnd.sample(['tiktok', 'instagram', 'youtube', 'x'], rnd.randint(1, 2))
+        downtime_hours = rnd.randint(6, 10)
+        downtime_start, downtime_end = random_downtime(rnd, downtime_hours)
+        autopost = {
+            'enabled': True,
+            'posting_frequency': 'daily',
+            'daily_posts': {p: rnd.randint(1, 15) for p in platforms},
+            'downtime_hours': downtime_hours,
+            'downtime_start': downtime_start,
+            'downtime_end': downtime_end,
+        }
+        user_id = str(1000 + i % max(n // 5, 1))
+        username = f'sim{i}'
+        db.create_account(user_id, username, platforms, is_ai=True, autoposting_properties=autopost)
+        accounts.append({'user_id': user_id, 'username': username, 'platforms': platforms, 'autopost': autopost})
+    return accounts
+
+
+# ===== SIMULATION =====
+
+def build_app(fake, accounts_by_key):
+    """A minimal upload route with the production scheduling and tracking decorators"""
+    app = Flask(__name__)
+
+    @app.route('/upload-video', methods=['POST'])
+    @auto_schedule
+    @track_upload
+    def upload():
+        from flask import request
+        account = accounts_by_key[(request.form['user_id'], request.form['user'])]
+        # Auto-scheduling narrows the post to the platforms whose slot it took
+        platforms = getattr(g, 'upload_platforms', None) or account['platforms']
+        response = fake.upload((account['user_id'], account['username']), platforms,
+                               getattr(g, 'upload_time', None))
+        return jsonify(response), 202 if response.get('job_id') else 200
+
+    return app
+
+
+def run(args):
+    rnd = random.Random(args.seed)
+    random.seed(args.seed)
+
+    start = datetime(2025, 3, 24, 0, 0) if args.start is None else datetime.fromisoformat(args.start)
+    clock = VirtualClock(start)
+    stats = Stats()
+    install_clock(clock)
+    anchor = install_memory_db(stats)
+    install_planner_timer(stats)
+
+    fake = FakeUploadPost(clock, stats, args.failure_rate, rnd)
+    job_checker.fetch_upload_history = fake.history
+    job_checker.send_telegram_message = lambda user_id, message: None
+
+    accounts = create_population(args.accounts, rnd)
+    accounts_by_key = {(a['user_id'], a['username']): a for a in accounts}
+    client = build_app(fake, accounts_by_key).test_client()
+
+    end = start + timedelta(days=args.days)
+    queue = []
+    for account in accounts:
+        rate = args.demand * sum(account['autopost']['daily_posts'].values()) / (24 * 60)
+        moment = start + timedelta(minutes=rnd.expovariate(rate))
+        heapq.heappush(queue, (moment, 'upload', account['username'], account))
+    moment = start
+    while moment < end:
+        heapq.heappush(queue, (moment, 'job_check', '', None))
+        moment += timedelta(minutes=JOB_CHECK_MINUTES)
+
+    while queue:
+        moment, kind, _, account = heapq.heappop(queue)
+        if moment >= end:
+            break
+        clock.advance_to(moment)
+        stats.day = (moment - start).days
+
+        if kind == 'job_check':
+            job_checker.check_scheduled_jobs()
+            continue
+
+        stats.uploads[stats.day] += 1
+        client.post('/upload-video', data={
+            'user_id': account['user_id'], 'user': account['username'], 'scheduled_date': 'auto',
+            'title': 'simulated', 'platforms': '["' + '","'.join(account['platforms']) + '"]',
+            'video_id': uuid.uuid4().hex,
+        })
+        events.flush(30)
+
+        rate = args.demand * sum(account['autopost']['daily_posts'].values()) / (24 * 60)
+        heapq.heappush(queue, (moment + timedelta(minutes=rnd.expovariate(rate)), 'upload', account['username'], account))
+
+    anchor.close()
+    report(args, start, stats, fake, accounts_by_key)
+
+
+# ===== REPORT =====
+
+def in_downtime(moment_utc, autopost):
+    """Whether a UTC moment falls into the account's CET downtime window"""
+    local = moment_utc.replace(tzinfo=timezone.utc).astimezone(CET)
+    minute = local.hour * 60 + local.minute
+    start_h, start_m = map(int, autopost['downtime_start'].split(':'))
+    end_h, end_m = map(int, autopost['downtime_end'].split(':'))
+    start, end = start_h * 60 + start_m, end_h * 60 + end_m
+    if start <= end:
+        return start <= minute < end
+    return minute >= start or minute < end
+
+
+def report(args, start, stats, fake, accounts_by_key):
+    print(f"\n{args.accounts} accounts, {args.days} days, demand {args.demand}x, failure rate {args.failure_rate}\n")
+    print(f"{'day':>4} {'uploads':>8} {'posts':>7} {'failed':>7} {'db ops':>8} {'planner ms':>11} {'plans':>6}")
+    for day in range(args.days):
+        print(f"{day:>4} {stats.uploads[day]:>8} {stats.posts[day]:>7} {stats.failures[day]:>7} "
+              f"{stats.db_ops[day]:>8} {stats.planner_seconds[day] * 1000:>11.1f} {stats.planner_calls[day]:>6}")
+    print(f"\nDB statements by kind: {dict(stats.db_ops_by_kind.most_common())}")
+
+    by_account = defaultdict(list)
+    for key, platform, moment, scheduled in fake.posted:
+        by_account[key, platform].append((moment, scheduled))
+
+    hours = Counter(m.replace(tzinfo=timezone.utc).astimezone(CET).hour for _, _, m, _ in fake.posted)
+    peak = max(hours.values()) if hours else 1
+    print("\nPosts by CET hour:")
+    for hour in range(24):
+        print(f"  {hour:02d}h {hours[hour]:>6} {'#' * round(40 * hours[hour] / peak)}")
+
+    gaps, ratios, violations = [], [], Counter()
+    for (key, platform), posts in by_account.items():
+        posts.sort()
+        gaps.extend((b - a).total_seconds() / 60 for (a, _), (b, _) in zip(posts, posts[1:]))
+        autopost = accounts_by_key[key]['autopost']
+        target = autopost['daily_posts'][platform]
+        ratios.append(len(posts) / args.days / target)
+        for moment, scheduled in posts:
+            if in_downtime(moment, autopost):
+                violations['scheduled' if scheduled else 'immediate'] += 1
+
+    if gaps:
+        ordered = sorted(gaps)
+        print(f"\nGap between an account's posts on a platform (min): min {ordered[0]:.1f} | "
+              f"median {statistics.median(ordered):.1f} | p95 {ordered[int(0.95 * (len(ordered) - 1))]:.1f} | "
+              f"max {ordered[-1]:.1f}")
+    if ratios:
+        print(f"Posts per day / target: mean {statistics.mean(ratios):.2f} | "
+              f"min {min(ratios):.2f} | max {max(ratios):.2f}")
+    immediate = sum(1 for _, _, _, scheduled in fake.posted if not scheduled)
+    print(f"Downtime violations: {violations['scheduled']} scheduled posts, {violations['immediate']} "
+          f"immediate ones (of {immediate} posted right away because their slot had passed), "
+          f"{len(fake.posted)} posts in total")
+
+    # One scheduled upload reaches Upload-Post once, whatever its platforms
+    minutes = Counter(moment.strftime('%Y-%m-%dT%H:%M') for _, moment in
+                      {(key, moment) for key, _, moment, scheduled in fake.posted if scheduled})
+    ceiling = schedule_load.SCHEDULE_MINUTE_CEILING
+    print(f"Scheduled posts per minute: busiest {max(minutes.values(), default=0)} | "
+          f"{sum(1 for count in minutes.values() if ceiling and count > ceiling)} minutes over the ceiling of {ceiling}")
+
+    total_planner = sum(stats.planner_seconds.values())
+    print(f"Planner: {total_planner * 1000:.1f} ms over {sum(stats.planner_calls.values())} calls | "
+          f"DB: {sum(stats.db_ops.values()) / max(args.days, 1):.0f} statements per simulated day")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--accounts', type=int, default=100)
+    parser.add_argument('--days', type=int, default=7)
+    parser.add_argument('--demand', type=float, default=1.0,
+                        help='uploads per day as a multiple of each account\'s posts per day')
+    parser.add_argument('--failure-rate', type=float, default=0.02)
+    parser.add_argument('--start', help='simulated start, naive UTC ISO (default 2025-03-24, spans a DST change with --days 7)')
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    # Failed jobs are part of the scenario, not worth a log line each
+    logging.getLogger('utils.job_checker').setLevel(logging.CRITICAL)
+    run(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+"""
+Benchmark and cross-check for the vectorized slot planner.
+
+Run from the endpoints directory:
+    python -m benchmarks.bulk_planner_bench [--accounts 10000 100000] [--slots 1] [--check 5000]
+
+First checks, for --check random accounts, that utils.bulk_planner returns
+exactly what scheduling_core's plan_upload_times returns given the same random
+draws. Accounts are drawn with random zones, post counts, downtime windows
+(including ones crossing midnight and DST change hours) and last slots spread
+over several years, so DST changes fall in between. Then times both planners
+for each --accounts size.
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta, timezone
+import numpy as np
+import scheduling_core.slots as slot_planner
+from utils.bulk_planner import plan_bulk, plan_accounts, format_slots, account_arrays
+
+
+class ScriptedRandom:
+    """
+    Stands in for the random module in scheduling_core.slots, handing out fixed draws.
+    uniform is drawn once per slot, randint only for slots that hit downtime,
+    so it returns the delay of the slot the last uniform was drawn for.
+    """
+
+    def __init__(self, fluctuations, delays):
+        self._fluctuations = fluctuations
+        self._delays = delays
+        self._slot = -1
+
+    def uniform(self, a, b):
+        self._slot += 1
+        return self._fluctuations[self._slot]
+
+    def randint(self, a, b):
+        return self._delays[self._slot]
+
+
+TIMEZONES = ['Europe/Berlin', 'Europe/London', 'America/New_York', 'America/Sao_Paulo',
+             'Asia/Kolkata', 'Australia/Sydney', 'UTC']
+
+
+def random_account(rnd, now):
+    daily_posts = {p: rnd.randint(1, 50) for p in rnd.sample(['tiktok', 'instagram', 'youtube', 'x'], rnd.randint(1, 3))}
+    autopost = {'enabled': True, 'daily_posts': daily_posts, 'downtime_hours': rnd.randint(0, 12),
+                'timezone': rnd.choice(TIMEZONES)}
+    if rnd.random() < 0.9:
+        autopost['downtime_start'] = f'{rnd.randint(0, 23):02d}:{rnd.randint(0, 59):02d}'
+        autopost['downtime_end'] = f'{rnd.randint(0, 23):02d}:{rnd.randint(0, 59):02d}'
+
+    # Future last slots only: the scalar planner reads the clock itself
+    latest = now + timedelta(minutes=rnd.randint(60, 4 * 365 * 24 * 60), seconds=rnd.randint(0, 59))
+    return {
+        'username': f'acc{rnd.randint(0, 10**9)}',
+        'autoposting_properties': autopost,
+        'scheduled_times': [latest.strftime('%Y-%m-%dT%H:%M:%SZ')],
+    }
+
+
+def check(n, slots, seed):
+    rnd = random.Random(seed)
+    now = datetime.now(timezone.utc)
+    accounts = [random_account(rnd, now) for _ in range(n)]
+    fluctuation = np.array([[rnd.uniform(-0.2, 0.2) for _ in range(slots)] for _ in range(n)])
+    delay = np.array([[rnd.randint(5, 30) for _ in range(slots)] for _ in range(n)])
+
+    base_us, minutes_per_post, downtime_start, downtime_end, now_us, zones = account_arrays(accounts)
+    bulk = [None] * n
+    for tz in set(zones):
+        rows = np.flatnonzero(zones == tz)
+        planned = format_slots(plan_bulk(base_us[rows], minutes_per_post[rows], downtime_start[rows],
+                                         downtime_end[rows], now_us, count=slots, fluctuation=fluctuation[rows],
+                                         delay=delay[rows], tz=tz)).tolist()
+        for row, account_slots in zip(rows, planned):
+            bulk[row] = account_slots
+
+    original_random = slot_planner.random
+    mismatches = 0
+    try:
+        for i, account in enumerate(accounts):
+            slot_planner.random = ScriptedRandom(fluctuation[i].tolist(), delay[i].tolist())
+            scalar = slot_planner.plan_upload_times(account, slots)
+            if scalar != bulk[i]:
+                mismatches += 1
+                if mismatches <= 5:
+                    print(f"  mismatch {account['autoposting_properties']} {account['scheduled_times']}: "
+                          f"scalar {scalar} bulk {bulk[i]}")
+    finally:
+        slot_planner.random = original_random
+
+    print(f"check: {n} accounts x {slots} slots, {mismatches} mismatches")
+    return mismatches == 0
+
+
+def bench(n, slots, seed):
+    rnd = random.Random(seed)
+    now = datetime.now(timezone.utc)
+    accounts = [random_account(rnd, now) for _ in range(n)]
+
+    started = time.perf_counter()
+    for account in accounts:
+        slot_planner.plan_upload_times(account, slots)
+    scalar_s = time.perf_counter() - started
+
+    started = time.perf_counter()
+    account_arrays(accounts)
+    prepared_s = time.perf_counter() - started
+
+    started = time.perf_counter()
+    plan_accounts(accounts, slots)
+    bulk_s = time.perf_counter() - started
+
+    print(f"{n:>7} accounts x {slots}: scalar {scalar_s * 1000:9.1f} ms | "
+          f"bulk {bulk_s * 1000:7.1f} ms (reading accounts alone {prepared_s * 1000:6.1f} ms) | "
+          f"{scalar_s / bulk_s:5.1f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--accounts', type=int, nargs='+', default=[10_000, 100_000])
+    parser.add_argument('--slots', type=int, default=1)
+    parser.add_argument('--check', type=int, default=5000)
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    if args.check and not (check(args.check, args.slots, args.seed) and check(args.check // 5, 10, args.seed + 1)):
+        raise SystemExit(1)
+    for n in args.accounts:
+        bench(n, args.slots, args.seed)
+
+
+if __name__ == '__main__':
+    main()
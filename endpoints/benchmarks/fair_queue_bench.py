@@ -0,0 +1,94 @@
+"""
+Load test for the per-user fair upload gate.
+
+Run from the endpoints directory:
+    python -m benchmarks.fair_queue_bench [--heavy-uploads 500] [--light-users 5] [--upload-ms 20]
+
+One heavy user queues a batch of uploads at once, while light users send one
+upload at a time, every --interval-ms each. Uploads are simulated with a sleep,
+so only queueing is measured. Light-user latency (wait + upload) is reported
+for three runs: the light users alone, with the heavy batch behind a plain
+FIFO semaphore of the same capacity, and with the heavy batch behind the FairGate.
+"""
+import argparse
+import statistics
+import threading
+import time
+from contextlib import contextmanager
+from utils.fair_queue import FairGate
+
+
+class FifoGate:
+    """Baseline: a global concurrency limit with no notion of users"""
+
+    def __init__(self, capacity):
+        self._semaphore = threading.Semaphore(capacity)
+
+    @contextmanager
+    def slot(self, user_id, cost=1):
+        with self._semaphore:
+            yield
+
+
+def percentile(values, p):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+
+def run_scenario(gate, heavy_uploads, light_users, light_uploads, upload_s, interval_s):
+    latencies = []
+    lock = threading.Lock()
+
+    def upload(user_id, record):
+        started = time.monotonic()
+        with gate.slot(user_id, cost=1):
+            time.sleep(upload_s)
+        if record:
+            with lock:
+                latencies.append(time.monotonic() - started)
+
+    def light_user(user_id):
+        for _ in range(light_uploads):
+            upload(user_id, record=True)
+            time.sleep(interval_s)
+
+    threads = [threading.Thread(target=upload, args=('heavy', False)) for _ in range(heavy_uploads)]
+    threads += [threading.Thread(target=light_user, args=(f'light-{i}',)) for i in range(light_users)]
+
+    started = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, time.monotonic() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--heavy-uploads', type=int, default=500)
+    parser.add_argument('--light-users', type=int, default=5)
+    parser.add_argument('--light-uploads', type=int, default=10, help='Uploads per light user')
+    parser.add_argument('--upload-ms', type=float, default=20)
+    parser.add_argument('--interval-ms', type=float, default=50)
+    parser.add_argument('--capacity', type=int, default=4)
+    parser.add_argument('--per-user', type=int, default=2)
+    args = parser.parse_args()
+
+    upload_s, interval_s = args.upload_ms / 1000, args.interval_ms / 1000
+    scenarios = [
+        ('light users alone', FairGate(args.capacity, args.per_user, 1), 0),
+        ('heavy batch, fifo', FifoGate(args.capacity), args.heavy_uploads),
+        ('heavy batch, fair', FairGate(args.capacity, args.per_user, 1), args.heavy_uploads),
+    ]
+
+    print(f"{args.light_users} light users x {args.light_uploads} uploads, heavy batch of {args.heavy_uploads}, "
+          f"{args.upload_ms:g} ms per upload, capacity {args.capacity}, {args.per_user} per user\n")
+    print(f"{'scenario':<22}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}{'total s':>10}")
+    for name, gate, heavy in scenarios:
+        latencies, total = run_scenario(gate, heavy, args.light_users, args.light_uploads, upload_s, interval_s)
+        row = [statistics.median(latencies)] + [percentile(latencies, p) for p in (95, 99, 100)]
+        print(f"{name:<22}" + ''.join(f'{v * 1000:>10.1f}' for v in row) + f'{total:>10.2f}')
+
+
+if __name__ == '__main__':
+    main()
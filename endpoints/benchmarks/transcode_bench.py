@@ -0,0 +1,73 @@
+"""
+Transcoding benchmark on clips generated locally from ffmpeg's test sources.
+
+Run from the endpoints directory:
+    python -m benchmarks.transcode_bench [--duration 10] [--platforms tiktok,instagram]
+
+For every sample clip it reports the cold transcode time (or remux, if the
+clip already fits the profile), the warm cache-hit time and the size change.
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+import ffmpeg
+from utils.transcode import transcode_video, profile_for, profile_key
+
+# (name, width, height, fps, video bitrate) - roughly what phones and editors export
+SAMPLE_CLIPS = [
+    ('4k_60fps_hevc', 3840, 2160, 60, '40M', 'libx265'),
+    ('1080x1920_30fps_highbitrate', 1080, 1920, 30, '20M', 'libx264'),
+    ('720x1280_30fps_conforming', 720, 1280, 30, '2M', 'libx264'),
+]
+
+
+def generate_clip(path, width, height, fps, bitrate, vcodec, duration):
+    """Synthesize a clip with moving test patterns and a tone"""
+    video = ffmpeg.input(f'testsrc2=size={width}x{height}:rate={fps}', f='lavfi', t=duration)
+    audio = ffmpeg.input('sine=frequency=440:sample_rate=48000', f='lavfi', t=duration)
+    (
+        ffmpeg
+        .output(video, audio, path, vcodec=vcodec, video_bitrate=bitrate, pix_fmt='yuv420p',
+                acodec='aac', audio_bitrate='192k')
+        .overwrite_output()
+        .run(quiet=True)
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--duration', type=int, default=10, help='Seconds per sample clip')
+    parser.add_argument('--platforms', default='tiktok,instagram', help='Comma-separated target platforms')
+    args = parser.parse_args()
+
+    platforms = args.platforms.split(',')
+    workdir = tempfile.mkdtemp(prefix='transcode_bench_')
+    cache_dir = os.path.join(workdir, 'cache')
+
+    print(f"Profile: {profile_key(profile_for(platforms))} ({', '.join(platforms)})")
+    print(f"{'clip':<32}{'input MB':>10}{'output MB':>11}{'cold s':>9}{'warm s':>9}{'x realtime':>12}")
+
+    try:
+        for name, width, height, fps, bitrate, vcodec in SAMPLE_CLIPS:
+            src = os.path.join(workdir, f'{name}.mp4')
+            generate_clip(src, width, height, fps, bitrate, vcodec, args.duration)
+
+            started = time.perf_counter()
+            out = transcode_video(src, platforms, cache_dir)
+            cold = time.perf_counter() - started
+
+            started = time.perf_counter()
+            transcode_video(src, platforms, cache_dir)
+            warm = time.perf_counter() - started
+
+            size_in = os.path.getsize(src) / 1e6
+            size_out = os.path.getsize(out) / 1e6
+            print(f"{name:<32}{size_in:>10.1f}{size_out:>11.1f}{cold:>9.2f}{warm:>9.3f}{args.duration / cold:>12.1f}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
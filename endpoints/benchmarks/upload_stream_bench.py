@@ -0,0 +1,113 @@
+"""
+Upload sender benchmark against a local stand-in for the Upload-Post API.
+
+Run from the endpoints directory:
+    python -m benchmarks.upload_stream_bench [--size-mb 512] [--runs 3]
+
+Compares the upload_post client (requests builds the multipart body in memory)
+with the streaming sender in utils/streaming_upload.py. Each run happens in a
+fresh process and reports client CPU seconds per GB, wall time and peak RSS.
+The sink server runs in its own process so its CPU is not counted.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import shutil
+import tempfile
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from upload_post import UploadPostClient
+from utils.streaming_upload import upload_video_streaming
+
+
+class SinkHandler(BaseHTTPRequestHandler):
+    """Reads and discards the request body, answers like a scheduled upload"""
+
+    def do_POST(self):
+        remaining = int(self.headers.get('Content-Length', 0))
+        while remaining:
+            chunk = self.rfile.read(min(remaining, 1024 * 1024))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+
+        body = json.dumps({'success': True, 'job_id': 'bench'}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def serve(port_queue):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), SinkHandler)
+    port_queue.put(server.server_address[1])
+    server.serve_forever()
+
+
+def run_upload(mode, base_url, path, results):
+    client = UploadPostClient(api_key='bench')
+    client.BASE_URL = base_url
+    kwargs = {'video_path': path, 'title': 'bench', 'user': 'bench', 'platforms': ['tiktok']}
+
+    cpu_start = os.times()
+    started = time.perf_counter()
+    if mode == 'client':
+        client.upload_video(**kwargs)
+    else:
+        upload_video_streaming(client, **kwargs)
+    wall = time.perf_counter() - started
+    cpu_end = os.times()
+
+    cpu = (cpu_end.user - cpu_start.user) + (cpu_end.system - cpu_start.system)
+    results.put((cpu, wall, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size-mb', type=int, default=512, help='Size of the generated video file')
+    parser.add_argument('--runs', type=int, default=3, help='Runs per sender, the best one is reported')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='upload_bench_')
+    path = os.path.join(workdir, 'video.mp4')
+    with open(path, 'wb') as f:
+        for _ in range(args.size_mb):
+            f.write(os.urandom(1024 * 1024))
+
+    ctx = multiprocessing.get_context('spawn')
+    port_queue = ctx.Queue()
+    server = ctx.Process(target=serve, args=(port_queue,), daemon=True)
+    server.start()
+    base_url = f'http://127.0.0.1:{port_queue.get()}'
+
+    gb = args.size_mb / 1024
+    print(f"{args.size_mb} MB file, best of {args.runs} runs")
+    print(f"{'sender':<12}{'CPU s/GB':>10}{'wall s':>9}{'MB/s':>9}{'peak RSS MB':>13}")
+
+    try:
+        for mode in ('client', 'streaming'):
+            best = None
+            for _ in range(args.runs):
+                results = ctx.Queue()
+                worker = ctx.Process(target=run_upload, args=(mode, base_url, path, results))
+                worker.start()
+                outcome = results.get()
+                worker.join()
+                if best is None or outcome[0] < best[0]:
+                    best = outcome
+
+            cpu, wall, rss = best
+            print(f"{mode:<12}{cpu / gb:>10.2f}{wall:>9.2f}{args.size_mb / wall:>9.0f}{rss:>13.0f}")
+    finally:
+        server.terminate()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,10 +1,27 @@
+import requests
+from datetime import datetime, timedelta, timezone
 from flask import Blueprint, request, jsonify
 from auth import require_token
-from models.db import create_account, get_accounts, delete_account, update_account
+from models.db import create_account, get_accounts, delete_account, update_account, get_account_by_username
+from utils.schedule_horizon import preview_slots, replan_horizons
+from utils.schedule_load import load_histogram, SCHEDULE_MINUTE_CEILING
+from utils.replan import replan_accounts, ReplanError
+from utils.resilience import CircuitOpenError
+from routes.upload_post import circuit_open_response
+from scheduling_core import is_valid_timezone, parse_iso, format_utc
 
 account_bp = Blueprint('account', __name__)
 
 
+def _invalid_timezone(autoposting_properties):
+    """The timezone an autoposting update sets, if it is not a known IANA zone"""
+    if not isinstance(autoposting_properties, dict) or 'timezone' not in autoposting_properties:
+        return None
+    tz = autoposting_properties['timezone']
+    # None falls back to the default zone
+    return None if tz is None or is_valid_timezone(tz) else str(tz)
+
+
 @account_bp.route('/add-account', methods=['POST'])
 @require_token
 def add_account():
@@ -19,6 +36,9 @@ def add_account():
     # Optional:
     is_ai = data.get('is_ai', False)
     autoposting_properties = data.get('autoposting_properties')
+    bad_timezone = _invalid_timezone(autoposting_properties)
+    if bad_timezone is not None:
+        return jsonify({'error': 'Invalid timezone', 'details': f'Unknown IANA time zone: {bad_timezone}'}), 400
     
     result = create_account(
         user_id=data['user_id'],
@@ -51,6 +71,9 @@ def update_account_route():
     # Optional fields to update
     is_ai = data.get('is_ai')
     autoposting_properties = data.get('autoposting_properties')
+    bad_timezone = _invalid_timezone(autoposting_properties)
+    if bad_timezone is not None:
+        return jsonify({'error': 'Invalid timezone', 'details': f'Unknown IANA time zone: {bad_timezone}'}), 400
     platforms = data.get('platforms')
     
     result = update_account(
@@ -104,4 +127,98 @@ def delete_account_route():
     return jsonify({
         'success': True,
         'deleted': deleted
-    }), 200
\ No newline at end of file
+    }), 200
+
+
+@account_bp.route('/schedule-preview', methods=['GET'])
+@require_token
+def schedule_preview():
+    user_id = request.args.get('user_id')
+    username = request.args.get('username')
+    
+    if not user_id or not username:
+        return jsonify({'error': 'user_id and username required'}), 400
+    
+    try:
+        count = int(request.args.get('count', 5))
+    except ValueError:
+        return jsonify({'error': 'count must be a number'}), 400
+    
+    slots = preview_slots(user_id, username, count)
+    
+    if slots is None:
+        return jsonify({'error': 'Account not found'}), 404
+    
+    return jsonify({
+        'username': username,
+        'slots': [t for t, _ in slots],
+        'platforms': [platform for _, platform in slots]
+    }), 200
+
+
+
+@account_bp.route('/schedule-load', methods=['GET'])
+@require_token
+def schedule_load():
+    try:
+        start = parse_iso(request.args['from']) if request.args.get('from') else datetime.now(timezone.utc)
+        end = parse_iso(request.args['to']) if request.args.get('to') else start + timedelta(hours=24)
+    except ValueError as e:
+        return jsonify({'error': 'Invalid from or to', 'details': str(e)}), 400
+    
+    if end <= start or end - start > timedelta(days=7):
+        return jsonify({'error': 'to must be after from, at most 7 days'}), 400
+    
+    minutes = load_histogram(start, end)
+    
+    return jsonify({
+        'from': format_utc(start),
+        'to': format_utc(end),
+        'ceiling': SCHEDULE_MINUTE_CEILING,
+        'peak': max(minutes.values(), default=0),
+        'over_ceiling': sum(1 for count in minutes.values() if SCHEDULE_MINUTE_CEILING and count > SCHEDULE_MINUTE_CEILING),
+        'minutes': minutes
+    }), 200
+
+
+@account_bp.route('/replan-schedules', methods=['POST'])
+@require_token
+def replan_schedules():
+    data = request.get_json(silent=True) or {}
+    
+    replanned = replan_horizons(data.get('user_id'))
+    
+    return jsonify({
+        'success': True,
+        'replanned': replanned
+    }), 200
+
+
+@account_bp.route('/replan-account', methods=['POST'])
+@require_token
+def replan_account():
+    data = request.get_json(silent=True) or {}
+    user_id = data.get('user_id')
+    username = data.get('username')
+    
+    if not user_id or not username:
+        return jsonify({'error': 'user_id and username required'}), 400
+    
+    account = get_account_by_username(user_id, username)
+    if not account:
+        return jsonify({'error': 'Account not found'}), 404
+    if not account.get('autoposting_properties', {}).get('enabled'):
+        return jsonify({'error': 'Autoposting not enabled for this account'}), 400
+    
+    try:
+        summary = replan_accounts(user_id, [username], dry_run=bool(data.get('dry_run')))[0]
+    except CircuitOpenError as e:
+        return circuit_open_response(e)
+    except (ReplanError, requests.RequestException) as e:
+        return jsonify({'error': 'Could not list Upload-Post scheduled jobs', 'details': str(e)}), 502
+    
+    return jsonify({
+        'success': not summary['failed'],
+        'dry_run': bool(data.get('dry_run')),
+        **summary
+    }), 207 if summary['failed'] else 200
@@ -1,3 +1,4 @@
+import requests
 from flask import Blueprint, request, jsonify
 from auth import require_token
 from models.db import (
@@ -5,6 +6,9 @@ from models.db import (
     add_accounts_to_group, delete_group,
     add_video_to_group, get_group_videos
 )
+from utils.replan import replan_accounts, ReplanError
+from utils.resilience import CircuitOpenError
+from routes.upload_post import circuit_open_response
 
 group_bp = Blueprint('group', __name__)
 
@@ -180,4 +184,38 @@ def list_group_videos():
     return jsonify({
         'videos': videos,
         'count': len(videos)
-    }), 200
\ No newline at end of file
+    }), 200
+
+
+@group_bp.route('/replan-group', methods=['POST'])
+@require_token
+def replan_group():
+    """Re-time the pending posts of every autoposting account in a group"""
+    data = request.get_json(silent=True) or {}
+    user_id = data.get('user_id')
+    group_name = data.get('group_name')
+    
+    if not all([user_id, group_name]):
+        return jsonify({'error': 'user_id and group_name required'}), 400
+    
+    group = get_group_by_name(user_id, group_name)
+    
+    if not group:
+        return jsonify({'error': 'Group not found'}), 404
+    
+    try:
+        accounts = replan_accounts(user_id, group['account_usernames'], dry_run=bool(data.get('dry_run')))
+    except CircuitOpenError as e:
+        return circuit_open_response(e)
+    except (ReplanError, requests.RequestException) as e:
+        return jsonify({'error': 'Could not list Upload-Post scheduled jobs', 'details': str(e)}), 502
+    replanned = {a['username'] for a in accounts}
+    failed = sum(len(a['failed']) for a in accounts)
+    
+    return jsonify({
+        'success': not failed,
+        'dry_run': bool(data.get('dry_run')),
+        'accounts': accounts,
+        # Group members without autoposting have no cadence to replan to
+        'skipped': [u for u in group['account_usernames'] if u not in replanned]
+    }), 207 if failed else 200
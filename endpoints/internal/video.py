@@ -1,6 +1,9 @@
 from flask import Blueprint, request, jsonify
 from auth import require_token
-from models.db import create_video, get_videos
+from utils.idempotency import idempotent
+from models.db import create_video, get_videos, update_video_media, VIDEO_MEDIA_COLUMNS
+from routes.upload_post import MEDIA_LIBRARY_FOLDER, FRAME_CACHE_FOLDER
+from utils.media_library import prefetch_video
 
 video_bp = Blueprint('video', __name__)
 
@@ -23,12 +26,22 @@ def add_video():
         caption=data['caption'],
         user_id=data['user_id'],
         status='available',
-        reusable=reusable
+        reusable=reusable,
+        file_unique_id=data.get('file_unique_id')
     )
     
     if result is None:
         return jsonify({'error': 'Video already exists'}), 409
     
+    # Optional metadata the client already knows (Telegram reports duration and size),
+    # the full probe runs once the file is in the media library
+    media = {k: data[k] for k in VIDEO_MEDIA_COLUMNS if data.get(k) is not None}
+    if media:
+        update_video_media(data['video_id'], media)
+    
+    # Keep the file on this host, scheduling it later sends only the id
+    prefetch_video(MEDIA_LIBRARY_FOLDER, data['video_id'], data.get('file_unique_id'), FRAME_CACHE_FOLDER)
+    
     return jsonify({
         'success': True,
         'id': str(result)
@@ -51,6 +64,7 @@ def list_videos():
 
 @video_bp.route('/track-job', methods=['POST'])
 @require_token
+@idempotent
 def track_job():
     """Track a scheduled job"""
     data = request.json
@@ -1,13 +1,15 @@
 import sqlite3
 import json
 import os
-from datetime import datetime
+from datetime import datetime, timedelta
 from dotenv import load_dotenv
 
 load_dotenv()
 
 DB_PATH = os.getenv('DB_PATH', 'data.db')
 
+VIDEO_MEDIA_COLUMNS = ['content_hash', 'duration', 'width', 'height', 'video_codec', 'audio_codec', 'bitrate']
+
 
 def get_connection():
     conn = sqlite3.connect(DB_PATH)
@@ -88,6 +90,109 @@ def init_db():
         )
     ''')
 
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS upload_sessions (
+            upload_id TEXT PRIMARY KEY,
+            user_id TEXT NOT NULL,
+            filename TEXT NOT NULL,
+            file_path TEXT NOT NULL,
+            total_size INTEGER NOT NULL,
+            committed_offset INTEGER DEFAULT 0,
+            status TEXT DEFAULT 'open',
+            created_at TEXT,
+            updated_at TEXT
+        )
+    ''')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS idempotency_keys (
+            idempotency_key TEXT NOT NULL,
+            endpoint TEXT NOT NULL,
+            fingerprint TEXT NOT NULL,
+            status TEXT DEFAULT 'in_progress',
+            response_status INTEGER,
+            response_body TEXT,
+            response_mimetype TEXT,
+            created_at TEXT,
+            PRIMARY KEY (idempotency_key, endpoint)
+        )
+    ''')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS media_probes (
+            content_hash TEXT PRIMARY KEY,
+            metadata TEXT NOT NULL,
+            created_at TEXT
+        )
+    ''')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS media_cache (
+            cache_key TEXT PRIMARY KEY,
+            file_path TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            created_at TEXT,
+            last_used_at TEXT
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_media_cache_last_used ON media_cache (last_used_at)')
+
+    # One row per (content, account, platform) that was posted or accepted for posting.
+    # The primary key doubles as the index for the duplicate check.
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS posted_media (
+            content_hash TEXT NOT NULL,
+            user_id TEXT NOT NULL,
+            account_username TEXT NOT NULL,
+            platform TEXT NOT NULL,
+            video_id TEXT,
+            posted_at TEXT,
+            PRIMARY KEY (content_hash, user_id, account_username, platform)
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_posted_media_video ON posted_media (video_id)')
+    # The job whose post created the row, so a failed repost only forgets its own rows
+    try:
+        cursor.execute('ALTER TABLE posted_media ADD COLUMN job_id TEXT')
+    except sqlite3.OperationalError:
+        pass  # Column already exists
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_posted_media_job ON posted_media (job_id)')
+
+    # Media metadata and extracted frames on videos, filled by /add-video and the upload pre-flight probe
+    for column in ['content_hash TEXT', 'duration REAL', 'width INTEGER', 'height INTEGER',
+                   'video_codec TEXT', 'audio_codec TEXT', 'bitrate INTEGER', 'file_unique_id TEXT',
+                   'cover_path TEXT', 'thumbnail_path TEXT']:
+        try:
+            cursor.execute(f'ALTER TABLE videos ADD COLUMN {column}')
+        except sqlite3.OperationalError:
+            pass  # Column already exists
+
+    # Just-in-time uploads: jobs held locally until shortly before their slot
+    for column in ['file_path TEXT', 'payload TEXT', 'dispatch_at TEXT', 'dispatch_started_at TEXT']:
+        try:
+            cursor.execute(f'ALTER TABLE scheduled_jobs ADD COLUMN {column}')
+        except sqlite3.OperationalError:
+            pass  # Column already exists
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_scheduled_jobs_dispatch ON scheduled_jobs (status, dispatch_at)')
+
+    # Precomputed upcoming autoposting slots per account, JSON list of [time, platform],
+    # and the last slot ever planned per platform stream, JSON list of [platform, time]
+    for column in ['schedule_horizon TEXT', 'schedule_tails TEXT']:
+        try:
+            cursor.execute(f'ALTER TABLE accounts ADD COLUMN {column}')
+        except sqlite3.OperationalError:
+            pass  # Column already exists
+
+    # Upload events not yet handled by every subscriber; a row outlives a crash and is replayed
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS event_outbox (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            event_type TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            claimed_at TEXT NOT NULL
+        )
+    ''')
+
     conn.commit()
     conn.close()
     print("✅ SQLite database initialized at", DB_PATH)
@@ -97,15 +202,15 @@ def init_db():
 init_db()
 
 
-def create_video(video_id, caption, user_id, status='available', reusable=False):
+def create_video(video_id, caption, user_id, status='available', reusable=False, file_unique_id=None):
     conn = get_connection()
     cursor = conn.cursor()
 
     try:
         cursor.execute('''
-            INSERT INTO videos (video_id, caption, user_id, status, reusable, created_at)
-            VALUES (?, ?, ?, ?, ?, ?)
-        ''', (video_id, caption, user_id, status, 1 if reusable else 0, datetime.utcnow().isoformat()))
+            INSERT INTO videos (video_id, caption, user_id, status, reusable, created_at, file_unique_id)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', (video_id, caption, user_id, status, 1 if reusable else 0, datetime.utcnow().isoformat(), file_unique_id))
 
         conn.commit()
         return cursor.lastrowid
@@ -182,6 +287,42 @@ def update_video_status(video_id, status, scheduled_at=None, post_url=None):
         conn.close()
         
 
+def update_video_media(video_id, media):
+    """
+    Store probed media metadata on a video row.
+    Keys missing from media are left untouched.
+    """
+    columns = [c for c in VIDEO_MEDIA_COLUMNS if media.get(c) is not None]
+    if not columns:
+        return 0
+
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    try:
+        assignments = ', '.join(f'{c} = ?' for c in columns)
+        cursor.execute(f'UPDATE videos SET {assignments} WHERE video_id = ?',
+                      [media[c] for c in columns] + [video_id])
+        conn.commit()
+        return cursor.rowcount
+    finally:
+        conn.close()
+
+
+def update_video_frames(video_id, cover_path, thumbnail_path):
+    """Record the extracted cover frame and thumbnail of a video"""
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute('UPDATE videos SET cover_path = ?, thumbnail_path = ? WHERE video_id = ?',
+                      (cover_path, thumbnail_path, video_id))
+        conn.commit()
+        return cursor.rowcount
+    finally:
+        conn.close()
+
+
 def update_video_post_url(video_id, post_url):
     """Update the post URL for a video"""
     conn = get_connection()
@@ -259,9 +400,10 @@ def update_account_autoposting(user_id, username, autoposting_properties):
     try:
         autoposting_json = json.dumps(autoposting_properties)
         
+        # Slots planned with the old settings are dropped, the horizon is rebuilt from the new ones
         cursor.execute('''
             UPDATE accounts
-            SET autoposting_properties = ?
+            SET autoposting_properties = ?, schedule_horizon = NULL, schedule_tails = NULL
             WHERE user_id = ? AND username = ?
         ''', (autoposting_json, user_id, username))
 
@@ -295,6 +437,9 @@ def get_accounts(user_id):
                 account['scheduled_times'] = json.loads(account['scheduled_times'])
             else:
                 account['scheduled_times'] = []
+
+            account['schedule_horizon'] = _load_horizon(account.get('schedule_horizon'))
+            account['schedule_tails'] = _load_tails(account.get('schedule_tails'))
             
             account['_id'] = str(account['id'])
             accounts.append(account)
@@ -323,6 +468,9 @@ def update_account(user_id, username, is_ai=None, autoposting_properties=None, p
         if autoposting_properties is not None:
             updates.append('autoposting_properties = ?')
             params.append(json.dumps(autoposting_properties))
+            # Slots planned with the old settings are dropped
+            updates.append('schedule_horizon = NULL')
+            updates.append('schedule_tails = NULL')
             
         if platforms is not None:  # ADD THIS BLOCK
             updates.append('platforms = ?')
@@ -386,6 +534,9 @@ def get_account_by_username(user_id, username):
                 account['scheduled_times'] = json.loads(account['scheduled_times'])
             else:
                 account['scheduled_times'] = []
+
+            account['schedule_horizon'] = _load_horizon(account.get('schedule_horizon'))
+            account['schedule_tails'] = _load_tails(account.get('schedule_tails'))
             
             account['next_upload_time'] = account.get('next_upload_time')
             
@@ -422,6 +573,9 @@ def get_accounts_with_autoposting(user_id=None):
                 
                 # Only include if autoposting is enabled
                 if autoposting.get('enabled'):
+                    account['scheduled_times'] = json.loads(account['scheduled_times']) if account.get('scheduled_times') else []
+                    account['schedule_horizon'] = _load_horizon(account.get('schedule_horizon'))
+                    account['schedule_tails'] = _load_tails(account.get('schedule_tails'))
                     account['_id'] = str(account['id'])
                     accounts.append(account)
 
@@ -464,7 +618,8 @@ def get_scheduled_times(user_id, username):
 def add_scheduled_time(user_id, username, scheduled_time):
     """
     Add a scheduled time to the account's pending queue.
-    Keeps the array sorted chronologically.
+    Keeps the array sorted chronologically. A time already queued (an
+    auto-scheduled slot is queued when it is reserved) is not added twice.
     
     Args:
         user_id: User ID
@@ -485,6 +640,9 @@ def add_scheduled_time(user_id, username, scheduled_time):
         
         scheduled_times = json.loads(row['scheduled_times']) if row['scheduled_times'] else []
         
+        if scheduled_time in scheduled_times:
+            return 0
+        
         # Add new time
         scheduled_times.append(scheduled_time)
         
@@ -610,7 +768,278 @@ def update_next_upload_time(user_id, username, next_upload_time):
         return cursor.rowcount
     finally:
         conn.close()
-        
+
+
+def _load_horizon(value):
+    """
+    A stored horizon as [time, platform] entries, earliest first.
+    Entries from before per-platform streams were bare times, they are
+    dropped and the horizon is replanned.
+    """
+    if not value:
+        return []
+    return [entry for entry in json.loads(value) if isinstance(entry, list)]
+
+
+def _load_tails(value):
+    """Stored stream tails as {platform: time}, None being the single stream"""
+    return {platform: slot for platform, slot in json.loads(value)} if value else {}
+
+
+def _tails_json(tails):
+    return json.dumps([[platform, slot] for platform, slot in tails.items()])
+
+
+def _next_slot(horizon, now):
+    """First slot after now, for next_upload_time"""
+    return next((t for t, _ in horizon if t > now), None)
+
+
+def get_schedule_horizon(user_id, username):
+    """Get the precomputed upcoming [time, platform] slots of an account, earliest first"""
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute('SELECT schedule_horizon FROM accounts WHERE user_id = ? AND username = ?',
+                      (user_id, username))
+        row = cursor.fetchone()
+
+        return _load_horizon(row['schedule_horizon']) if row else []
+    finally:
+        conn.close()
+
+
+def append_schedule_slots(user_id, username, slots):
+    """
+    Merge [time, platform] slots into an account's horizon and point
+    next_upload_time at its head. A slot not after the last one ever
+    planned for its platform (the stream's tail) is skipped, so an append
+    racing with a claim never brings a taken slot back, even once the
+    stream ran empty.
+    Returns the horizon after the append.
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute('BEGIN IMMEDIATE')
+        cursor.execute('SELECT schedule_horizon, schedule_tails FROM accounts WHERE user_id = ? AND username = ?',
+                      (user_id, username))
+        row = cursor.fetchone()
+
+        if not row:
+            conn.rollback()
+            return []
+
+        horizon = _load_horizon(row['schedule_horizon'])
+        last = _load_tails(row['schedule_tails'])
+        for slot, platform in horizon:
+            last[platform] = max(slot, last.get(platform, slot))
+        added = []
+        for slot, platform in slots:
+            if platform not in last or slot > last[platform]:
+                added.append([slot, platform])
+                last[platform] = slot
+        # Both runs are sorted, the sort only merges them
+        horizon = sorted(horizon + sorted(added, key=lambda entry: entry[0]), key=lambda entry: entry[0])
+
+        cursor.execute('''
+            UPDATE accounts
+            SET schedule_horizon = ?, schedule_tails = ?, next_upload_time = COALESCE(?, next_upload_time)
+            WHERE user_id = ? AND username = ?
+        ''', (json.dumps(horizon), _tails_json(last), horizon[0][0] if horizon else None, user_id, username))
+
+        conn.commit()
+        return horizon
+    finally:
+        conn.close()
+
+
+def replace_schedule_horizons(horizons):
+    """
+    Replace the horizons of many accounts in one transaction.
+    horizons: list of (user_id, username, [time, platform] slots)
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    try:
+        # A replan starts the streams over, their tails are the new last slots
+        cursor.executemany('''
+            UPDATE accounts
+            SET schedule_horizon = ?, schedule_tails = ?, next_upload_time = ?
+            WHERE user_id = ? AND username = ?
+        ''', [(json.dumps(slots), _tails_json({platform: slot for slot, platform in slots}),
+               slots[0][0] if slots else None, user_id, username)
+              for user_id, username, slots in horizons])
+
+        conn.commit()
+        return cursor.rowcount
+    finally:
+        conn.close()
+
+
+def get_upcoming_slot_times(after):
+    """
+    Every account's upcoming slots for the cross-account load picture:
+    (user_id, username, horizon times, queued scheduled_times), only times
+    after `after` (UTC string).
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute('SELECT user_id, username, schedule_horizon, scheduled_times FROM accounts')
+        rows = cursor.fetchall()
+
+        return [(row['user_id'], row['username'],
+                 [t for t, _ in _load_horizon(row['schedule_horizon']) if t > after],
+                 [t for t in (json.loads(row['scheduled_times']) if row['scheduled_times'] else []) if t > after])
+                for row in rows]
+    finally:
+        conn.close()
+
+
+def claim_schedule_slot(user_id, username, now, platforms=None, merge_minutes=0, any_platform=False,
+                        find_gap=None):
+    """
+    Take the next slot of an account's horizon in one transaction, so
+    concurrent uploads of the same account never get the same slot. The
+    slot is queued in scheduled_times right away.
+
+    Only slots of `platforms` count (all when None). With any_platform, the
+    slots of every stream count when none of `platforms` has one left. The
+    first one is taken together with the first slot of every other platform
+    due within merge_minutes of it, so they go out as one post.
+    Slots at or before `now` (UTC string) were missed: they are dropped and
+    their platforms should post now.
+
+    find_gap(scheduled_times, horizon_times, head), if given, may return
+    an earlier time in a hole of the schedule instead. That time is queued
+    and the horizon left as is.
+
+    Returns (slot, due, overdue, remaining, filled): slot is None both when
+    nothing is left and when a slot was missed - overdue tells the two apart.
+    due lists the platforms the post is for, None meaning all of them.
+    filled tells a hole from a horizon slot.
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute('BEGIN IMMEDIATE')
+        cursor.execute('SELECT schedule_horizon, scheduled_times FROM accounts WHERE user_id = ? AND username = ?',
+                      (user_id, username))
+        row = cursor.fetchone()
+
+        horizon = _load_horizon(row['schedule_horizon']) if row else []
+        wanted = set(platforms or [])
+        if any_platform and not any(platform is None or platform in wanted for _, platform in horizon):
+            wanted = None
+
+        def matches(platform):
+            return wanted is None or platform is None or platform in wanted
+
+        candidates = [entry for entry in horizon if matches(entry[1])]
+        if not candidates:
+            conn.rollback()
+            return None, [], False, len(horizon), False
+        scheduled_times = json.loads(row['scheduled_times']) if row['scheduled_times'] else []
+
+        missed = [entry for entry in candidates if entry[0] <= now]
+        gap = None
+        if find_gap and not missed:
+            gap = find_gap(scheduled_times, [t for t, _ in candidates], candidates[0][0])
+        if gap:
+            scheduled_times.append(gap)
+            scheduled_times.sort()
+            cursor.execute('UPDATE accounts SET scheduled_times = ? WHERE user_id = ? AND username = ?',
+                          (json.dumps(scheduled_times), user_id, username))
+            conn.commit()
+            return gap, list(platforms) if platforms else None, False, len(horizon), True
+
+        if missed:
+            # A missed slot means those platforms are behind - post now and keep their later slots
+            taken, slot = missed, None
+        else:
+            slot = candidates[0][0]
+            until = (datetime.strptime(slot, '%Y-%m-%dT%H:%M:%SZ')
+                     + timedelta(minutes=merge_minutes)).strftime('%Y-%m-%dT%H:%M:%SZ')
+            taken, seen = [], set()
+            for entry in candidates:
+                if entry[0] > until:
+                    break
+                if entry[1] not in seen:
+                    taken.append(entry)
+                    seen.add(entry[1])
+
+        due = []
+        for _, platform in taken:
+            if platform not in due:
+                due.append(platform)
+        taken_ids = {id(entry) for entry in taken}
+        horizon = [entry for entry in horizon if id(entry) not in taken_ids]
+        if slot and slot not in scheduled_times:
+            scheduled_times.append(slot)
+            scheduled_times.sort()
+
+        cursor.execute('''
+            UPDATE accounts
+            SET schedule_horizon = ?, scheduled_times = ?, next_upload_time = COALESCE(?, next_upload_time)
+            WHERE user_id = ? AND username = ?
+        ''', (json.dumps(horizon), json.dumps(scheduled_times), _next_slot(horizon, now), user_id, username))
+
+        conn.commit()
+        return slot, None if None in due else due, bool(missed), len(horizon), False
+    finally:
+        conn.close()
+
+
+def release_schedule_slot(user_id, username, slot, platforms, now, filled=False):
+    """
+    Give back a claimed slot, for an upload that failed before it was
+    scheduled: it leaves scheduled_times and a horizon slot goes back into
+    the horizon. A filled hole only leaves scheduled_times, which reopens
+    the hole. platforms are the ones it was claimed for, None for a
+    single-stream account. Slots that have passed by now are not returned.
+    Returns True if the slot went back.
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute('BEGIN IMMEDIATE')
+        cursor.execute('SELECT schedule_horizon, scheduled_times FROM accounts WHERE user_id = ? AND username = ?',
+                      (user_id, username))
+        row = cursor.fetchone()
+
+        if not row or slot <= now:
+            conn.rollback()
+            return False
+
+        horizon = _load_horizon(row['schedule_horizon'])
+        scheduled_times = json.loads(row['scheduled_times']) if row['scheduled_times'] else []
+        queued = slot in scheduled_times
+        if queued:
+            scheduled_times.remove(slot)
+        returned = [] if filled else [[slot, platform] for platform in (platforms or [None])
+                                      if [slot, platform] not in horizon]
+        if not returned and not queued:
+            conn.rollback()
+            return False
+        horizon = sorted(horizon + returned, key=lambda entry: entry[0])
+
+        cursor.execute('''
+            UPDATE accounts
+            SET schedule_horizon = ?, scheduled_times = ?, next_upload_time = COALESCE(?, next_upload_time)
+            WHERE user_id = ? AND username = ?
+        ''', (json.dumps(horizon), json.dumps(scheduled_times), _next_slot(horizon, now), user_id, username))
+
+        conn.commit()
+        return True
+    finally:
+        conn.close()
 
 
 # ===== GROUP MANAGEMENT =====
@@ -858,4 +1287,635 @@ def update_job_status(job_id, status, platform_post_url=None):
         conn.commit()
         return cursor.rowcount
     finally:
-        conn.close()
\ No newline at end of file
+        conn.close()
+
+
+def get_replannable_jobs(user_id, usernames):
+    """Scheduled and held (not async) jobs of the given accounts that have not gone out, earliest first"""
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    try:
+        placeholders = ', '.join('?' for _ in usernames)
+        cursor.execute(f'''
+            SELECT * FROM scheduled_jobs
+            WHERE user_id = ? AND account_username IN ({placeholders})
+              AND status IN ('pending', 'held') AND is_async = 0
+            ORDER BY scheduled_date
+        ''', (user_id, *usernames))
+
+        rows = cursor.fetchall()
+        return [dict(row) for row in rows]
+    finally:
+        conn.close()
+
+
+def get_scheduled_jobs_by_ids(user_id, usernames, job_ids):
+    """The jobs among job_ids that belong to the given accounts, in any status"""
+    if not usernames or not job_ids:
+        return []
+
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    try:
+        jobs = []
+        # Chunked to stay under SQLite's host parameter limit
+        for start in range(0, len(job_ids), 500):
+            chunk = job_ids[start:start + 500]
+            cursor.execute(f'''
+                SELECT * FROM scheduled_jobs
+                WHERE user_id = ? AND account_username IN ({', '.join('?' for _ in usernames)})
+                  AND job_id IN ({', '.join('?' for _ in chunk)})
+            ''', (user_id, *usernames, *chunk))
+            jobs.extend(dict(row) for row in cursor.fetchall())
+        return jobs
+    finally:
+        conn.close()
+
+
+def reschedule_jobs(moves):
+    """
+    Move jobs to new times in one transaction, swapping the time in their
+    account's scheduled_times as well. moves: list of dicts with job_id,
+    user_id, account_username, status, scheduled_date (old), new_date and
+    dispatch_at (held jobs, else None). A job no longer in the status it
+    was read with (a held job being dispatched meanwhile) is left alone.
+    Returns the job_ids moved.
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute('BEGIN IMMEDIATE')
+        moved = []
+        queues = {}
+        for move in moves:
+            cursor.execute('''
+                UPDATE scheduled_jobs SET scheduled_date = ?, dispatch_at = COALESCE(?, dispatch_at)
+                WHERE job_id = ? AND status = ?
+            ''', (move['new_date'], move['dispatch_at'], move['job_id'], move['status']))
+            if cursor.rowcount != 1:
+                continue
+            moved.append(move['job_id'])
+
+            key = (move['user_id'], move['account_username'])
+            if key not in queues:
+                cursor.execute('SELECT scheduled_times FROM accounts WHERE user_id = ? AND username = ?', key)
+                row = cursor.fetchone()
+                queues[key] = json.loads(row['scheduled_times']) if row and row['scheduled_times'] else []
+            queue = queues[key]
+            if move['scheduled_date'] in queue:
+                queue.remove(move['scheduled_date'])
+            if move['new_date'] not in queue:
+                queue.append(move['new_date'])
+
+        cursor.executemany('UPDATE accounts SET scheduled_times = ? WHERE user_id = ? AND username = ?',
+                           [(json.dumps(sorted(queue)), user_id, username)
+                            for (user_id, username), queue in queues.items()])
+
+        conn.commit()
+        return moved
+    finally:
+        conn.close()
+
+
+def create_held_job(job_id, video_id, account_username, user_id, scheduled_date, dispatch_at, file_path, payload):
+    """Track a post that is kept locally and handed to upload-post at dispatch_at"""
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute('''
+            INSERT INTO scheduled_jobs (job_id, video_id, account_username, user_id, scheduled_date, status,
+                                        file_path, payload, dispatch_at, created_at)
+            VALUES (?, ?, ?, ?, ?, 'held', ?, ?, ?, ?)
+        ''', (job_id, video_id, account_username, user_id, scheduled_date,
+              file_path, json.dumps(payload), dispatch_at, datetime.utcnow().isoformat()))
+
+        conn.commit()
+        return cursor.lastrowid
+    except sqlite3.IntegrityError:
+        return None
+    finally:
+        conn.close()
+
+
+def get_due_held_jobs(before):
+    """Held jobs whose dispatch time has come, oldest first"""
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute('''
+            SELECT * FROM scheduled_jobs WHERE status = 'held' AND dispatch_at <= ?
+            ORDER BY dispatch_at
+        ''', (before,))
+
+        jobs = []
+        for row in cursor.fetchall():
+            job = dict(row)
+            job['payload'] = json.loads(job['payload']) if job['payload'] else {}
+            jobs.append(job)
+        return jobs
+    finally:
+        conn.close()
+
+
+def set_held_job_status(job_id, status, expected):
+    """
+    Move a held job between 'held' and 'dispatching' only if it is still in the
+    expected state, so two dispatchers never send the same job. Entering
+    'dispatching' stamps dispatch_started_at, the start of the dispatch lease.
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    try:
+        started_at = datetime.utcnow().isoformat() if status == 'dispatching' else None
+        cursor.execute('''
+            UPDATE scheduled_jobs SET status = ?, dispatch_started_at = ? WHERE job_id = ? AND status = ?
+        ''', (status, started_at, job_id, expected))
+        conn.commit()
+        return cursor.rowcount == 1
+    finally:
+        conn.close()
+
+
+def release_stale_dispatches(started_before):
+    """
+    Put jobs stuck in 'dispatching' since before started_before back to
+    'held', e.g. after a crash mid-dispatch. Returns their ids.
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute('BEGIN IMMEDIATE')
+        cursor.execute('''
+            SELECT job_id FROM scheduled_jobs
+            WHERE status = 'dispatching' AND (dispatch_started_at IS NULL OR dispatch_started_at < ?)
+        ''', (started_before,))
+        job_ids = [row['job_id'] for row in cursor.fetchall()]
+        cursor.executemany('''
+            UPDATE scheduled_jobs SET status = 'held', dispatch_started_at = NULL
+            WHERE job_id = ? AND status = 'dispatching'
+        ''', [(job_id,) for job_id in job_ids])
+        conn.commit()
+        return job_ids
+    finally:
+        conn.close()
+
+
+def mark_job_dispatched(job_id, upstream_job_id, status='pending', is_async=False):
+    """Swap a held job's local id for upload-post's, so the job checker picks it up"""
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    try:
+        completed_at = datetime.utcnow().isoformat() if status != 'pending' else None
+        cursor.execute('''
+            UPDATE scheduled_jobs
+            SET job_id = ?, status = ?, is_async = ?, file_path = NULL, payload = NULL, completed_at = ?
+            WHERE job_id = ?
+        ''', (upstream_job_id or job_id, status, 1 if is_async else 0, completed_at, job_id))
+        if upstream_job_id:
+            cursor.execute('UPDATE posted_media SET job_id = ? WHERE job_id = ?', (upstream_job_id, job_id))
+        conn.commit()
+        return cursor.rowcount
+    finally:
+        conn.close()
+
+
+# ===== UPLOAD SESSIONS =====
+
+def create_upload_session(upload_id, user_id, filename, file_path, total_size):
+    """Register a resumable upload session"""
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    try:
+        now = datetime.utcnow().isoformat()
+        cursor.execute('''
+            INSERT INTO upload_sessions (upload_id, user_id, filename, file_path, total_size, created_at, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', (upload_id, user_id, filename, file_path, total_size, now, now))
+
+        conn.commit()
+        return cursor.lastrowid
+    except sqlite3.IntegrityError:
+        return None
+    finally:
+        conn.close()
+
+
+def get_upload_session(upload_id):
+    """Get a resumable upload session by id"""
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute('SELECT * FROM upload_sessions WHERE upload_id = ?', (upload_id,))
+        row = cursor.fetchone()
+        return dict(row) if row else None
+    finally:
+        conn.close()
+
+
+def advance_upload_offset(upload_id, expected_offset, new_offset):
+    """
+    Move the committed offset forward, but only if nobody else moved it first.
+    Returns 0 when the session is gone or the offset no longer matches.
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute('''
+            UPDATE upload_sessions
+            SET committed_offset = ?, updated_at = ?
+            WHERE upload_id = ? AND committed_offset = ? AND status = 'open'
+        ''', (new_offset, datetime.utcnow().isoformat(), upload_id, expected_offset))
+
+        conn.commit()
+        return cursor.rowcount
+    finally:
+        conn.close()
+
+
+def update_upload_session_status(upload_id, status, expected=None):
+    """
+    Update the status of a resumable upload session. With expected, only
+    if it is still in that status, so two requests never both move it.
+    Returns 0 when the session is gone or in another status.
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute('''
+            UPDATE upload_sessions
+            SET status = ?, updated_at = ?
+            WHERE upload_id = ? AND (? IS NULL OR status = ?)
+        ''', (status, datetime.utcnow().isoformat(), upload_id, expected, expected))
+
+        conn.commit()
+        return cursor.rowcount
+    finally:
+        conn.close()
+
+
+def get_stale_upload_sessions(older_than):
+    """Get sessions that were not touched since older_than (ISO string in UTC)"""
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute('SELECT * FROM upload_sessions WHERE updated_at < ?', (older_than,))
+        rows = cursor.fetchall()
+        return [dict(row) for row in rows]
+    finally:
+        conn.close()
+
+
+def delete_upload_session(upload_id):
+    """Delete a resumable upload session"""
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute('DELETE FROM upload_sessions WHERE upload_id = ?', (upload_id,))
+        conn.commit()
+        return cursor.rowcount
+    finally:
+        conn.close()
+
+
+# ===== IDEMPOTENCY KEYS =====
+
+def create_idempotency_key(idempotency_key, endpoint, fingerprint, created_at=None):
+    """
+    Claim an idempotency key for a request.
+    Returns None if the key was already claimed for this endpoint.
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute('''
+            INSERT INTO idempotency_keys (idempotency_key, endpoint, fingerprint, created_at)
+            VALUES (?, ?, ?, ?)
+        ''', (idempotency_key, endpoint, fingerprint, created_at or datetime.utcnow().isoformat()))
+
+        conn.commit()
+        return cursor.lastrowid
+    except sqlite3.IntegrityError:
+        return None
+    finally:
+        conn.close()
+
+
+def get_idempotency_key(idempotency_key, endpoint):
+    """Get the stored state of an idempotency key"""
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute('SELECT * FROM idempotency_keys WHERE idempotency_key = ? AND endpoint = ?',
+                      (idempotency_key, endpoint))
+        row = cursor.fetchone()
+        return dict(row) if row else None
+    finally:
+        conn.close()
+
+
+def take_over_idempotency_key(idempotency_key, endpoint, fingerprint, expected_created_at, created_at):
+    """
+    Claim a key still in progress under the claim made at
+    expected_created_at, whose worker died. Only one caller wins.
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute('''
+            UPDATE idempotency_keys SET created_at = ?
+            WHERE idempotency_key = ? AND endpoint = ? AND fingerprint = ?
+              AND status = 'in_progress' AND created_at = ?
+        ''', (created_at, idempotency_key, endpoint, fingerprint, expected_created_at))
+        conn.commit()
+        return cursor.rowcount == 1
+    finally:
+        conn.close()
+
+
+def complete_idempotency_key(idempotency_key, endpoint, response_status, response_body, response_mimetype,
+                             created_at=None):
+    """
+    Store the first response so duplicates can replay it. With created_at,
+    only if the key is still held by that claim.
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute('''
+            UPDATE idempotency_keys
+            SET status = 'completed', response_status = ?, response_body = ?, response_mimetype = ?
+            WHERE idempotency_key = ? AND endpoint = ? AND (? IS NULL OR created_at = ?)
+        ''', (response_status, response_body, response_mimetype, idempotency_key, endpoint, created_at, created_at))
+
+        conn.commit()
+        return cursor.rowcount
+    finally:
+        conn.close()
+
+
+def delete_idempotency_key(idempotency_key, endpoint, created_at=None):
+    """
+    Release an idempotency key so the request can be retried. With
+    created_at, only if the key is still held by that claim.
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute('''
+            DELETE FROM idempotency_keys
+            WHERE idempotency_key = ? AND endpoint = ? AND (? IS NULL OR created_at = ?)
+        ''', (idempotency_key, endpoint, created_at, created_at))
+        conn.commit()
+        return cursor.rowcount
+    finally:
+        conn.close()
+
+
+def delete_expired_idempotency_keys(older_than):
+    """Delete idempotency keys created before older_than (ISO string in UTC)"""
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute('DELETE FROM idempotency_keys WHERE created_at < ?', (older_than,))
+        conn.commit()
+        return cursor.rowcount
+    finally:
+        conn.close()
+
+
+# ===== MEDIA PROBES =====
+
+def get_media_probe(content_hash):
+    """Get cached probe metadata for a file hash"""
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute('SELECT metadata FROM media_probes WHERE content_hash = ?', (content_hash,))
+        row = cursor.fetchone()
+        return json.loads(row['metadata']) if row else None
+    finally:
+        conn.close()
+
+
+def save_media_probe(content_hash, metadata):
+    """Cache probe metadata for a file hash"""
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute('''
+            INSERT OR REPLACE INTO media_probes (content_hash, metadata, created_at)
+            VALUES (?, ?, ?)
+        ''', (content_hash, json.dumps(metadata), datetime.utcnow().isoformat()))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+# ===== MEDIA CACHE =====
+
+def save_media_cache_entry(cache_key, file_path, size):
+    """Register a cached media file"""
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    try:
+        now = datetime.utcnow().isoformat()
+        cursor.execute('''
+            INSERT OR REPLACE INTO media_cache (cache_key, file_path, size, created_at, last_used_at)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (cache_key, file_path, size, now, now))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def get_media_cache_entry(cache_key):
+    """Get a cached media file and mark it as recently used"""
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute('SELECT * FROM media_cache WHERE cache_key = ?', (cache_key,))
+        row = cursor.fetchone()
+        if not row:
+            return None
+
+        cursor.execute('UPDATE media_cache SET last_used_at = ? WHERE cache_key = ?',
+                      (datetime.utcnow().isoformat(), cache_key))
+        conn.commit()
+        return dict(row)
+    finally:
+        conn.close()
+
+
+def get_media_cache_size():
+    """Total bytes held by the media cache"""
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute('SELECT COUNT(*) AS files, COALESCE(SUM(size), 0) AS bytes FROM media_cache')
+        return dict(cursor.fetchone())
+    finally:
+        conn.close()
+
+
+def get_least_recently_used_media(limit=50):
+    """Cached media files, least recently used first"""
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute('SELECT * FROM media_cache ORDER BY last_used_at ASC LIMIT ?', (limit,))
+        return [dict(row) for row in cursor.fetchall()]
+    finally:
+        conn.close()
+
+
+def delete_media_cache_entry(cache_key):
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute('DELETE FROM media_cache WHERE cache_key = ?', (cache_key,))
+        conn.commit()
+        return cursor.rowcount
+    finally:
+        conn.close()
+
+
+# ===== POSTED MEDIA =====
+
+def find_posted_media(content_hash, user_id, account_username, platforms):
+    """Earlier posts of the same content to this account on any of platforms (one indexed query)"""
+    if not platforms:
+        return []
+
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    try:
+        placeholders = ', '.join('?' for _ in platforms)
+        cursor.execute(f'''
+            SELECT platform, video_id, posted_at FROM posted_media
+            WHERE content_hash = ? AND user_id = ? AND account_username = ? AND platform IN ({placeholders})
+        ''', [content_hash, user_id, account_username] + list(platforms))
+        return [dict(row) for row in cursor.fetchall()]
+    finally:
+        conn.close()
+
+
+def record_posted_media(content_hash, user_id, account_username, platforms, video_id, job_id=None):
+    """Remember that content went to an account; the first post per platform is kept"""
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    try:
+        now = datetime.utcnow().isoformat()
+        cursor.executemany('''
+            INSERT OR IGNORE INTO posted_media (content_hash, user_id, account_username, platform, video_id, posted_at, job_id)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', [(content_hash, user_id, account_username, p, video_id, now, job_id) for p in platforms])
+        conn.commit()
+        return cursor.rowcount
+    finally:
+        conn.close()
+
+
+def delete_posted_media(job_id, user_id, account_username, platforms=None):
+    """
+    Forget the posts a job recorded once it failed after all, so the content
+    can be posted again. Rows kept from an earlier post of the same content
+    belong to that post's job and stay.
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    try:
+        query = 'DELETE FROM posted_media WHERE job_id = ? AND user_id = ? AND account_username = ?'
+        params = [job_id, user_id, account_username]
+        if platforms:
+            query += f" AND platform IN ({', '.join('?' for _ in platforms)})"
+            params += list(platforms)
+        cursor.execute(query, params)
+        conn.commit()
+        return cursor.rowcount
+    finally:
+        conn.close()
+
+
+# ===== EVENT OUTBOX =====
+
+def record_outbox_event(event_type, payload):
+    """Store a published event until its subscribers are done with it. Returns its id"""
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute('''
+            INSERT INTO event_outbox (event_type, payload, claimed_at) VALUES (?, ?, ?)
+        ''', (event_type, json.dumps(payload), datetime.utcnow().isoformat()))
+        conn.commit()
+        return cursor.lastrowid
+    finally:
+        conn.close()
+
+
+def delete_outbox_event(event_id):
+    """Forget an event once every subscriber has handled it"""
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute('DELETE FROM event_outbox WHERE id = ?', (event_id,))
+        conn.commit()
+        return cursor.rowcount
+    finally:
+        conn.close()
+
+
+def claim_stale_outbox_events(claimed_before):
+    """
+    Events claimed before claimed_before and still not handled, i.e. lost
+    with the process that published them. They are claimed again, so only
+    one caller replays them. Oldest first, payloads decoded.
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute('BEGIN IMMEDIATE')
+        cursor.execute('''
+            SELECT * FROM event_outbox WHERE claimed_at < ? ORDER BY id
+        ''', (claimed_before,))
+        events = [dict(row) for row in cursor.fetchall()]
+        cursor.executemany('UPDATE event_outbox SET claimed_at = ? WHERE id = ?',
+                           [(datetime.utcnow().isoformat(), event['id']) for event in events])
+        conn.commit()
+        for event in events:
+            event['payload'] = json.loads(event['payload'])
+        return events
+    finally:
+        conn.close()
@@ -0,0 +1,12 @@
+from flask import Blueprint, Response
+from auth import require_token
+from utils.metrics import render
+
+metrics_bp = Blueprint('metrics', __name__)
+
+
+@metrics_bp.route('/metrics', methods=['GET'])
+@require_token
+def metrics():
+    """Prometheus scrape endpoint"""
+    return Response(render(), mimetype='text/plain; version=0.0.4')
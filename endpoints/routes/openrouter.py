@@ -4,13 +4,18 @@ import requests
 import os
 import json
 from utils.json_parse import extract_json
+from utils.resilience import request as upstream_request, CircuitOpenError
+from utils.admission import shed_load
 
 openrouter_bp = Blueprint('openrouter', __name__)
 openrouter_api_key = os.getenv('OPENROUTER_API_KEY')
+# Completions can take a while for large models
+INFERENCE_READ_TIMEOUT = float(os.getenv('INFERENCE_READ_TIMEOUT', '120'))
 
 
 @openrouter_bp.route('/inference', methods=['POST'])
 @require_token
+@shed_load('inference')
 def openrouter_post():
     data = request.json
     
@@ -21,14 +26,25 @@ def openrouter_post():
     model = data.get('model', 'x-ai/grok-4-fast')
     payload = {"model": model, "messages": [{"role": "user", "content": text_content}]}
     
-    response = requests.post(
-        url="https://openrouter.ai/api/v1/chat/completions",
-        headers={
-            "Authorization": f"Bearer {openrouter_api_key}",
-            "Content-Type": "application/json"
-        },
-        data=json.dumps(payload)
-    )
+    try:
+        # A repeated completion has no side effects, so it is safe to retry
+        response = upstream_request(
+            'openrouter', 'POST',
+            "https://openrouter.ai/api/v1/chat/completions",
+            idempotent=True,
+            read_timeout=INFERENCE_READ_TIMEOUT,
+            headers={
+                "Authorization": f"Bearer {openrouter_api_key}",
+                "Content-Type": "application/json"
+            },
+            data=json.dumps(payload)
+        )
+    except CircuitOpenError as e:
+        error_response = jsonify({'error': 'OpenRouter temporarily unavailable', 'details': str(e)})
+        error_response.headers['Retry-After'] = str(int(e.retry_after))
+        return error_response, 503
+    except requests.RequestException as e:
+        return jsonify({'error': 'Failed to reach OpenRouter', 'details': str(e)}), 502
     
     if response.status_code == 200:
         result = response.json()
@@ -51,8 +67,9 @@ def openrouter_post():
 @openrouter_bp.route('/models', methods=['GET'])
 def openrouter_get():
     try:
-        response = requests.get(
-            url="https://openrouter.ai/api/v1/models",
+        response = upstream_request(
+            'openrouter', 'GET',
+            "https://openrouter.ai/api/v1/models",
             headers={
                 "Authorization": f"Bearer {openrouter_api_key}",
                 "Content-Type": "application/json"
@@ -71,5 +88,5 @@ def openrouter_get():
         
         return jsonify({'message': 'OpenRouter GET successful', 'data': filtered}), 200
     
-    except requests.RequestException as e:
+    except (requests.RequestException, CircuitOpenError) as e:
         return jsonify({'error': 'Failed to get models from OpenRouter', 'details': str(e)}), 500
\ No newline at end of file
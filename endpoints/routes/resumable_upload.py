@@ -0,0 +1,276 @@
+from flask import Blueprint, request, jsonify, make_response
+from werkzeug.utils import secure_filename
+from auth import require_token
+from routes.upload_post import ASSETS_FOLDER, parse_upload_form, send_video
+from utils.external_wrapper import track_upload
+from utils.auto_schedule import auto_schedule
+from utils.idempotency import idempotent
+from utils.admission import shed_load
+from models.db import (
+    create_upload_session, get_upload_session, advance_upload_offset,
+    update_upload_session_status, delete_upload_session, get_stale_upload_sessions
+)
+from datetime import datetime, timedelta
+import os
+import shutil
+import uuid
+import logging
+
+logger = logging.getLogger(__name__)
+
+resumable_bp = Blueprint('resumable', __name__)
+
+UPLOADS_FOLDER = os.path.join(ASSETS_FOLDER, 'uploads')
+os.makedirs(UPLOADS_FOLDER, exist_ok=True)
+
+MAX_UPLOAD_SIZE = int(os.getenv('MAX_UPLOAD_SIZE', str(4 * 1024 * 1024 * 1024)))
+UPLOAD_SESSION_TTL_HOURS = int(os.getenv('UPLOAD_SESSION_TTL_HOURS', '24'))
+CHUNK_SIZE = 1024 * 1024
+
+
+def _offset_response(session, status_code):
+    """Empty response carrying the committed offset of a session"""
+    response = make_response('', status_code)
+    response.headers['Upload-Offset'] = str(session['committed_offset'])
+    response.headers['Upload-Length'] = str(session['total_size'])
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+
+def _preallocate(file_path, size):
+    """Reserve the full file size on disk up front so chunks can be written in place"""
+    fd = os.open(file_path, os.O_WRONLY | os.O_CREAT, 0o600)
+    try:
+        if hasattr(os, 'posix_fallocate') and size > 0:
+            os.posix_fallocate(fd, 0, size)
+        else:
+            os.ftruncate(fd, size)
+    finally:
+        os.close(fd)
+
+
+def remove_session_files(session):
+    """Delete the directory holding a session's partial file"""
+    session_dir = os.path.dirname(session['file_path'])
+    if os.path.isdir(session_dir):
+        shutil.rmtree(session_dir, ignore_errors=True)
+
+
+def expire_upload_sessions():
+    """Drop sessions that have not received bytes within the TTL"""
+    cutoff = (datetime.utcnow() - timedelta(hours=UPLOAD_SESSION_TTL_HOURS)).isoformat()
+    for session in get_stale_upload_sessions(cutoff):
+        remove_session_files(session)
+        delete_upload_session(session['upload_id'])
+        logger.info(f"Expired upload session {session['upload_id']}")
+
+
+@resumable_bp.route('/uploads', methods=['POST'])
+@require_token
+@shed_load('upload_session', disk_path=ASSETS_FOLDER)
+def create_upload():
+    """
+    Open a resumable upload session.
+
+    Payload:
+    {
+        "filename": "video.mp4",
+        "size": 104857600,  // total bytes
+        "user_id": "123456"
+    }
+    """
+    data = request.json
+
+    if data is None:
+        return jsonify({'error': 'No data provided'}), 400
+
+    if not all(k in data for k in ['filename', 'size', 'user_id']):
+        return jsonify({'error': 'Missing required fields: filename, size, user_id'}), 400
+
+    filename = secure_filename(str(data['filename']))
+    if not filename:
+        return jsonify({'error': 'Invalid filename'}), 400
+
+    try:
+        total_size = int(data['size'])
+    except (TypeError, ValueError):
+        return jsonify({'error': 'size must be an integer'}), 400
+
+    if total_size <= 0:
+        return jsonify({'error': 'size must be positive'}), 400
+
+    if total_size > MAX_UPLOAD_SIZE:
+        return jsonify({'error': f'File too large, maximum is {MAX_UPLOAD_SIZE} bytes'}), 413
+
+    upload_id = uuid.uuid4().hex
+    session_dir = os.path.join(UPLOADS_FOLDER, upload_id)
+    os.makedirs(session_dir, exist_ok=True)
+    file_path = os.path.join(session_dir, filename)
+
+    try:
+        _preallocate(file_path, total_size)
+    except OSError as e:
+        shutil.rmtree(session_dir, ignore_errors=True)
+        logger.error(f"Could not preallocate {total_size} bytes for upload {upload_id}: {e}")
+        return jsonify({'error': 'Not enough disk space', 'details': str(e)}), 507
+
+    create_upload_session(upload_id, str(data['user_id']), filename, file_path, total_size)
+    logger.info(f"Opened upload session {upload_id} for {filename} ({total_size} bytes)")
+
+    response = jsonify({
+        'success': True,
+        'upload_id': upload_id,
+        'offset': 0,
+        'size': total_size
+    })
+    response.status_code = 201
+    response.headers['Location'] = f'/uploads/{upload_id}'
+    response.headers['Upload-Offset'] = '0'
+    return response
+
+
+@resumable_bp.route('/uploads/<upload_id>', methods=['HEAD'])
+@require_token
+def upload_offset(upload_id):
+    """Report how many bytes of the upload are safely on disk"""
+    session = get_upload_session(upload_id)
+
+    if not session:
+        return '', 404
+
+    return _offset_response(session, 200)
+
+
+@resumable_bp.route('/uploads/<upload_id>', methods=['PATCH'])
+@require_token
+def append_chunk(upload_id):
+    """
+    Append a byte range to the upload.
+    The Upload-Offset header must match the committed offset reported by HEAD,
+    the raw request body holds the bytes.
+    """
+    session = get_upload_session(upload_id)
+
+    if not session:
+        return jsonify({'error': 'Upload not found'}), 404
+
+    if session['status'] != 'open':
+        return jsonify({'error': f"Upload is {session['status']}"}), 409
+
+    try:
+        offset = int(request.headers.get('Upload-Offset', ''))
+    except ValueError:
+        return jsonify({'error': 'Missing or invalid Upload-Offset header'}), 400
+
+    if offset != session['committed_offset']:
+        response = jsonify({
+            'error': 'Offset mismatch',
+            'offset': session['committed_offset']
+        })
+        response.status_code = 409
+        response.headers['Upload-Offset'] = str(session['committed_offset'])
+        return response
+
+    remaining = session['total_size'] - offset
+    if request.content_length is not None and request.content_length > remaining:
+        return jsonify({'error': f'Chunk exceeds declared size, {remaining} bytes remaining'}), 413
+
+    written = 0
+    fd = os.open(session['file_path'], os.O_WRONLY)
+    try:
+        while written < remaining:
+            try:
+                chunk = request.stream.read(min(CHUNK_SIZE, remaining - written))
+            except Exception as e:
+                # Connection dropped mid-chunk - keep what already arrived
+                logger.warning(f"Upload {upload_id} interrupted after {written} bytes: {e}")
+                break
+            if not chunk:
+                break
+
+            view = memoryview(chunk)
+            while view:
+                n = os.pwrite(fd, view, offset + written)
+                written += n
+                view = view[n:]
+
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+    if written and not advance_upload_offset(upload_id, offset, offset + written):
+        # Another request committed this range first
+        session = get_upload_session(upload_id)
+        if not session:
+            return jsonify({'error': 'Upload not found'}), 404
+        return _offset_response(session, 409)
+
+    session['committed_offset'] = offset + written
+    return _offset_response(session, 204)
+
+
+@resumable_bp.route('/uploads/<upload_id>/finalize', methods=['POST'])
+@require_token
+@shed_load('upload', disk_path=ASSETS_FOLDER)
+@idempotent
+@auto_schedule
+@track_upload
+def finalize_upload(upload_id):
+    """
+    Hand a fully received upload to Upload-Post.
+    Takes the same form fields as /upload-video, without the video file.
+    """
+    session = get_upload_session(upload_id)
+
+    if not session:
+        return jsonify({'error': 'Upload not found'}), 404
+
+    if session['status'] != 'open':
+        return jsonify({'error': f"Upload is {session['status']}"}), 409
+
+    if session['committed_offset'] != session['total_size']:
+        return jsonify({
+            'error': 'Upload incomplete',
+            'offset': session['committed_offset'],
+            'size': session['total_size']
+        }), 409
+
+    fields, error = parse_upload_form()
+    if error:
+        return error
+
+    # Only one finalize gets past this, a concurrent one sees the session taken
+    if not update_upload_session_status(upload_id, 'finalizing', expected='open'):
+        return jsonify({'error': 'Upload is already being finalized'}), 409
+
+    response, status_code = None, 500
+    try:
+        response, status_code = send_video(session['file_path'], fields, keep_file=True)
+        return response, status_code
+    finally:
+        if status_code >= 500 or status_code == 429:
+            # Upstream trouble - keep the file so the client can finalize again
+            update_upload_session_status(upload_id, 'open', expected='finalizing')
+            logger.info(f"Reopened upload session {upload_id} after a {status_code}")
+        else:
+            remove_session_files(session)
+            delete_upload_session(upload_id)
+            logger.info(f"Closed upload session {upload_id}")
+
+
+@resumable_bp.route('/uploads/<upload_id>', methods=['DELETE'])
+@require_token
+def abort_upload(upload_id):
+    """Abort an upload and free its disk space"""
+    session = get_upload_session(upload_id)
+
+    if not session:
+        return jsonify({'error': 'Upload not found'}), 404
+
+    remove_session_files(session)
+    delete_upload_session(upload_id)
+
+    return jsonify({
+        'success': True,
+        'deleted': upload_id
+    }), 200
@@ -0,0 +1,42 @@
+from flask import Blueprint, request, jsonify, send_file
+from auth import require_token
+from models.db import get_video_by_id
+from routes.upload_post import FRAME_CACHE_FOLDER
+from utils.file_cache import cache_hit
+from utils.media_library import library_path
+from utils.thumbnails import generate_frames_async
+
+thumbnail_bp = Blueprint('thumbnail', __name__)
+
+FRAME_MAX_AGE = 86400
+
+
+@thumbnail_bp.route('/video-thumbnail/<video_id>', methods=['GET'])
+@require_token
+def video_thumbnail(video_id):
+    """
+    Serve the extracted thumbnail (default) or cover frame (?kind=cover).
+    Frames are produced in the background; if they are missing but the video
+    is in the media library, extraction is started and 202 is returned.
+    """
+    kind = request.args.get('kind', 'thumb')
+    if kind not in ['thumb', 'cover']:
+        return jsonify({'error': 'kind must be thumb or cover'}), 400
+
+    video = get_video_by_id(video_id)
+    if not video:
+        return jsonify({'error': 'Video not found'}), 404
+
+    path = video.get('cover_path') if kind == 'cover' else video.get('thumbnail_path')
+    if path and cache_hit(path):
+        return send_file(path, mimetype='image/jpeg', max_age=FRAME_MAX_AGE, conditional=True)
+
+    source = library_path(video_id)
+    if not source:
+        return jsonify({'error': 'No frames for this video and its file is not on this host'}), 404
+
+    generate_frames_async(video_id, source, FRAME_CACHE_FOLDER, duration=video.get('duration'),
+                          content_hash=video.get('content_hash'))
+    response = jsonify({'status': 'processing'})
+    response.headers['Retry-After'] = '5'
+    return response, 202
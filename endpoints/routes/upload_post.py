@@ -4,8 +4,25 @@ from dotenv import load_dotenv
 from auth import require_token
 import os
 import json
+import uuid
 from utils.external_wrapper import track_upload
 from utils.auto_schedule import auto_schedule
+from utils.idempotency import idempotent
+from utils.admission import shed_load
+from utils.resilience import call as call_upstream, mount_timeouts, CircuitOpenError, CONNECT_TIMEOUT
+from utils.image_preprocess import preprocess_images, CAROUSEL_PREPROCESS
+from utils.transcode import transcode_video, VIDEO_TRANSCODE
+from utils.media_probe import probe_media, check_constraints, VIDEO_PREFLIGHT
+from utils.media_fetch import fetch_media, FetchError
+from utils.media_library import library_file_for_upload
+from utils.streaming_upload import upload_video_streaming, UPLOAD_STREAMING
+from utils.thumbnails import generate_frames_async
+from utils.dedup import find_duplicates, describe_duplicates, DEDUP_MODE
+from utils.file_cache import file_sha256
+from utils.jit_dispatch import should_hold, hold_upload
+from utils.bandwidth import traffic_class_for, throttle
+from utils.fair_queue import upload_gate
+from models.db import get_video_by_id
 import logging
 
 logger = logging.getLogger(__name__)
@@ -14,35 +31,46 @@ load_dotenv()
 upload_bp = Blueprint('upload', __name__)
 uploadpost_api_key = os.getenv('UPLOADPOST_API_KEY', '')
 client = UploadPostClient(api_key=uploadpost_api_key)
+# Large files take a while to be acknowledged, so the read timeout is generous
+UPLOAD_READ_TIMEOUT = float(os.getenv('UPLOAD_READ_TIMEOUT', '300'))
+mount_timeouts(client.session, connect=CONNECT_TIMEOUT, read=UPLOAD_READ_TIMEOUT)
 
 ASSETS_FOLDER = os.path.join(os.path.dirname(__file__), '..', 'assets')
 os.makedirs(ASSETS_FOLDER, exist_ok=True)
+IMAGE_CACHE_FOLDER = os.path.join(ASSETS_FOLDER, 'cache', 'images')
+VIDEO_CACHE_FOLDER = os.path.join(ASSETS_FOLDER, 'cache', 'videos')
+MEDIA_LIBRARY_FOLDER = os.path.join(ASSETS_FOLDER, 'library')
+FRAME_CACHE_FOLDER = os.path.join(ASSETS_FOLDER, 'cache', 'frames')
+HELD_UPLOAD_FOLDER = os.path.join(ASSETS_FOLDER, 'held')
 
 
-@upload_bp.route('/upload-video', methods=['POST'])
-@require_token
-@auto_schedule
-@track_upload
-def upload_post():
-    if 'video' not in request.files:
-        return jsonify({'error': 'No video file provided'}), 400
+def parse_upload_form():
+    """
+    Validate the form fields shared by the video upload routes.
     
-    video_file = request.files['video']
+    Returns:
+        tuple: (fields, error_response) - exactly one of them is None
+    """
     title = request.form.get('title')
     user = request.form.get('user')
     platforms_raw = request.form.get('platforms')
     scheduled_date = request.form.get('scheduled_date', None)
     params_raw = request.form.get('params')
+    transcode_raw = request.form.get('transcode')
     
     if not all([title, user, platforms_raw]):
-        return jsonify({'error': 'Missing required fields: video, title, user, platforms are required'}), 400
+        return None, (jsonify({'error': 'Missing required fields: video, title, user, platforms are required'}), 400)
     
     # Parse platforms to list
     try:
         assert platforms_raw is not None
         platforms = json.loads(platforms_raw)
     except json.JSONDecodeError:
-        return jsonify({'error': 'Invalid platforms format. Use JSON array like ["tiktok"]'}), 400
+        return None, (jsonify({'error': 'Invalid platforms format. Use JSON array like ["tiktok"]'}), 400)
+    
+    if scheduled_date == 'auto':
+        # Auto-scheduling narrows the post to the platforms whose slot it took
+        platforms = getattr(g, 'upload_platforms', None) or platforms
     
     optional_params = {}
     if params_raw:
@@ -51,30 +79,202 @@ def upload_post():
             if not isinstance(optional_params, dict):
                 raise ValueError("Params must be a JSON object")
         except (json.JSONDecodeError, ValueError) as e:
-            return jsonify({'error': f'Invalid params format: {str(e)}'}), 400
+            return None, (jsonify({'error': f'Invalid params format: {str(e)}'}), 400)
+    
+    return {
+        'title': title,
+        'user': user,
+        'platforms': platforms,
+        'scheduled_date': scheduled_date,
+        'params': optional_params,
+        'transcode': VIDEO_TRANSCODE if transcode_raw is None else transcode_raw.lower() in ['true', '1', 'yes'],
+    }, None
+
+
+def _remove_files(paths):
+    for path in paths:
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def circuit_open_response(e):
+    """503 telling the caller when the upstream will be tried again"""
+    response = jsonify({
+        'error': 'Upload service temporarily unavailable',
+        'details': str(e)
+    })
+    response.headers['Retry-After'] = str(int(e.retry_after))
+    return response, 503
+
+
+def preflight_video(path, fields):
+    """
+    Probe the video and check it against the target platforms before any
+    bytes go upstream. The metadata is left in g.media for track_upload.
+    
+    Returns:
+        error_response or None
+    """
+    try:
+        media = probe_media(path)
+    except ValueError as e:
+        return jsonify({'error': 'Invalid video file', 'details': str(e)}), 422
+    except Exception as e:
+        # ffprobe missing or broken - let the upstream decide like before
+        logger.warning(f"Pre-flight probe of {path} skipped: {e}")
+        return None
+    
+    g.media = media
+    problems = check_constraints(media, fields['platforms'], transcode=fields['transcode'])
+    if problems:
+        logger.info(f"Pre-flight rejected {path}: {problems}")
+        return jsonify({
+            'error': 'Video does not meet platform requirements',
+            'details': problems,
+            'media': media
+        }), 422
+    
+    return None
+
+
+def check_duplicate(path, fields):
+    """
+    Refuse to post content that already went to the same account on one of the
+    target platforms (DEDUP_MODE=reject), or only warn about it (DEDUP_MODE=warn).
+    allow_duplicate=true on the form skips the check for deliberate reposts.
+    The content hash is left in g.content_hash, track_upload records the post with it.
+    
+    Returns:
+        tuple: (error_response, warning) - both None when there is nothing to report
+    """
+    media = getattr(g, 'media', None) or {}
+    content_hash = media.get('content_hash') or file_sha256(path)
+    g.content_hash = content_hash
+    
+    if DEDUP_MODE == 'off' or request.form.get('allow_duplicate', '').lower() in ['true', '1', 'yes']:
+        return None, None
+    
+    _, duplicates = find_duplicates(path, request.form.get('user_id'), fields['user'], fields['platforms'],
+                                    content_hash=content_hash)
+    if not duplicates:
+        return None, None
+    
+    details = describe_duplicates(duplicates)
+    if DEDUP_MODE == 'warn':
+        return None, f"Already posted to {fields['user']}: {'; '.join(details)}"
+    
+    return (jsonify({
+        'error': 'Already posted to this account',
+        'details': details,
+        'hint': 'Send allow_duplicate=true to post it again'
+    }), 409), None
+
+
+def schedule_frame_extraction(path):
+    """
+    Extract cover and thumbnail in the background unless the video already has them.
+    The job works on a hard link, so deleting the upload's temp file does not affect it.
+    """
+    video_id = request.form.get('video_id')
+    if not video_id:
+        return
+    
+    video = get_video_by_id(video_id)
+    if video and video.get('thumbnail_path') and os.path.exists(video['thumbnail_path']):
+        return
+    
+    link_path = f'{path}.frames'
+    try:
+        os.link(path, link_path)
+    except OSError as e:
+        logger.warning(f"Skipping frame extraction for video {video_id}: {e}")
+        return
+    
+    media = getattr(g, 'media', None) or {}
+    generate_frames_async(video_id, link_path, FRAME_CACHE_FOLDER, duration=media.get('duration'),
+                          content_hash=media.get('content_hash'), remove_after=True)
+
+
+def upload_upstream(path, fields, scheduled_date=None, traffic_class='interactive', user_id=None):
+    """
+    Transcode if requested and send the file to Upload-Post once user_id gets a
+    fair upload slot, paced by the bandwidth shaper for traffic_class.
+    Returns Upload-Post's response, upstream errors propagate.
+    """
+    # Transcoded files live in the (content hash, profile) cache, the caller removes path
+    video_path = transcode_video(path, fields['platforms'], VIDEO_CACHE_FOLDER) if fields['transcode'] else path
+    
+    kwargs = {
+        'video_path': video_path,
+        'title': fields['title'],
+        'user': fields['user'],
+        'platforms': fields['platforms'],
+    }
+    if scheduled_date:
+        kwargs['scheduled_date'] = scheduled_date
     
-    # Save video temporarily
-    assert video_file.filename is not None
-    temp_path = os.path.join(ASSETS_FOLDER, video_file.filename)
-    video_file.save(temp_path)
+    kwargs.update(fields['params'])
+    logger.info(f"Uploading with {kwargs}")
+    size = os.path.getsize(video_path)
+    with upload_gate.slot(user_id, cost=size):
+        if UPLOAD_STREAMING:
+            response = call_upstream('upload_post', upload_video_streaming, client, idempotent=False,
+                                     traffic_class=traffic_class, **kwargs)
+        else:
+            # The client sends the body in one go, so it is paced as a whole
+            throttle(size, traffic_class)
+            response = call_upstream('upload_post', client.upload_video, idempotent=False, **kwargs)
+    logger.info(f"Upload-Post raw response: {response}")
+    return response
+
+
+def send_held_upload(job, scheduled_date):
+    """Dispatcher callback: upload a held job's file, then remove it unless the upstream was unreachable"""
+    fields = dict(job['payload'], user=job['account_username'])
+    try:
+        response = upload_upstream(job['file_path'], fields, scheduled_date, traffic_class='scheduled',
+                                   user_id=job['user_id'])
+    except CircuitOpenError:
+        # Kept for the next dispatcher run
+        raise
+    except Exception:
+        _remove_files([job['file_path']])
+        raise
     
+    _remove_files([job['file_path']])
+    return response
+
+
+def send_video(temp_path, fields, keep_file=False):
+    """
+    Forward a video that is already on disk to Upload-Post.
+    The file is removed afterwards, whatever the outcome, unless keep_file
+    is set (the caller cleans up, e.g. to allow a retry).
+    """
+    scheduled_date = fields['scheduled_date']
     if scheduled_date == 'auto':
         scheduled_date = getattr(g, 'upload_time', None)
     
     try:
-        kwargs = {
-            'video_path': temp_path,
-            'title': title,
-            'user': user,
-            'platforms': platforms,
-        }
-        if scheduled_date:
-            kwargs['scheduled_date'] = scheduled_date
+        if VIDEO_PREFLIGHT:
+            error = preflight_video(temp_path, fields)
+            if error:
+                return error
         
-        kwargs.update(optional_params)
-        logger.info(f"Uploading with {kwargs}")
-        response = client.upload_video(**kwargs)
-        logger.info(f"Upload-Post raw response: {response}")
+        error, duplicate_warning = check_duplicate(temp_path, fields)
+        if error:
+            return error
+        
+        schedule_frame_extraction(temp_path)
+        
+        if should_hold(scheduled_date):
+            # Validated now, sent shortly before the slot by the dispatcher
+            response = hold_upload(temp_path, HELD_UPLOAD_FOLDER, fields, scheduled_date,
+                                   request.form.get('video_id'), request.form.get('user_id'))
+            return jsonify(response), 202
+        
+        traffic_class = traffic_class_for(scheduled_date, request.headers.get('X-Upload-Priority'))
+        response = upload_upstream(temp_path, fields, scheduled_date, traffic_class, request.form.get('user_id'))
         
         if 'error' in response:
             status_code = 500
@@ -83,8 +283,15 @@ def upload_post():
         else:
             status_code = 200 # immediate / async
         
+        if duplicate_warning and isinstance(response, dict):
+            response.setdefault('warnings', []).append(duplicate_warning)
+        
         return jsonify(response), status_code
     
+    except CircuitOpenError as e:
+        logger.warning(f"Upload rejected: {e}")
+        return circuit_open_response(e)
+    
     except Exception as e:
         logger.error(f"Upload exception: {str(e)}", exc_info=True)
         return jsonify({
@@ -93,13 +300,59 @@ def upload_post():
         }), 500
     
     finally:
-        if os.path.exists(temp_path):
+        if not keep_file and os.path.exists(temp_path):
             os.remove(temp_path)
+
+
+@upload_bp.route('/upload-video', methods=['POST'])
+@require_token
+@shed_load('upload', disk_path=ASSETS_FOLDER)
+@idempotent
+@auto_schedule
+@track_upload
+def upload_post():
+    source_url = request.form.get('source_url')
+    telegram_file_id = request.form.get('telegram_file_id')
+    video_id = request.form.get('video_id')
+    
+    if 'video' not in request.files and not (source_url or telegram_file_id or video_id):
+        return jsonify({'error': 'No video file provided, send video, source_url, telegram_file_id or a library video_id'}), 400
+    
+    fields, error = parse_upload_form()
+    if error:
+        return error
+    
+    if 'video' in request.files:
+        # Save video temporarily
+        video_file = request.files['video']
+        assert video_file.filename is not None
+        temp_path = os.path.join(ASSETS_FOLDER, video_file.filename)
+        video_file.save(temp_path)
+    else:
+        # Server-side download or library lookup, the client never handles the bytes
+        temp_path = os.path.join(ASSETS_FOLDER, f'{uuid.uuid4().hex}.mp4')
+        try:
+            if source_url:
+                fetch_media(temp_path, source_url=source_url)
+            else:
+                library_file_for_upload(MEDIA_LIBRARY_FOLDER, temp_path, video_id=video_id,
+                                        telegram_file_id=telegram_file_id)
+        except FetchError as e:
+            return jsonify({'error': 'Failed to fetch source video', 'details': str(e)}), e.status
+        except CircuitOpenError as e:
+            return circuit_open_response(e)
+        except Exception as e:
+            logger.error(f"Fetching source video failed: {str(e)}", exc_info=True)
+            return jsonify({'error': 'Failed to fetch source video', 'details': str(e)}), 502
+    
+    return send_video(temp_path, fields)
             
 
 
 @upload_bp.route('/upload-carousel', methods=['POST'])
 @require_token
+@shed_load('upload', disk_path=ASSETS_FOLDER)
+@idempotent
 @auto_schedule
 @track_upload
 def upload_carousel():
@@ -142,14 +395,22 @@ def upload_carousel():
             file.save(temp_path)
             temp_paths.append(temp_path)
     except Exception as e:
+        _remove_files(temp_paths)
         return jsonify({'error': f'Error while temporary saving files {e}'}), 400
     
     if scheduled_date == 'auto':
         scheduled_date = getattr(g, 'upload_time', None)
+        platforms = getattr(g, 'upload_platforms', None) or platforms
+    
+    preprocess_raw = request.form.get('preprocess')
+    preprocess = CAROUSEL_PREPROCESS if preprocess_raw is None else preprocess_raw.lower() in ['true', '1', 'yes']
     
     try:
+        # Processed images live in the content-hash cache, temp files are still cleaned up below
+        photo_paths = preprocess_images(temp_paths, platforms, IMAGE_CACHE_FOLDER) if preprocess else temp_paths
+        
         kwargs = {
-            'photos': temp_paths,
+            'photos': photo_paths,
             'title': title,
             'user': user,
             'platforms': platforms,
@@ -159,7 +420,10 @@ def upload_carousel():
         
         kwargs.update(optional_params)
         logger.info(f"Uploading carousel with {kwargs}")
-        response = client.upload_photos(**kwargs)
+        size = sum(os.path.getsize(p) for p in photo_paths)
+        with upload_gate.slot(request.form.get('user_id'), cost=size):
+            throttle(size, traffic_class_for(scheduled_date, request.headers.get('X-Upload-Priority')))
+            response = call_upstream('upload_post', client.upload_photos, idempotent=False, **kwargs)
         logger.info(f"Upload-Post raw response: {response}")
         
         if 'error' in response:
@@ -171,6 +435,10 @@ def upload_carousel():
         
         return jsonify(response), status_code
     
+    except CircuitOpenError as e:
+        logger.warning(f"Upload rejected: {e}")
+        return circuit_open_response(e)
+    
     except Exception as e:
         logger.error(f"Upload exception: {str(e)}", exc_info=True)
         return jsonify({
@@ -179,5 +447,4 @@ def upload_carousel():
         }), 500
     
     finally:
-        if os.path.exists(temp_path):
-            os.remove(temp_path)
\ No newline at end of file
+        _remove_files(temp_paths)
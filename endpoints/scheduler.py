@@ -3,6 +3,14 @@ import time
 import threading
 import logging
 from utils.job_checker import check_scheduled_jobs
+from routes.resumable_upload import expire_upload_sessions
+from routes.upload_post import IMAGE_CACHE_FOLDER, VIDEO_CACHE_FOLDER, FRAME_CACHE_FOLDER, send_held_upload
+from utils.image_preprocess import prune_image_cache
+from utils.transcode import prune_video_cache
+from utils.thumbnails import prune_frame_cache
+from utils.idempotency import expire_idempotency_keys
+from utils.jit_dispatch import dispatch_due_uploads
+from utils.events import replay_events
 
 logger = logging.getLogger(__name__)
 
@@ -16,10 +24,68 @@ def run_job_checker():
         logger.error(f"Scheduled job check failed: {str(e)}", exc_info=True)
 
 
+def run_upload_dispatcher():
+    """Wrapper for the just-in-time upload dispatcher with error handling"""
+    try:
+        dispatch_due_uploads(send_held_upload)
+    except Exception as e:
+        logger.error(f"Upload dispatch failed: {str(e)}", exc_info=True)
+
+
+def run_event_replay():
+    """Wrapper for replaying events lost with a crashed process, with error handling"""
+    try:
+        replayed = replay_events()
+        if replayed:
+            logger.info(f"Replayed {replayed} upload events")
+    except Exception as e:
+        logger.error(f"Event replay failed: {str(e)}", exc_info=True)
+
+
+def run_upload_session_cleanup():
+    """Wrapper for upload session cleanup with error handling"""
+    try:
+        expire_upload_sessions()
+    except Exception as e:
+        logger.error(f"Upload session cleanup failed: {str(e)}", exc_info=True)
+
+
+def run_media_cache_cleanup():
+    """Wrapper for media cache pruning with error handling"""
+    try:
+        removed = (
+            prune_image_cache(IMAGE_CACHE_FOLDER)
+            + prune_video_cache(VIDEO_CACHE_FOLDER)
+            + prune_frame_cache(FRAME_CACHE_FOLDER)
+        )
+        if removed:
+            logger.info(f"Pruned {removed} cached media files")
+    except Exception as e:
+        logger.error(f"Media cache cleanup failed: {str(e)}", exc_info=True)
+
+
+def run_idempotency_key_cleanup():
+    """Wrapper for idempotency key expiry with error handling"""
+    try:
+        removed = expire_idempotency_keys()
+        if removed:
+            logger.info(f"Expired {removed} idempotency keys")
+    except Exception as e:
+        logger.error(f"Idempotency key cleanup failed: {str(e)}", exc_info=True)
+
+
 def start_scheduler():
     """Start the background scheduler"""
     # Run job checker every 5 minutes
     schedule.every(5).minutes.do(run_job_checker)
+    # Held jobs are dispatched even if JIT_UPLOADS was turned off since they were created
+    schedule.every().minute.do(run_upload_dispatcher)
+    # Events a crash left in the outbox: once now for the previous run, then every minute
+    run_event_replay()
+    schedule.every().minute.do(run_event_replay)
+    schedule.every().hour.do(run_upload_session_cleanup)
+    schedule.every().hour.do(run_media_cache_cleanup)
+    schedule.every().hour.do(run_idempotency_key_cleanup)
     
     def run_continuously():
         while True:
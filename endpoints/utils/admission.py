@@ -0,0 +1,119 @@
+import os
+import math
+import time
+import shutil
+import logging
+import threading
+from functools import wraps
+from flask import jsonify
+from dotenv import load_dotenv
+from utils.fair_queue import upload_gate
+from utils import metrics
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Requests of a kind the server works on at once before it sheds new ones
+MAX_INFLIGHT = {
+    'upload': int(os.getenv('MAX_INFLIGHT_UPLOADS', '16')),
+    'inference': int(os.getenv('MAX_INFLIGHT_INFERENCE', '8')),
+}
+# Uploads waiting for a slot at the fair gate. Only uploads in flight can wait there, so this
+# must stay below MAX_INFLIGHT_UPLOADS minus UPLOAD_CONCURRENCY or it never triggers
+MAX_UPLOAD_QUEUE = int(os.getenv('MAX_UPLOAD_QUEUE', '8'))
+# Free space required in the assets folder to accept media
+MIN_FREE_DISK_MB = int(os.getenv('MIN_FREE_DISK_MB', '1024'))
+DISK_RETRY_AFTER = 60
+MAX_RETRY_AFTER = 300
+
+metrics.describe('requests_shed_total', 'counter', 'Requests rejected with 429 by kind and reason')
+metrics.describe('requests_in_flight', 'gauge', 'Requests being handled by kind')
+
+if MAX_UPLOAD_QUEUE >= MAX_INFLIGHT['upload'] - upload_gate.capacity:
+    logger.warning(f"MAX_UPLOAD_QUEUE={MAX_UPLOAD_QUEUE} is unreachable with MAX_INFLIGHT_UPLOADS="
+                   f"{MAX_INFLIGHT['upload']} and UPLOAD_CONCURRENCY={upload_gate.capacity}, "
+                   f"uploads are only shed by the in-flight limit")
+
+_lock = threading.Lock()
+_in_flight = {}
+# Moving average of how long a request of a kind takes, seeds the Retry-After estimate
+_avg_duration = {}
+
+
+def _collect_admission_metrics():
+    with _lock:
+        counts = dict(_in_flight)
+    for kind in MAX_INFLIGHT:
+        yield 'requests_in_flight', {'kind': kind}, counts.get(kind, 0)
+
+
+metrics.register_collector(_collect_admission_metrics)
+
+
+def _retry_after(duration, backlog, capacity):
+    """Seconds until roughly `backlog` requests ahead have drained through `capacity` workers"""
+    seconds = math.ceil(duration * max(backlog, 1) / max(capacity, 1))
+    return min(max(seconds, 1), MAX_RETRY_AFTER)
+
+
+def _admit(kind, disk_path):
+    """
+    Take an in-flight slot for kind. Returns (reason, retry_after) if a threshold
+    is exceeded and nothing was taken, else None.
+    """
+    if disk_path:
+        free_mb = shutil.disk_usage(disk_path).free / (1024 * 1024)
+        if free_mb < MIN_FREE_DISK_MB:
+            return 'disk', DISK_RETRY_AFTER
+
+    with _lock:
+        duration = _avg_duration.get(kind, 5.0)
+
+    if kind == 'upload':
+        waiting = upload_gate.stats()['waiting']
+        if waiting >= MAX_UPLOAD_QUEUE:
+            return 'queue', _retry_after(duration, waiting - MAX_UPLOAD_QUEUE + 1, upload_gate.capacity)
+
+    limit = MAX_INFLIGHT.get(kind)
+    with _lock:
+        in_flight = _in_flight.get(kind, 0)
+        if limit is not None and in_flight >= limit:
+            return 'in_flight', _retry_after(duration, in_flight - limit + 1, limit)
+        _in_flight[kind] = in_flight + 1
+
+    return None
+
+
+def shed_load(kind, disk_path=None):
+    """
+    Decorator for expensive routes: answers 429 with Retry-After right away when
+    too many requests of `kind` are in flight, too many uploads are queued or
+    disk_path is low on space, instead of letting requests pile up on the server.
+    Goes right after @require_token, so shed requests leave no idempotency key
+    or tracking state behind.
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            rejected = _admit(kind, disk_path)
+            if rejected:
+                reason, retry_after = rejected
+                metrics.inc('requests_shed_total', kind=kind, reason=reason)
+                logger.warning(f"Shedding {kind} request ({reason}), retry after {retry_after}s")
+                response = jsonify({'error': 'Server busy, try again later', 'details': reason})
+                response.headers['Retry-After'] = str(retry_after)
+                return response, 429
+
+            started = time.monotonic()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                elapsed = time.monotonic() - started
+                with _lock:
+                    _in_flight[kind] -= 1
+                    previous = _avg_duration.get(kind)
+                    _avg_duration[kind] = elapsed if previous is None else 0.8 * previous + 0.2 * elapsed
+
+        return wrapper
+    return decorator
@@ -1,5 +1,6 @@
 from functools import wraps
 from flask import request, g
+import json
 import pytz
 import logging
 from flask import jsonify
@@ -7,12 +8,41 @@ from datetime import datetime
 from models.db import (
     get_next_upload_time, update_account_last_upload_time
 )
+from scheduling_core import parse_iso
+from utils.schedule_horizon import reserve_next_slot, release_slot
 
 logger = logging.getLogger(__name__)
 
+
+def _use_next_upload_time(user_id, username):
+    """Accounts without a horizon post at next_upload_time, or now once it has passed"""
+    # Fetch current next upload time
+    next_upload_time = get_next_upload_time(user_id, username)
+    logger.info(f"Current next upload time for {username} (user {user_id}): {next_upload_time}")
+    
+    if not next_upload_time:
+        logger.warning(f"No next upload time set for {username} (user {user_id}), Database error")
+        return
+    
+    # Times without an offset are UTC
+    next_time_utc = parse_iso(next_upload_time)
+    
+    now_utc = datetime.now(pytz.UTC)
+    
+    if next_time_utc < now_utc:
+        logger.info(f"Next upload time {next_upload_time} is in the past, setting to None")
+        next_upload_time = None
+        now = datetime.utcnow().isoformat() + 'Z'
+        update_account_last_upload_time(user_id, username, now)
+        logger.info(f"Updated last upload time for {username} to {now}")
+    
+    g.upload_time = next_upload_time
+
+
 def auto_schedule(func):
     """
     Decorator to automatically schedule the next upload time for AI-generated content.
+    The slot is reserved before the upload runs and released again if it fails.
     """
     @wraps(func)
     def wrapper(*args, **kwargs):
@@ -29,41 +59,38 @@ def auto_schedule(func):
             logger.info("Auto-schedule skipped - missing user_id or username")
             return jsonify(
                 {'error': 'Missing user_id or username for auto-scheduling'}), 400
-                    
+        
         try:
-            # Fetch current next upload time
-            next_upload_time = get_next_upload_time(user_id, username)
-            logger.info(f"Current next upload time for {username} (user {user_id}): {next_upload_time}")
-            
-            if not next_upload_time:
-                logger.warning(f"No next upload time set for {username} (user {user_id}), Database error")
-                return func(*args, **kwargs)
-            
-            # Parse both times - ensure both are timezone-aware
-            if next_upload_time.endswith('Z'):
-                next_time_utc = datetime.fromisoformat(next_upload_time.replace('Z', '+00:00'))
-            elif '+' in next_upload_time or next_upload_time.count('-') > 2:
-                next_time_utc = datetime.fromisoformat(next_upload_time)
-            else:
-                # Assume UTC if no timezone
-                next_time_utc = datetime.fromisoformat(next_upload_time).replace(tzinfo=pytz.UTC)
-            
-            now_utc = datetime.now(pytz.UTC)
-            
-            if next_time_utc < now_utc:
-                logger.info(f"Next upload time {next_upload_time} is in the past, setting to None")
-                next_upload_time = None
-                now = datetime.utcnow().isoformat() + 'Z'
-                update_account_last_upload_time(user_id, username, now)
-                logger.info(f"Updated last upload time for {username} to {now}")
-                
-            
-            g.upload_time = next_upload_time
+            requested = json.loads(request.form.get('platforms') or '[]')
+        except ValueError:
+            requested = []
         
+        try:
+            # Autoposting accounts fill a hole in their schedule or claim the next precomputed
+            # slot off their platform streams, the post goes only to the platforms that slot is for
+            slot, due, found, filled = reserve_next_slot(user_id, username, requested or None)
+            if not found:
+                _use_next_upload_time(user_id, username)
         except Exception as e:
             logger.error(f"Error fetching next upload time for {username} (user {user_id}): {e}")
             return func(*args, **kwargs)
-            
-        return func(*args, **kwargs)
+        
+        if not found:
+            return func(*args, **kwargs)
+        
+        g.upload_time = slot
+        if due:
+            g.upload_platforms = [p for p in requested if p in due] or requested
+        
+        try:
+            response, response_status = func(*args, **kwargs)
+        except Exception:
+            release_slot(user_id, username, slot, due, filled)
+            raise
+        
+        # Rejected or failed before Upload-Post scheduled it - the slot is still free
+        if response_status >= 400:
+            release_slot(user_id, username, slot, due, filled)
+        return response, response_status
         
     return wrapper
@@ -0,0 +1,146 @@
+import os
+import time
+import heapq
+import logging
+import itertools
+import threading
+from dotenv import load_dotenv
+from utils import metrics
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Aggregate cap on bytes sent to Upload-Post, 0 disables shaping
+UPLOAD_BANDWIDTH_MBIT = float(os.getenv('UPLOAD_BANDWIDTH_MBIT', '0'))
+UPLOAD_BANDWIDTH_BURST_MB = float(os.getenv('UPLOAD_BANDWIDTH_BURST_MB', '4'))
+# Share of the cap a class gets while others are waiting too
+UPLOAD_CLASS_WEIGHTS = os.getenv('UPLOAD_CLASS_WEIGHTS', 'interactive:8,scheduled:3,bulk:1')
+
+TRAFFIC_CLASSES = ['interactive', 'scheduled', 'bulk']
+
+metrics.describe('upload_bandwidth_bytes_total', 'counter', 'Bytes sent upstream by traffic class')
+metrics.describe('upload_bandwidth_wait_seconds_total', 'counter', 'Time uploads spent waiting for bandwidth by traffic class')
+metrics.describe('upload_bandwidth_waiting', 'gauge', 'Uploads currently waiting for bandwidth by traffic class')
+
+
+def _parse_weights(raw):
+    weights = {}
+    for item in raw.split(','):
+        name, _, weight = item.partition(':')
+        if name.strip():
+            weights[name.strip()] = max(float(weight or 1), 0.001)
+    return weights
+
+
+class BandwidthShaper:
+    """
+    Token bucket shared by all upload threads, with weighted fair queueing
+    between traffic classes.
+
+    Every request for n bytes gets a virtual finish tag of start + n / weight,
+    where start continues from the class's previous tag. Waiters are served in
+    tag order, so while classes compete each gets bandwidth in proportion to its
+    weight, and a class that was idle does not build up credit. Requests larger
+    than the burst are granted once a full burst is available and leave the
+    bucket in debt, which paces whoever comes next.
+    """
+
+    def __init__(self, rate_bytes, burst_bytes, weights):
+        self.rate = rate_bytes
+        self.burst = max(burst_bytes, 1)
+        self.weights = weights
+        self._cond = threading.Condition()
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._virtual = 0.0
+        self._class_tags = {}
+        self._queue = []
+        self._seq = itertools.count()
+        self._waiting = {}
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, nbytes, traffic_class='interactive'):
+        """Block until nbytes may be sent for traffic_class. Returns the seconds waited."""
+        metrics.inc('upload_bandwidth_bytes_total', nbytes, **{'class': traffic_class})
+        if self.rate <= 0 or nbytes <= 0:
+            return 0.0
+
+        weight = self.weights.get(traffic_class, 1.0)
+        started = time.monotonic()
+        with self._cond:
+            start = max(self._virtual, self._class_tags.get(traffic_class, 0.0))
+            tag = start + nbytes / weight
+            self._class_tags[traffic_class] = tag
+            entry = (tag, next(self._seq))
+            heapq.heappush(self._queue, entry)
+            self._waiting[traffic_class] = self._waiting.get(traffic_class, 0) + 1
+
+            try:
+                needed = min(nbytes, self.burst)
+                while True:
+                    self._refill()
+                    if self._queue[0] is entry and self._tokens >= needed:
+                        break
+                    # Only the head of the queue knows how long to sleep, the rest wait for a notify
+                    timeout = (needed - self._tokens) / self.rate if self._queue[0] is entry else None
+                    self._cond.wait(timeout)
+
+                self._tokens -= nbytes
+                self._virtual = start
+            finally:
+                self._queue.remove(entry)
+                heapq.heapify(self._queue)
+                self._waiting[traffic_class] -= 1
+                self._cond.notify_all()
+
+        waited = time.monotonic() - started
+        if waited:
+            metrics.inc('upload_bandwidth_wait_seconds_total', waited, **{'class': traffic_class})
+        return waited
+
+    def waiting(self):
+        with self._cond:
+            return dict(self._waiting)
+
+
+shaper = BandwidthShaper(
+    UPLOAD_BANDWIDTH_MBIT * 1000 * 1000 / 8,
+    UPLOAD_BANDWIDTH_BURST_MB * 1024 * 1024,
+    _parse_weights(UPLOAD_CLASS_WEIGHTS)
+)
+
+
+def _collect_bandwidth_metrics():
+    waiting = shaper.waiting()
+    for traffic_class in TRAFFIC_CLASSES:
+        yield 'upload_bandwidth_waiting', {'class': traffic_class}, waiting.get(traffic_class, 0)
+
+
+metrics.register_collector(_collect_bandwidth_metrics)
+
+
+def traffic_class_for(scheduled_date=None, requested=None):
+    """
+    Uploads someone is waiting for are interactive, uploads for a later slot are
+    scheduled. Clients mark backfills and fan-outs with X-Upload-Priority: bulk.
+    """
+    if requested and requested.lower() in TRAFFIC_CLASSES:
+        return requested.lower()
+    return 'scheduled' if scheduled_date else 'interactive'
+
+
+def throttle(nbytes, traffic_class):
+    """Wait for bandwidth for a body that is sent in one piece"""
+    return shaper.acquire(nbytes, traffic_class)
+
+
+def shaped(chunks, traffic_class):
+    """Pace an iterable of byte chunks through the shaper"""
+    for chunk in chunks:
+        shaper.acquire(len(chunk), traffic_class)
+        yield chunk
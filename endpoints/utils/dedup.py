@@ -0,0 +1,31 @@
+import os
+import logging
+from dotenv import load_dotenv
+from models.db import find_posted_media
+from utils.file_cache import file_sha256
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# reject: answer 409, warn: upload anyway and add a warning, off: no check
+DEDUP_MODE = os.getenv('DEDUP_MODE', 'reject').lower()
+
+
+def find_duplicates(path, user_id, account_username, platforms, content_hash=None):
+    """
+    Look up earlier posts of the file's content to the same account.
+    Returns (content_hash, duplicates) - the hash is reused for recording the post.
+    """
+    content_hash = content_hash or file_sha256(path)
+    duplicates = find_posted_media(content_hash, user_id, account_username, [p.lower() for p in platforms])
+    if duplicates:
+        logger.info(f"Content {content_hash[:12]} was already posted to {account_username}: {duplicates}")
+    return content_hash, duplicates
+
+
+def describe_duplicates(duplicates):
+    return [
+        f"{d['platform']}: already posted as video {d['video_id']} at {d['posted_at']}"
+        for d in duplicates
+    ]
@@ -0,0 +1,161 @@
+import os
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field, asdict
+from datetime import datetime, timedelta
+from typing import Optional
+from dotenv import load_dotenv
+from models.db import record_outbox_event, delete_outbox_event, claim_stale_outbox_events
+from utils import metrics
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# An event still in the outbox this long after it was published (or last replayed) was lost
+# with its process and is delivered again. Keep it above the longest event backlog
+EVENT_OUTBOX_LEASE_SECONDS = int(os.getenv('EVENT_OUTBOX_LEASE_SECONDS', '300'))
+
+metrics.describe('events_published_total', 'counter', 'Upload events published by type')
+metrics.describe('event_handler_errors_total', 'counter', 'Event subscribers that raised, by event type')
+metrics.describe('events_replayed_total', 'counter', 'Outbox events delivered again after a crash, by event type')
+
+
+def _now():
+    return datetime.utcnow().isoformat() + 'Z'
+
+
+# ===== EVENTS =====
+
+@dataclass
+class UploadEvent:
+    """What every upload event carries: the video, its owner and what the request knew about it"""
+    video_id: str
+    user_id: Optional[str]
+    account_username: Optional[str]
+    platforms: list = field(default_factory=list)
+    caption: str = ''
+    # 'telegram' when the bot registered the video, otherwise it is created as external
+    source: Optional[str] = None
+    media: Optional[dict] = None
+    content_hash: Optional[str] = None
+    # Tell the user on Telegram - for background paths, interactive callers see the response
+    notify: bool = False
+    occurred_at: str = field(default_factory=_now)
+
+
+@dataclass
+class UploadScheduled(UploadEvent):
+    job_id: Optional[str] = None
+    scheduled_date: Optional[str] = None
+
+
+@dataclass
+class UploadAsyncAccepted(UploadEvent):
+    request_id: Optional[str] = None
+
+
+@dataclass
+class UploadCompleted(UploadEvent):
+    post_urls: dict = field(default_factory=dict)
+    succeeded_platforms: list = field(default_factory=list)
+    partial: bool = False
+
+
+@dataclass
+class UploadFailed(UploadEvent):
+    reason: str = ''
+    status_code: Optional[int] = None
+
+
+EVENT_TYPES = {cls.__name__: cls for cls in (UploadScheduled, UploadAsyncAccepted, UploadCompleted, UploadFailed)}
+
+
+# ===== BUS =====
+
+_subscribers = []
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # One worker keeps events in publish order, e.g. a video is created before its status changes
+            _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='events')
+        return _executor
+
+
+def subscribe(event_type, handler):
+    """Call handler(event) for every published event that is an instance of event_type"""
+    _subscribers.append((event_type, handler))
+
+
+def subscriber(*event_types):
+    """Decorator form of subscribe"""
+    def decorator(handler):
+        for event_type in event_types:
+            subscribe(event_type, handler)
+        return handler
+    return decorator
+
+
+def _deliver(event, event_id=None):
+    name = type(event).__name__
+    for event_type, handler in list(_subscribers):
+        if not isinstance(event, event_type):
+            continue
+        try:
+            handler(event)
+        except Exception as e:
+            metrics.inc('event_handler_errors_total', event=name)
+            logger.error(f"{handler.__name__} failed on {name} for video {event.video_id}: {e}", exc_info=True)
+    if event_id is not None:
+        delete_outbox_event(event_id)
+
+
+def publish(event):
+    """
+    Record the event in the outbox, then hand it to the subscribers on the
+    event thread and return right away. If the process dies before they are
+    done, replay_events delivers it again.
+    """
+    name = type(event).__name__
+    metrics.inc('events_published_total', event=name)
+    logger.info(f"Publishing {name} for video {event.video_id}")
+    try:
+        event_id = record_outbox_event(name, asdict(event))
+    except Exception as e:
+        # Still delivered, just not durably
+        logger.error(f"Could not record {name} for video {event.video_id} in the outbox: {e}")
+        event_id = None
+    return _get_executor().submit(_deliver, event, event_id)
+
+
+def replay_events():
+    """
+    Deliver outbox events whose publisher died before the subscribers were
+    done, oldest first. Subscribers may see such an event twice. Returns
+    the number replayed.
+    """
+    stale = claim_stale_outbox_events(
+        (datetime.utcnow() - timedelta(seconds=EVENT_OUTBOX_LEASE_SECONDS)).isoformat()
+    )
+    for row in stale:
+        event_type = EVENT_TYPES.get(row['event_type'])
+        if not event_type:
+            logger.error(f"Unknown event type {row['event_type']} in the outbox, dropped")
+            delete_outbox_event(row['id'])
+            continue
+        event = event_type(**row['payload'])
+        metrics.inc('events_replayed_total', event=row['event_type'])
+        logger.warning(f"Replaying {row['event_type']} for video {event.video_id}")
+        _get_executor().submit(_deliver, event, row['id'])
+    return len(stale)
+
+
+def flush(timeout=None):
+    """Wait until every event published so far has been handled"""
+    _get_executor().submit(lambda: None).result(timeout)
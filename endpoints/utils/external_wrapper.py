@@ -1,174 +1,96 @@
 from functools import wraps
-from models.db import (
-    update_video_status, update_video_post_url, 
-    add_scheduled_time, create_scheduled_job,
-    get_account_by_username, update_next_upload_time,
-    update_account_last_upload_time, create_video
-)
 from utils.upload_handler import parse_upload_response
-from flask import request
-from utils.determine_time import calculate_next_upload_time
+from utils.events import publish, UploadScheduled, UploadAsyncAccepted, UploadCompleted, UploadFailed
+from flask import request, g
+import utils.upload_subscribers  # noqa: F401 - registers the bookkeeping subscribers
 import logging
+import json
 import uuid
-from datetime import datetime, timedelta
 
 logger = logging.getLogger(__name__)
 
-def calculate_and_update_next_upload_time(account):
-    # Calculate next upload time, based on scheduled times using function in determine_time
-    next_upload_time = calculate_next_upload_time(account)
-    logger.info(f"Next upload time for {account['username']} is {next_upload_time}")
-    
-    # Update next_upload_time
-    update_next_upload_time(account['user_id'], account['username'], next_upload_time)
-    logger.info(f"Updated next upload time for {account['username']} to {next_upload_time}")
-    
-####
-#TODO:
-# This should be split into a tracking decorator
-# and another decorator that handles the scheduling and calculation of times - important
-####
+
+def upload_event_for(response, response_status):
+    """
+    Turn an upload route's response into an upload event.
+    Reads the request and g, so it has to run on the request thread.
+    """
+    # Get video_id from form data
+    video_id = request.form.get('video_id')
+    carousel_id = request.form.get('carousel_id')
+
+    if not video_id and not carousel_id:
+        video_id = str(uuid.uuid4())
+        logger.info(f"No video_id provided, generated new id: {video_id}")
+
+    if carousel_id:
+        logger.info(f"Detected carousel post, treating it as a video with id {carousel_id}")
+        video_id = carousel_id
+
+    try:
+        platforms = json.loads(request.form.get('platforms') or '[]')
+    except ValueError:
+        platforms = []
+    # An auto-scheduled post only goes to the platforms its slot was for
+    platforms = getattr(g, 'upload_platforms', None) or platforms
+
+    common = {
+        'video_id': video_id,
+        'user_id': request.form.get('user_id'),
+        'account_username': request.form.get('user'),
+        'platforms': platforms,
+        'caption': request.form.get('title', ''),
+        # Check if request came from Telegram
+        'source': request.headers.get('X-Source'),
+        # Metadata from the pre-flight probe and the hash from the duplicate check
+        'media': getattr(g, 'media', None),
+        'content_hash': getattr(g, 'content_hash', None),
+    }
+
+    # Rejected locally (pre-flight, circuit open, shed) or by the upstream
+    if response_status >= 400:
+        return UploadFailed(**common, reason=f'rejected with {response_status}', status_code=response_status)
+
+    response_data = response.get_json() if hasattr(response, 'get_json') else {}
+    status_code, parsed = parse_upload_response(response_data)
+    logger.info(f"Raw parsed upload response for tracking {parsed}")
+
+    if status_code == 202 and parsed.get('scheduled'):
+        return UploadScheduled(**common, job_id=parsed.get('job_id'), scheduled_date=parsed.get('scheduled_date'))
+
+    if status_code == 200 and parsed.get('async'):
+        return UploadAsyncAccepted(**common, request_id=parsed.get('request_id'))
+
+    if status_code in [200, 207] and parsed.get('success') and (parsed.get('uploaded') or parsed.get('partial')):
+        return UploadCompleted(
+            **common,
+            post_urls=parsed.get('post_urls', {}),
+            succeeded_platforms=parsed.get('succeeded_platforms', []),
+            partial=bool(parsed.get('partial'))
+        )
+
+    return UploadFailed(**common, reason=parsed.get('error', 'upload failed'), status_code=status_code)
+
+
 def track_upload(func):
     """
-    Decorator to track video upload status and URLs
+    Decorator that publishes the outcome of an upload as an event.
+    The bookkeeping (video status, jobs, schedule, notifications) happens in
+    utils/upload_subscribers.py on the event thread, so the response is not
+    held up by it.
     """
     @wraps(func)
     def wrapper(*args, **kwargs):
-        response, status_code = func(*args, **kwargs)
-        
-        # Get video_id from form data
-        video_id = request.form.get('video_id')
-        user_id = request.form.get('user_id')
-        account_username = request.form.get('user')
-        scheduled_date = request.form.get('scheduled_date')
-        caption = request.form.get('title', '')
-        
-        # Check if request came from Telegram
-        source = request.headers.get('X-Source')
-        
-        carousel_id = request.form.get('carousel_id')
-        
-        if not video_id and not carousel_id:
-            video_id = uuid.uuid4()
-            logger.info(f"No video_id provided, generated new id: {video_id}")
-            
-        if carousel_id:
-            logger.info(f"Detected carousel post, treating it as a video with id {carousel_id}")
-            video_id = carousel_id
-        
-        # if the video comes outside of telegram, we need to add the video to the DB
-        if source != 'telegram':
-            create_video(video_id=video_id, caption=caption, 
-                         user_id=user_id, status='external', reusable=False)
-        
-        # Current time
-        now = datetime.utcnow().isoformat() + 'Z'
-        
+        response, response_status = func(*args, **kwargs)
+
         try:
-            # Parse response
-            response_data = response.get_json() if hasattr(response, 'get_json') else {}
-            status_code, parsed = parse_upload_response(response_data)
-            logger.info(f"Raw parsed upload response for tracking {parsed}")
-            
-            logger.info(f"Tracking upload - source: {source}, video: {video_id}, user: {user_id}, account: {account_username}, status: {status_code}")
-            
-            # 1. Handle scheduled uploads
-            if status_code == 202 and parsed.get('scheduled'):
-                # Scheduled upload
-                scheduled_date = parsed.get('scheduled_date')
-                job_id = parsed.get('job_id')
-                update_video_status(video_id, 'scheduled', scheduled_at=scheduled_date)
-                logger.info(f"Video {video_id} scheduled for {scheduled_date}")
-                
-                if job_id:
-                    # Create scheduled job entry
-                    create_scheduled_job(
-                        job_id=job_id,
-                        video_id=video_id,
-                        account_username=account_username,
-                        user_id=user_id,
-                        scheduled_date=scheduled_date
-                    )
-                    logger.info(f"Created scheduled job {job_id} for video {video_id}")
-                
-                # Add to scheduled_times array
-                add_scheduled_time(user_id, account_username, scheduled_date)
-                logger.info(f"✅ Added {scheduled_date} to {account_username}'s schedule queue")
-                
-                # Calculate next upload time, based on scheduled times using function in determine_time
-                account = get_account_by_username(user_id, account_username)
-                calculate_and_update_next_upload_time(account)
-                
-            # 2. Handle async background uploads
-            elif status_code == 200 and parsed.get('async'):
-                # Async background upload
-                request_id = parsed.get('request_id')
-                update_video_status(video_id, 'uploading')
-                logger.info(f"Video {video_id} processing asynchronously with request_id: {request_id}")
-                check_time = (datetime.utcnow() + timedelta(minutes=10)).isoformat() + 'Z'
-                
-                # Create a scheduled job to track async upload
-                if request_id:
-                    create_scheduled_job(
-                        job_id=request_id,  
-                        video_id=video_id,
-                        account_username=account_username,
-                        user_id=user_id,
-                        scheduled_date=check_time,
-                        is_async=True
-                    )
-                    logger.info(f"Created async tracking job {request_id} for video {video_id}")
-                
-                # Update last_upload_time:
-                update_account_last_upload_time(user_id, account_username, now)
-                
-                account = get_account_by_username(user_id, account_username)
-                calculate_and_update_next_upload_time(account)
-                
-            # 3. Handle immediate uploads:
-            elif status_code == 200 and parsed.get('success') and parsed.get('uploaded'):
-                # Immediate successful upload
-                update_video_status(video_id, 'posted')
-                update_account_last_upload_time(user_id, account_username, now)
-                
-                account = get_account_by_username(user_id, account_username)
-                calculate_and_update_next_upload_time(account)
-                
-                # Save post URLs
-                post_urls = parsed.get('post_urls', {})
-                if post_urls:
-                    # Join multiple URLs if multiple platforms  ^q  w
-                    urls_str = ' | '.join([f"{p}: {url}" for p, url in post_urls.items()])
-                    update_video_post_url(video_id, urls_str)
-                    logger.info(f"Video {video_id} posted with URLs: {urls_str}")
-                else:
-                    logger.info(f"Video {video_id} posted successfully (couldn't fetch URL)")
-            
-            # Handle partial success:
-            elif status_code == 207 and parsed.get('success') and parsed.get('partial'):
-                # Partial success
-                update_video_status(video_id, 'partial')
-                update_account_last_upload_time(user_id, account_username, now)
-                
-                account = get_account_by_username(user_id, account_username)
-                calculate_and_update_next_upload_time(account)
-                
-                post_urls = parsed.get('post_urls', {})
-                if post_urls:
-                    urls_str = ' | '.join([f"{p}: {url}" for p, url in post_urls.items()])
-                    update_video_post_url(video_id, urls_str)
-                    logger.info(f"Video {video_id} partially posted with URLs: {urls_str}")
-                else:
-                    logger.info(f"Video {video_id} partially posted")
-            
-            else:
-                # Failed upload
-                update_video_status(video_id, 'failed')
-                logger.error(f"Video {video_id} upload failed")
-                
+            event = upload_event_for(response, response_status)
+            logger.info(f"Tracking upload - source: {event.source}, video: {event.video_id}, "
+                        f"user: {event.user_id}, account: {event.account_username}, event: {type(event).__name__}")
+            publish(event)
         except Exception as e:
-            logger.error(f"Error tracking upload for video {video_id}: {str(e)}")
-        
-        return response
-    
+            logger.error(f"Error tracking upload: {str(e)}")
+
+        return response, response_status
+
     return wrapper
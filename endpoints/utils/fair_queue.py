@@ -0,0 +1,183 @@
+import os
+import time
+import logging
+import threading
+from collections import deque, OrderedDict
+from contextlib import contextmanager
+from dotenv import load_dotenv
+from utils import metrics
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Uploads to Upload-Post in flight at once, over all users
+UPLOAD_CONCURRENCY = int(os.getenv('UPLOAD_CONCURRENCY', '4'))
+# Default cap per user_id, and overrides like "123:4,456:1"
+UPLOAD_PER_USER_CONCURRENCY = int(os.getenv('UPLOAD_PER_USER_CONCURRENCY', '2'))
+UPLOAD_USER_CONCURRENCY = os.getenv('UPLOAD_USER_CONCURRENCY', '')
+# Bytes a user may send per round before the next user gets a turn
+UPLOAD_FAIR_QUANTUM_MB = float(os.getenv('UPLOAD_FAIR_QUANTUM_MB', '64'))
+
+metrics.describe('upload_gate_in_flight', 'gauge', 'Uploads currently admitted to Upload-Post')
+metrics.describe('upload_gate_waiting', 'gauge', 'Uploads waiting for a slot')
+metrics.describe('upload_gate_wait_seconds_total', 'counter', 'Time uploads spent waiting for a slot')
+
+
+def _parse_caps(raw):
+    caps = {}
+    for item in raw.split(','):
+        user_id, _, cap = item.partition(':')
+        if user_id.strip() and cap.strip():
+            caps[user_id.strip()] = int(cap)
+    return caps
+
+
+class _Waiter:
+    __slots__ = ('cost', 'event')
+
+    def __init__(self, cost):
+        self.cost = cost
+        self.event = threading.Event()
+
+
+class FairGate:
+    """
+    Admission control for upstream uploads, fair between users.
+
+    At most `capacity` uploads run at once and at most a user's cap per user.
+    Waiters queue per user_id and free slots are handed out by deficit
+    round-robin: each turn a user's deficit grows by `quantum` and they are
+    admitted while their next upload's cost (its size) fits into it. A user
+    with 500 queued videos therefore gets the same share of slots as a user
+    with one, instead of everyone queueing behind them.
+    """
+
+    def __init__(self, capacity, per_user, quantum, user_caps=None):
+        self.capacity = max(capacity, 1)
+        self.per_user = max(per_user, 1)
+        self.quantum = max(quantum, 1)
+        self.user_caps = user_caps or {}
+        self._lock = threading.Lock()
+        self._queues = OrderedDict()  # user_id -> deque of waiters, in round-robin order
+        self._deficits = {}
+        self._running = {}
+        self._in_flight = 0
+
+    def cap_for(self, user_id):
+        return self.user_caps.get(user_id, self.per_user)
+
+    def running(self, user_id):
+        with self._lock:
+            return self._running.get(user_id, 0)
+
+    def _admit(self, user_id, waiter):
+        self._in_flight += 1
+        self._running[user_id] = self._running.get(user_id, 0) + 1
+        waiter.event.set()
+
+    def _schedule(self):
+        """Hand free slots to waiting users, one deficit round-robin turn each"""
+        while self._in_flight < self.capacity and self._queues:
+            progressed = False
+            for user_id in list(self._queues):
+                if self._in_flight >= self.capacity:
+                    break
+                queue = self._queues[user_id]
+                if self._running.get(user_id, 0) >= self.cap_for(user_id):
+                    continue
+
+                self._deficits[user_id] = self._deficits.get(user_id, 0) + self.quantum
+                while (queue and self._in_flight < self.capacity
+                       and self._running.get(user_id, 0) < self.cap_for(user_id)
+                       and queue[0].cost <= self._deficits[user_id]):
+                    waiter = queue.popleft()
+                    self._deficits[user_id] -= waiter.cost
+                    self._admit(user_id, waiter)
+                    progressed = True
+
+                # Served users go to the back of the round
+                self._queues.move_to_end(user_id)
+                if not queue:
+                    del self._queues[user_id]
+                    self._deficits.pop(user_id, None)
+                progressed = progressed or bool(queue)
+
+            if not progressed:
+                break
+
+    def _release(self, user_id):
+        with self._lock:
+            self._in_flight -= 1
+            self._running[user_id] -= 1
+            if not self._running[user_id]:
+                del self._running[user_id]
+            self._schedule()
+
+    @contextmanager
+    def slot(self, user_id, cost=1):
+        """Hold one upload slot for user_id while the block runs"""
+        user_id = str(user_id or 'anonymous')
+        waiter = _Waiter(max(cost, 1))
+        started = time.monotonic()
+        with self._lock:
+            self._queues.setdefault(user_id, deque()).append(waiter)
+            self._schedule()
+
+        waiter.event.wait()
+        waited = time.monotonic() - started
+        metrics.inc('upload_gate_wait_seconds_total', waited)
+        if waited > 1:
+            logger.info(f"Upload for user {user_id} waited {waited:.2f}s for a slot")
+
+        try:
+            yield
+        finally:
+            self._release(user_id)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'in_flight': self._in_flight,
+                'waiting': sum(len(q) for q in self._queues.values()),
+            }
+
+
+upload_gate = FairGate(
+    UPLOAD_CONCURRENCY,
+    UPLOAD_PER_USER_CONCURRENCY,
+    UPLOAD_FAIR_QUANTUM_MB * 1024 * 1024,
+    _parse_caps(UPLOAD_USER_CONCURRENCY)
+)
+
+
+def _collect_gate_metrics():
+    stats = upload_gate.stats()
+    yield 'upload_gate_in_flight', {}, stats['in_flight']
+    yield 'upload_gate_waiting', {}, stats['waiting']
+
+
+metrics.register_collector(_collect_gate_metrics)
+
+
+def round_robin_by_user(jobs, limit_for):
+    """
+    Interleave jobs so every user gets a turn before anyone gets a second one.
+    limit_for(user_id) caps how many of a user's jobs are taken; jobs keep their
+    order within a user. Returns the selected jobs.
+    """
+    by_user = OrderedDict()
+    for job in jobs:
+        by_user.setdefault(str(job['user_id']), deque()).append(job)
+
+    limits = {user_id: limit_for(user_id) for user_id in by_user}
+    selected = []
+    while by_user:
+        for user_id in list(by_user):
+            queue = by_user[user_id]
+            if limits[user_id] <= 0 or not queue:
+                del by_user[user_id]
+                continue
+            selected.append(queue.popleft())
+            limits[user_id] -= 1
+    return selected
@@ -0,0 +1,38 @@
+import os
+import time
+import hashlib
+
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    """Content hash of a file, read in chunks"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def cache_hit(path):
+    """Check a cache entry and mark it as recently used"""
+    if not os.path.exists(path):
+        return False
+    os.utime(path)  # keep hot entries from being pruned
+    return True
+
+
+def prune_cache(cache_dir, max_age_days):
+    """Remove cache entries that were not used for max_age_days"""
+    if not os.path.isdir(cache_dir):
+        return 0
+
+    cutoff = time.time() - max_age_days * 86400
+    removed = 0
+    for name in os.listdir(cache_dir):
+        path = os.path.join(cache_dir, name)
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+                removed += 1
+        except OSError:
+            pass
+    return removed
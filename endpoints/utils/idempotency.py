@@ -0,0 +1,129 @@
+from functools import wraps
+from flask import request, jsonify, make_response, Response
+from datetime import datetime, timedelta
+from dotenv import load_dotenv
+from models.db import (
+    create_idempotency_key, get_idempotency_key, complete_idempotency_key,
+    delete_idempotency_key, delete_expired_idempotency_keys, take_over_idempotency_key
+)
+import hashlib
+import json
+import logging
+import os
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_TTL_HOURS = int(os.getenv('IDEMPOTENCY_TTL_HOURS', '24'))
+# A key still in progress after this long lost its worker (crash, kill) and a retry may take it over.
+# Keep it above the longest request: transcode, upload and their timeouts
+IDEMPOTENCY_LEASE_SECONDS = int(os.getenv('IDEMPOTENCY_LEASE_SECONDS', '1800'))
+MAX_KEY_LENGTH = 255
+
+
+def _fingerprint():
+    """Hash of what the request asks for, without reading uploaded file contents"""
+    digest = hashlib.sha256()
+    digest.update(request.path.encode())
+
+    body = request.get_json(silent=True) if request.is_json else None
+    if body is not None:
+        digest.update(json.dumps(body, sort_keys=True).encode())
+    else:
+        for key, value in sorted(request.form.items(multi=True)):
+            digest.update(f'{key}={value}\n'.encode())
+        for key, file in sorted(request.files.items(multi=True), key=lambda item: (item[0], item[1].filename or '')):
+            digest.update(f'{key}@{file.filename}\n'.encode())
+
+    return digest.hexdigest()
+
+
+def _is_expired(entry):
+    cutoff = datetime.utcnow() - timedelta(hours=IDEMPOTENCY_TTL_HOURS)
+    return entry['created_at'] < cutoff.isoformat()
+
+
+def _is_abandoned(entry):
+    cutoff = datetime.utcnow() - timedelta(seconds=IDEMPOTENCY_LEASE_SECONDS)
+    return entry['status'] != 'completed' and entry['created_at'] < cutoff.isoformat()
+
+
+def _replay(entry):
+    response = Response(entry['response_body'], status=entry['response_status'],
+                        mimetype=entry['response_mimetype'] or 'application/json')
+    response.headers['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def idempotent(func):
+    """
+    Decorator honouring an Idempotency-Key header.
+    The first response for a key is stored and replayed for duplicates within
+    the TTL, so retried uploads are not posted twice. Server errors are not
+    stored; the key is released so the client can retry for real. A key left
+    in progress past IDEMPOTENCY_LEASE_SECONDS is taken over by the retry.
+    Requests without the header are handled as before.
+    """
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        key = request.headers.get('Idempotency-Key')
+        if not key:
+            return func(*args, **kwargs)
+
+        if len(key) > MAX_KEY_LENGTH:
+            return jsonify({'error': f'Idempotency-Key must be at most {MAX_KEY_LENGTH} characters'}), 400
+
+        endpoint = request.path
+        fingerprint = _fingerprint()
+        # Identifies this claim, a late finish of an abandoned one must not touch a takeover
+        claimed_at = datetime.utcnow().isoformat()
+
+        if create_idempotency_key(key, endpoint, fingerprint, claimed_at) is None:
+            entry = get_idempotency_key(key, endpoint)
+
+            if entry and _is_expired(entry):
+                delete_idempotency_key(key, endpoint)
+                entry = (None if create_idempotency_key(key, endpoint, fingerprint, claimed_at)
+                         else get_idempotency_key(key, endpoint))
+
+            if entry:
+                if entry['fingerprint'] != fingerprint:
+                    return jsonify({'error': 'Idempotency-Key was already used for a different request'}), 422
+
+                if _is_abandoned(entry) and take_over_idempotency_key(key, endpoint, fingerprint,
+                                                                      entry['created_at'], claimed_at):
+                    logger.warning(f"Taking over idempotency key {key} on {endpoint}, "
+                                   f"in progress since {entry['created_at']}")
+                    entry = None
+
+            if entry:
+                if entry['status'] != 'completed':
+                    response = jsonify({'error': 'A request with this Idempotency-Key is still in progress'})
+                    response.headers['Retry-After'] = '5'
+                    return response, 409
+
+                logger.info(f"Replaying stored response for idempotency key {key} on {endpoint}")
+                return _replay(entry)
+
+        try:
+            response = make_response(func(*args, **kwargs))
+        except Exception:
+            delete_idempotency_key(key, endpoint, claimed_at)
+            raise
+
+        if response.status_code >= 500:
+            delete_idempotency_key(key, endpoint, claimed_at)
+        else:
+            complete_idempotency_key(key, endpoint, response.status_code,
+                                     response.get_data(as_text=True), response.mimetype, claimed_at)
+
+        return response
+
+    return wrapper
+
+
+def expire_idempotency_keys():
+    """Drop keys older than the TTL"""
+    cutoff = (datetime.utcnow() - timedelta(hours=IDEMPOTENCY_TTL_HOURS)).isoformat()
+    return delete_expired_idempotency_keys(cutoff)
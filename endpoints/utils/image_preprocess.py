@@ -0,0 +1,123 @@
+import os
+import time
+import logging
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from dotenv import load_dotenv
+from PIL import Image, ImageOps
+from utils.file_cache import file_sha256, cache_hit, prune_cache
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+CAROUSEL_PREPROCESS = os.getenv('CAROUSEL_PREPROCESS', 'false').lower() in ['true', '1', 'yes']
+IMAGE_WORKERS = int(os.getenv('IMAGE_WORKERS', str(os.cpu_count() or 2)))
+IMAGE_JPEG_QUALITY = int(os.getenv('IMAGE_JPEG_QUALITY', '88'))
+IMAGE_CACHE_MAX_AGE_DAYS = int(os.getenv('IMAGE_CACHE_MAX_AGE_DAYS', '7'))
+
+# Largest (width, height) each platform keeps, anything bigger is downscaled by them anyway
+PLATFORM_MAX_SIZE = {
+    'instagram': (1080, 1350),
+    'tiktok': (1080, 1920),
+    'threads': (1440, 1920),
+    'facebook': (2048, 2048),
+    'linkedin': (2048, 2048),
+    'pinterest': (1000, 1500),
+    'x': (4096, 4096),
+}
+DEFAULT_MAX_SIZE = (2048, 2048)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(max_workers=IMAGE_WORKERS)
+        return _executor
+
+
+def target_size(platforms):
+    """Bounding box that satisfies the most demanding of the target platforms"""
+    sizes = [PLATFORM_MAX_SIZE.get(p.lower(), DEFAULT_MAX_SIZE) for p in platforms] or [DEFAULT_MAX_SIZE]
+    return max(w for w, _ in sizes), max(h for _, h in sizes)
+
+
+def _process_image(src_path, cache_dir, max_size, quality):
+    """
+    Runs in a worker process.
+    Decode, apply EXIF orientation, fit into max_size and re-encode as JPEG.
+    Returns the cached output path, or src_path if recompressing would not help.
+    """
+    content_hash = file_sha256(src_path)
+    out_path = os.path.join(cache_dir, f'{content_hash}_{max_size[0]}x{max_size[1]}_q{quality}.jpg')
+
+    if cache_hit(out_path):
+        return out_path
+
+    with Image.open(src_path) as img:
+        needs_rotation = img.getexif().get(0x0112, 1) != 1
+        oriented = ImageOps.exif_transpose(img)
+        oriented_size = oriented.size
+        oriented.thumbnail(max_size, Image.Resampling.LANCZOS)
+        resized = oriented.size != oriented_size
+
+        if oriented.mode in ('RGBA', 'LA', 'P'):
+            rgba = oriented.convert('RGBA')
+            flattened = Image.new('RGB', rgba.size, (255, 255, 255))
+            flattened.paste(rgba, mask=rgba.getchannel('A'))
+            oriented = flattened
+        elif oriented.mode != 'RGB':
+            oriented = oriented.convert('RGB')
+
+        tmp_path = f'{out_path}.{os.getpid()}.tmp'
+        oriented.save(tmp_path, 'JPEG', quality=quality, optimize=True, progressive=True)
+
+    # Re-encoding an already small, upright JPEG can make it bigger - keep the original then
+    if not resized and not needs_rotation and os.path.getsize(tmp_path) >= os.path.getsize(src_path):
+        os.remove(tmp_path)
+        return src_path
+
+    os.replace(tmp_path, out_path)
+    return out_path
+
+
+def preprocess_images(paths, platforms, cache_dir):
+    """
+    Preprocess carousel images in parallel.
+    Returns output paths in the same order. Images that fail to process
+    are passed through unchanged, so preprocessing never blocks an upload.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    max_size = target_size(platforms)
+    executor = _get_executor()
+
+    started = time.monotonic()
+    futures = [
+        executor.submit(_process_image, path, cache_dir, max_size, IMAGE_JPEG_QUALITY)
+        for path in paths
+    ]
+
+    results = []
+    for path, future in zip(paths, futures):
+        try:
+            results.append(future.result())
+        except Exception as e:
+            logger.warning(f"Preprocessing {path} failed, uploading original: {e}")
+            results.append(path)
+
+    bytes_in = sum(os.path.getsize(p) for p in paths)
+    bytes_out = sum(os.path.getsize(p) for p in results)
+    logger.info(
+        f"Preprocessed {len(paths)} images to {max_size[0]}x{max_size[1]} in "
+        f"{time.monotonic() - started:.2f}s ({bytes_in} -> {bytes_out} bytes)"
+    )
+    return results
+
+
+def prune_image_cache(cache_dir, max_age_days=IMAGE_CACHE_MAX_AGE_DAYS):
+    """Remove cached images that were not used for max_age_days"""
+    return prune_cache(cache_dir, max_age_days)
@@ -0,0 +1,195 @@
+import os
+import uuid
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+import pytz
+from dotenv import load_dotenv
+from models.db import (
+    create_held_job, get_due_held_jobs, set_held_job_status, mark_job_dispatched, release_stale_dispatches,
+    update_video_status, remove_scheduled_time, delete_posted_media
+)
+from scheduling_core import parse_iso
+from utils.upload_handler import parse_upload_response
+from utils.resilience import CircuitOpenError
+from utils.fair_queue import upload_gate, round_robin_by_user
+from utils.events import publish, UploadCompleted, UploadFailed
+from utils import metrics
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+JIT_UPLOADS = os.getenv('JIT_UPLOADS', 'false').lower() in ['true', '1', 'yes']
+# Only posts further ahead than this are held, nearer ones go upstream right away
+JIT_HOLD_AFTER_MINUTES = int(os.getenv('JIT_HOLD_AFTER_MINUTES', '60'))
+# How long before its slot a held post is handed to Upload-Post
+JIT_DISPATCH_LEAD_MINUTES = int(os.getenv('JIT_DISPATCH_LEAD_MINUTES', '15'))
+JIT_DISPATCH_WORKERS = int(os.getenv('JIT_DISPATCH_WORKERS', '2'))
+# A job still 'dispatching' after this long was lost (crash, restart) and is held again.
+# Keep it above the longest upload, or a slow one may be sent twice
+JIT_DISPATCH_LEASE_MINUTES = int(os.getenv('JIT_DISPATCH_LEASE_MINUTES', '60'))
+
+metrics.describe('jit_uploads_total', 'counter',
+                 'Just-in-time uploads by outcome (held, dispatched, failed, deferred, reclaimed)')
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # Few workers on purpose - dispatches are spread over time, not run in bursts
+            _executor = ThreadPoolExecutor(max_workers=JIT_DISPATCH_WORKERS)
+        return _executor
+
+
+def should_hold(scheduled_date):
+    """True if the post is far enough ahead to be kept locally until its slot"""
+    if not JIT_UPLOADS or not scheduled_date:
+        return False
+    try:
+        slot = parse_iso(scheduled_date)
+    except ValueError:
+        return False
+    return slot - datetime.now(pytz.UTC) > timedelta(minutes=JIT_HOLD_AFTER_MINUTES)
+
+
+def hold_upload(path, held_dir, fields, scheduled_date, video_id, user_id):
+    """
+    Move the prepared file into held_dir and record a held job for it.
+    Returns the response body the route answers with - shaped like
+    Upload-Post's scheduled response, so tracking and the bot need no changes.
+    """
+    job_id = f'held-{uuid.uuid4().hex}'
+    os.makedirs(held_dir, exist_ok=True)
+    held_path = os.path.join(held_dir, f'{job_id}.mp4')
+    os.replace(path, held_path)
+
+    slot = parse_iso(scheduled_date).astimezone(pytz.UTC).replace(tzinfo=None)
+    dispatch_at = (slot - timedelta(minutes=JIT_DISPATCH_LEAD_MINUTES)).isoformat()
+    payload = {
+        'title': fields['title'],
+        'platforms': fields['platforms'],
+        'params': fields['params'],
+        'transcode': fields['transcode'],
+    }
+    create_held_job(job_id, video_id, fields['user'], user_id, scheduled_date, dispatch_at, held_path, payload)
+
+    metrics.inc('jit_uploads_total', outcome='held')
+    logger.info(f"Holding video {video_id} for {fields['user']} until {dispatch_at} (job {job_id})")
+    return {
+        'success': True,
+        'job_id': job_id,
+        'scheduled_date': scheduled_date,
+        'held': True,
+        'warnings': []
+    }
+
+
+def _dispatch(job, send):
+    job_id = job['job_id']
+    response = None
+    try:
+        # A slot missed while the service was down is posted right away
+        scheduled_date = job['scheduled_date']
+        if parse_iso(scheduled_date) <= datetime.now(pytz.UTC):
+            scheduled_date = None
+
+        response = send(job, scheduled_date)
+        status_code, parsed = parse_upload_response(response)
+    except CircuitOpenError as e:
+        # Upload-Post is down, keep the file and try again on the next run
+        set_held_job_status(job_id, 'held', expected='dispatching')
+        metrics.inc('jit_uploads_total', outcome='deferred')
+        logger.warning(f"Deferred held job {job_id}: {e}")
+        return
+    except Exception as e:
+        logger.error(f"Dispatching held job {job_id} failed: {e}", exc_info=True)
+        status_code, parsed = 500, {}
+
+    if response and response.get('scheduled_date') and not response.get('job_id'):
+        # Scheduled upstream, but with nothing the job checker could follow up on
+        logger.error(f"Upload-Post scheduled held job {job_id} without returning a job id")
+        _fail(job, reason='Upload-Post returned no job id')
+        return
+
+    if status_code == 202 and parsed.get('scheduled'):
+        mark_job_dispatched(job_id, parsed.get('job_id'))
+        logger.info(f"Held job {job_id} handed to Upload-Post as {parsed.get('job_id')}")
+    elif status_code == 200 and parsed.get('async'):
+        mark_job_dispatched(job_id, parsed.get('request_id'), is_async=True)
+        update_video_status(job['video_id'], 'uploading')
+        logger.info(f"Held job {job_id} uploading asynchronously as {parsed.get('request_id')}")
+    elif status_code in [200, 207] and parsed.get('success'):
+        mark_job_dispatched(job_id, None, status='completed')
+        remove_scheduled_time(job['user_id'], job['account_username'], job['scheduled_date'])
+        logger.info(f"Held job {job_id} posted immediately")
+        publish(UploadCompleted(
+            **_event_fields(job),
+            post_urls=parsed.get('post_urls', {}),
+            succeeded_platforms=parsed.get('succeeded_platforms', []),
+            partial=bool(parsed.get('partial'))
+        ))
+    else:
+        _fail(job)
+        return
+
+    metrics.inc('jit_uploads_total', outcome='dispatched')
+
+
+def _event_fields(job):
+    # The video was registered when the job was held, nobody waits on the response
+    return {
+        'video_id': job['video_id'],
+        'user_id': job['user_id'],
+        'account_username': job['account_username'],
+        'platforms': job['payload'].get('platforms', []),
+        'source': 'dispatcher',
+        'notify': True,
+    }
+
+
+def _fail(job, reason='dispatch failed'):
+    mark_job_dispatched(job['job_id'], None, status='failed')
+    delete_posted_media(job['job_id'], job['user_id'], job['account_username'])
+    remove_scheduled_time(job['user_id'], job['account_username'], job['scheduled_date'])
+    if job.get('file_path') and os.path.exists(job['file_path']):
+        os.remove(job['file_path'])
+
+    metrics.inc('jit_uploads_total', outcome='failed')
+    logger.error(f"Held job {job['job_id']} failed")
+    publish(UploadFailed(**_event_fields(job), reason=reason))
+
+
+def dispatch_due_uploads(send):
+    """
+    Hand held posts whose dispatch time has come to Upload-Post.
+    send(job, scheduled_date) performs the upload from job['file_path'] and returns
+    Upload-Post's response; it owns the file and removes it. Jobs whose dispatch
+    lease ran out are held again first. Returns the number submitted.
+    """
+    lease_start = datetime.utcnow() - timedelta(minutes=JIT_DISPATCH_LEASE_MINUTES)
+    for job_id in release_stale_dispatches(lease_start.isoformat()):
+        metrics.inc('jit_uploads_total', outcome='reclaimed')
+        logger.warning(f"Held job {job_id} was still dispatching after {JIT_DISPATCH_LEASE_MINUTES} minutes, held again")
+
+    # Each user gets as many jobs as they have free upload slots, interleaved, so one
+    # user's batch cannot fill the worker queue. The rest stay held for the next run.
+    due = round_robin_by_user(
+        get_due_held_jobs(datetime.utcnow().isoformat()),
+        lambda user_id: upload_gate.cap_for(user_id) - upload_gate.running(user_id)
+    )
+    submitted = 0
+    for job in due:
+        if not set_held_job_status(job['job_id'], 'dispatching', expected='held'):
+            continue
+        _get_executor().submit(_dispatch, job, send)
+        submitted += 1
+
+    if submitted:
+        logger.info(f"Dispatching {submitted} held uploads")
+    return submitted
@@ -1,10 +1,11 @@
 import os
-import requests
 import logging
+from utils.resilience import request as upstream_request
 from models.db import (
     get_accounts, get_pending_scheduled_jobs, get_pending_async_jobs, update_job_status, 
     update_video_status, update_video_post_url, 
-    update_account_last_upload_time, remove_scheduled_time, clear_old_scheduled_times)
+    update_account_last_upload_time, remove_scheduled_time, clear_old_scheduled_times,
+    delete_posted_media)
 from dotenv import load_dotenv
 from datetime import datetime
 
@@ -73,6 +74,8 @@ def check_scheduled_jobs():
                         else:
                             logger.error(f"Job {job_id} failed")
                             update_job_status(job_id, 'failed')
+                            # Never went out, so the same content may be posted again
+                            delete_posted_media(job['job_id'], job['user_id'], job['account_username'])
                             
                             remove_scheduled_time(job['user_id'], job['account_username'], job['scheduled_date'])
                             logger.info(f"✅ Removed failed job {job_id} from {job['account_username']}'s queue")
@@ -110,7 +113,8 @@ def fetch_upload_history(limit=100):
         list: Array of upload history items
     """
     try:
-        response = requests.get(
+        response = upstream_request(
+            'upload_post', 'GET',
             f'{UPLOAD_POST_API_URL}/history',
             params={'limit': limit},
             headers={'Authorization': f'Apikey {UPLOAD_POST_API_KEY}'}
@@ -167,7 +171,7 @@ def send_telegram_message(user_id, message):
     try:
         url = f'https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage'
         
-        response = requests.post(url, json={
+        response = upstream_request('telegram', 'POST', url, json={
             'chat_id': user_id,
             'text': message,
             'parse_mode': 'HTML'
@@ -183,7 +187,8 @@ def send_telegram_message(user_id, message):
 def check_async_upload_status(job, request_id):
     """Check status of async upload using request_id"""
     try:
-        response = requests.get(
+        response = upstream_request(
+            'upload_post', 'GET',
             f'{UPLOAD_POST_API_URL}/status',
             params={'request_id': request_id},
             headers={'Authorization': f'Apikey {UPLOAD_POST_API_KEY}'}
@@ -220,6 +225,8 @@ def check_async_upload_status(job, request_id):
                 # Determine final status
                 if failed:
                     update_video_status(job['video_id'], 'partial')
+                    delete_posted_media(job['job_id'], job['user_id'], job['account_username'],
+                                        platforms=[r.get('platform') for r in failed])
                     update_job_status(request_id, 'completed', urls_str if post_urls else None)
                 else:
                     update_video_status(job['video_id'], 'posted')
@@ -246,6 +253,7 @@ def check_async_upload_status(job, request_id):
                 # All failed
                 update_video_status(job['video_id'], 'failed')
                 update_job_status(request_id, 'failed')
+                delete_posted_media(job['job_id'], job['user_id'], job['account_username'])
                 
                 # Remove from scheduled_times even on failure
                 remove_scheduled_time(job['user_id'], job['account_username'], job['video_id'])
@@ -260,6 +268,7 @@ def check_async_upload_status(job, request_id):
         elif status == 'failed':
             update_video_status(job['video_id'], 'failed')
             update_job_status(request_id, 'failed')
+            delete_posted_media(job['job_id'], job['user_id'], job['account_username'])
             
             # Remove from scheduled_times
             remove_scheduled_time(job['user_id'], job['account_username'], job['video_id'])
@@ -0,0 +1,202 @@
+import os
+import socket
+import logging
+import threading
+import ipaddress
+import requests
+from urllib.parse import urlparse, urljoin
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import ConnectTimeoutError, NewConnectionError
+from urllib3.util.connection import create_connection
+from dotenv import load_dotenv
+from utils.resilience import request as upstream_request, call as call_upstream, CONNECT_TIMEOUT
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+TELEGRAM_BOT_TOKEN = os.getenv('BOT_TOKEN')
+# Point at a local Bot API server to lift the 20 MB download limit
+TELEGRAM_API_URL = os.getenv('TELEGRAM_API_URL', 'https://api.telegram.org').rstrip('/')
+MAX_DOWNLOAD_SIZE = int(os.getenv('MAX_DOWNLOAD_SIZE', str(2 * 1024 ** 3)))
+DOWNLOAD_READ_TIMEOUT = float(os.getenv('DOWNLOAD_READ_TIMEOUT', '60'))
+# Comma-separated hosts source_url may point at, empty allows any public host
+SOURCE_URL_ALLOWED_HOSTS = [h.strip().lower() for h in os.getenv('SOURCE_URL_ALLOWED_HOSTS', '').split(',') if h.strip()]
+# Redirects followed for source_url, every hop is validated like the URL itself
+SOURCE_URL_MAX_REDIRECTS = int(os.getenv('SOURCE_URL_MAX_REDIRECTS', '5'))
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+
+
+class FetchError(Exception):
+    """Raised when remote media cannot be fetched; status is the HTTP code to answer with"""
+
+    def __init__(self, message, status=502):
+        super().__init__(message)
+        self.status = status
+
+
+def _check_addresses(host, port):
+    """
+    Refuse hosts that resolve to loopback, private, link-local, reserved or
+    other non-public addresses. Returns the address to connect to.
+    """
+    try:
+        infos = socket.getaddrinfo(host, port, proto=socket.IPPROTO_TCP)
+    except socket.gaierror as e:
+        raise FetchError(f'Host {host} cannot be resolved', 400) from e
+    for info in infos:
+        address = ipaddress.ip_address(info[4][0].split('%')[0])
+        if not address.is_global or address.is_multicast:
+            raise FetchError(f'Host {host} resolves to a non-public address', 400)
+    return infos[0][4][0]
+
+
+def validate_source_url(url):
+    """
+    Only plain http(s) URLs to allowed hosts on public addresses. Returns
+    the checked address, connect to that one and not to a fresh lookup.
+    """
+    parsed = urlparse(url)
+    if parsed.scheme not in ('http', 'https') or not parsed.hostname:
+        raise FetchError('source_url must be an http(s) URL', 400)
+    if SOURCE_URL_ALLOWED_HOSTS and parsed.hostname.lower() not in SOURCE_URL_ALLOWED_HOSTS:
+        raise FetchError(f'Host {parsed.hostname} is not allowed', 400)
+    try:
+        port = parsed.port or (443 if parsed.scheme == 'https' else 80)
+    except ValueError as e:
+        raise FetchError('source_url has an invalid port', 400) from e
+    return _check_addresses(parsed.hostname, port)
+
+
+class _PinnedAdapter(HTTPAdapter):
+    """
+    Connects to one address, whatever the host name resolves to by now, so
+    a DNS answer that changes after the check (rebinding) is never used.
+    The Host header, SNI and certificate check keep the host name.
+    """
+
+    def __init__(self, address, **kwargs):
+        self._address = address
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        address = self._address
+
+        def new_conn(conn):
+            try:
+                return create_connection((address, conn.port), conn.timeout, source_address=conn.source_address,
+                                         socket_options=conn.socket_options)
+            except socket.timeout as e:
+                raise ConnectTimeoutError(conn, f'Connection to {conn.host} timed out') from e
+            except OSError as e:
+                raise NewConnectionError(conn, f'Failed to establish a new connection: {e}') from e
+
+        def pinned(pool_cls):
+            connection_cls = type(f'Pinned{pool_cls.ConnectionCls.__name__}', (pool_cls.ConnectionCls,),
+                                  {'_new_conn': new_conn})
+            return type(f'Pinned{pool_cls.__name__}', (pool_cls,), {'ConnectionCls': connection_cls})
+
+        self.poolmanager.pool_classes_by_scheme = {
+            scheme: pinned(pool_cls) for scheme, pool_cls in self.poolmanager.pool_classes_by_scheme.items()
+        }
+
+
+def _pinned_session(address):
+    session = requests.Session()
+    # A proxy would do its own lookup
+    session.trust_env = False
+    adapter = _PinnedAdapter(address)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def telegram_file_url(file_id):
+    """Resolve a Telegram file_id to a download URL via getFile"""
+    if not TELEGRAM_BOT_TOKEN:
+        raise FetchError('Telegram file ids need BOT_TOKEN to be configured', 400)
+
+    try:
+        response = upstream_request(
+            'telegram', 'GET', f'{TELEGRAM_API_URL}/bot{TELEGRAM_BOT_TOKEN}/getFile',
+            params={'file_id': file_id}
+        )
+    except requests.RequestException as e:
+        raise FetchError(f'Telegram getFile failed: {type(e).__name__}') from e
+    data = response.json() if response.content else {}
+    if response.status_code != 200 or not data.get('ok'):
+        raise FetchError(f"Telegram getFile failed: {data.get('description', response.status_code)}",
+                         400 if response.status_code == 400 else 502)
+
+    return f"{TELEGRAM_API_URL}/file/bot{TELEGRAM_BOT_TOKEN}/{data['result']['file_path']}"
+
+
+def _open_source(url):
+    """
+    GET a source_url as a stream. Redirects are followed by hand and each
+    hop is validated, then fetched from the address that passed the check,
+    so neither a 302 nor a second DNS answer can get around it. Returns
+    (response, final host).
+    """
+    for _ in range(SOURCE_URL_MAX_REDIRECTS + 1):
+        session = _pinned_session(validate_source_url(url))
+        response = call_upstream('media_source', session.request, 'GET', url, stream=True, allow_redirects=False,
+                                 timeout=(CONNECT_TIMEOUT, DOWNLOAD_READ_TIMEOUT))
+        if not response.is_redirect:
+            return response, urlparse(url).hostname
+        url = urljoin(url, response.headers['Location'])
+        response.close()
+    raise FetchError(f'Source redirected more than {SOURCE_URL_MAX_REDIRECTS} times')
+
+
+def download_to_file(url, dest_path, upstream=None, max_bytes=MAX_DOWNLOAD_SIZE):
+    """
+    Stream url into dest_path, one chunk in memory at a time.
+    Without an upstream url is a source_url: every redirect hop is
+    validated and the media_source circuit breaker applies.
+    Written to a .part file and renamed, so dest_path is either complete or absent.
+    Returns the number of bytes written.
+    """
+    tmp_path = f'{dest_path}.{os.getpid()}.{threading.get_ident()}.part'
+    host = urlparse(url).hostname
+    written = 0
+
+    try:
+        if upstream:
+            response = upstream_request(upstream, 'GET', url, stream=True, read_timeout=DOWNLOAD_READ_TIMEOUT)
+        else:
+            response, host = _open_source(url)
+        with response:
+            if response.status_code != 200:
+                raise FetchError(f'Source returned HTTP {response.status_code}')
+
+            length = response.headers.get('Content-Length')
+            if length and length.isdigit() and int(length) > max_bytes:
+                raise FetchError(f'Source is {length} bytes, limit is {max_bytes}', 413)
+
+            with open(tmp_path, 'wb') as f:
+                for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                    written += len(chunk)
+                    if written > max_bytes:
+                        raise FetchError(f'Source exceeds the {max_bytes} byte limit', 413)
+                    f.write(chunk)
+    except Exception as e:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        if isinstance(e, requests.RequestException):
+            # The message would carry the URL, which for Telegram contains the bot token
+            raise FetchError(f'Download from {host} failed: {type(e).__name__}') from e
+        raise
+
+    os.replace(tmp_path, dest_path)
+    logger.info(f"Downloaded {written} bytes from {host} to {dest_path}")
+    return written
+
+
+def fetch_media(dest_path, source_url=None, telegram_file_id=None):
+    """Download media given either a source_url or a Telegram file_id"""
+    if telegram_file_id:
+        return download_to_file(telegram_file_url(telegram_file_id), dest_path, upstream='telegram')
+
+    return download_to_file(source_url, dest_path)
@@ -0,0 +1,179 @@
+import os
+import shutil
+import logging
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+from werkzeug.utils import secure_filename
+from models.db import (
+    get_video_by_id, update_video_media, save_media_cache_entry, get_media_cache_entry,
+    get_media_cache_size, get_least_recently_used_media, delete_media_cache_entry
+)
+from utils.media_fetch import fetch_media
+from utils.media_probe import probe_media
+from utils.thumbnails import generate_frames_async
+from utils import metrics
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+MEDIA_LIBRARY_PREFETCH = os.getenv('MEDIA_LIBRARY_PREFETCH', 'true').lower() in ['true', '1', 'yes']
+MEDIA_LIBRARY_MAX_BYTES = int(float(os.getenv('MEDIA_LIBRARY_MAX_GB', '20')) * 1024 ** 3)
+MEDIA_LIBRARY_WORKERS = int(os.getenv('MEDIA_LIBRARY_WORKERS', '2'))
+
+metrics.describe('media_library_bytes', 'gauge', 'Bytes held by the local media library')
+metrics.describe('media_library_files', 'gauge', 'Files held by the local media library')
+metrics.describe('media_library_requests_total', 'counter', 'Library lookups by result (hit, miss)')
+metrics.describe('media_library_evictions_total', 'counter', 'Files evicted to stay under the disk budget')
+
+_executor = None
+_executor_lock = threading.Lock()
+# cache_key -> [lock, holders], dropped once the last holder leaves
+_key_locks = {}
+_key_locks_guard = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=MEDIA_LIBRARY_WORKERS)
+        return _executor
+
+
+@contextmanager
+def _key_lock(cache_key):
+    """One download per file at a time, a concurrent request waits for it instead of fetching again"""
+    with _key_locks_guard:
+        entry = _key_locks.setdefault(cache_key, [threading.Lock(), 0])
+        entry[1] += 1
+    try:
+        with entry[0]:
+            yield
+    finally:
+        with _key_locks_guard:
+            entry[1] -= 1
+            if not entry[1]:
+                del _key_locks[cache_key]
+
+
+def _collect_library_metrics():
+    size = get_media_cache_size()
+    yield 'media_library_bytes', {}, size['bytes']
+    yield 'media_library_files', {}, size['files']
+
+
+metrics.register_collector(_collect_library_metrics)
+
+
+def cache_key_for(video_id, file_unique_id=None):
+    """
+    Telegram file_ids differ between bots and over time, file_unique_id does not.
+    Fall back to the video_id when the client did not send one.
+    """
+    return file_unique_id or video_id
+
+
+def ensure_cached(library_dir, cache_key, telegram_file_id):
+    """
+    Return the path of the cached file, downloading it from Telegram on a miss.
+    """
+    with _key_lock(cache_key):
+        entry = get_media_cache_entry(cache_key)
+        if entry and os.path.exists(entry['file_path']):
+            metrics.inc('media_library_requests_total', result='hit')
+            return entry['file_path']
+        if entry:
+            # File was removed behind our back
+            delete_media_cache_entry(cache_key)
+
+        metrics.inc('media_library_requests_total', result='miss')
+        os.makedirs(library_dir, exist_ok=True)
+        path = os.path.join(library_dir, f'{secure_filename(cache_key)}.mp4')
+        size = fetch_media(path, telegram_file_id=telegram_file_id)
+        save_media_cache_entry(cache_key, path, size)
+
+    enforce_budget(keep=cache_key)
+    return path
+
+
+def enforce_budget(max_bytes=MEDIA_LIBRARY_MAX_BYTES, keep=None):
+    """Evict least recently used files until the library fits max_bytes"""
+    total = get_media_cache_size()['bytes']
+    evicted = 0
+
+    while total > max_bytes:
+        victims = [v for v in get_least_recently_used_media() if v['cache_key'] != keep]
+        if not victims:
+            break
+
+        for victim in victims:
+            if total <= max_bytes:
+                break
+            with _key_lock(victim['cache_key']):
+                if os.path.exists(victim['file_path']):
+                    os.remove(victim['file_path'])
+                delete_media_cache_entry(victim['cache_key'])
+            total -= victim['size']
+            evicted += 1
+
+    if evicted:
+        metrics.inc('media_library_evictions_total', evicted)
+        logger.info(f"Evicted {evicted} files from the media library, {total} bytes left")
+    return evicted
+
+
+def library_file_for_upload(library_dir, dest_path, video_id=None, telegram_file_id=None):
+    """
+    Materialize a library video at dest_path for the upload pipeline, which
+    deletes its input afterwards. A hard link shares the cached file's blocks,
+    so nothing is copied; other filesystems fall back to a copy.
+    """
+    video = get_video_by_id(video_id) if video_id else None
+    cache_key = cache_key_for(video_id or telegram_file_id, video.get('file_unique_id') if video else None)
+    file_id = telegram_file_id or video_id
+
+    for attempt in range(2):
+        cached_path = ensure_cached(library_dir, cache_key, file_id)
+        try:
+            os.link(cached_path, dest_path)
+            return dest_path
+        except FileNotFoundError:
+            # Evicted between lookup and link, fetch it again once
+            if attempt:
+                raise
+        except OSError:
+            shutil.copyfile(cached_path, dest_path)
+            return dest_path
+
+
+def library_path(video_id):
+    """Path of a library video that is already on disk, without downloading it"""
+    video = get_video_by_id(video_id)
+    if not video:
+        return None
+    entry = get_media_cache_entry(cache_key_for(video_id, video.get('file_unique_id')))
+    if entry and os.path.exists(entry['file_path']):
+        return entry['file_path']
+    return None
+
+
+def _prefetch(library_dir, video_id, file_unique_id, frames_dir):
+    try:
+        path = ensure_cached(library_dir, cache_key_for(video_id, file_unique_id), video_id)
+        # Probe while we have the file, so the metadata is on the row before the first upload
+        media = probe_media(path)
+        update_video_media(video_id, media)
+        if frames_dir:
+            generate_frames_async(video_id, path, frames_dir, duration=media.get('duration'),
+                                  content_hash=media['content_hash'])
+    except Exception as e:
+        logger.warning(f"Prefetching video {video_id} into the media library failed: {e}")
+
+
+def prefetch_video(library_dir, video_id, file_unique_id=None, frames_dir=None):
+    """Download a Telegram video into the library in the background, then extract its frames"""
+    if MEDIA_LIBRARY_PREFETCH:
+        _get_executor().submit(_prefetch, library_dir, video_id, file_unique_id, frames_dir)
@@ -0,0 +1,109 @@
+import os
+import time
+import logging
+import ffmpeg
+from dotenv import load_dotenv
+from utils.file_cache import file_sha256
+from models.db import get_media_probe, save_media_probe
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+VIDEO_PREFLIGHT = os.getenv('VIDEO_PREFLIGHT', 'true').lower() in ['true', '1', 'yes']
+
+# What each platform accepts. Durations in seconds, aspect ratio as width / height.
+# Tweak here when a platform changes its specs.
+PLATFORM_CONSTRAINTS = {
+    'tiktok': {'min_duration': 3, 'max_duration': 600, 'min_aspect': 0.5, 'max_aspect': 2.0,
+               'video_codecs': ['h264', 'hevc']},
+    'instagram': {'min_duration': 3, 'max_duration': 900, 'min_aspect': 0.5, 'max_aspect': 1.91,
+                  'video_codecs': ['h264', 'hevc']},
+    'youtube': {'min_duration': 1, 'max_duration': 43200, 'min_aspect': 0.3, 'max_aspect': 3.0,
+                'video_codecs': ['h264', 'hevc', 'vp9', 'av1', 'mpeg4']},
+    'facebook': {'min_duration': 1, 'max_duration': 14400, 'min_aspect': 0.5, 'max_aspect': 2.0,
+                 'video_codecs': ['h264', 'hevc']},
+    'threads': {'min_duration': 1, 'max_duration': 300, 'min_aspect': 0.5, 'max_aspect': 2.0,
+                'video_codecs': ['h264', 'hevc']},
+    'x': {'min_duration': 0.5, 'max_duration': 140, 'min_aspect': 0.33, 'max_aspect': 3.0,
+          'video_codecs': ['h264']},
+    'linkedin': {'min_duration': 3, 'max_duration': 900, 'min_aspect': 0.42, 'max_aspect': 2.4,
+                 'video_codecs': ['h264', 'hevc']},
+    'pinterest': {'min_duration': 4, 'max_duration': 900, 'min_aspect': 0.5, 'max_aspect': 2.0,
+                  'video_codecs': ['h264', 'hevc']},
+}
+
+
+def _extract(probe):
+    video = next((s for s in probe['streams'] if s.get('codec_type') == 'video'), None)
+    audio = next((s for s in probe['streams'] if s.get('codec_type') == 'audio'), None)
+    fmt = probe.get('format', {})
+
+    duration = float(fmt.get('duration') or (video or {}).get('duration') or 0)
+    bitrate = int(fmt.get('bit_rate') or 0)
+
+    return {
+        'duration': round(duration, 3),
+        'width': int(video['width']) if video else None,
+        'height': int(video['height']) if video else None,
+        'video_codec': video.get('codec_name') if video else None,
+        'audio_codec': audio.get('codec_name') if audio else None,
+        'bitrate': bitrate or None,
+    }
+
+
+def probe_media(path):
+    """
+    Probe a video once per content.
+    Returns a metadata dict (content_hash, duration, width, height, video_codec,
+    audio_codec, bitrate). Raises ValueError for files ffprobe cannot read.
+    """
+    started = time.monotonic()
+    content_hash = file_sha256(path)
+
+    media = get_media_probe(content_hash)
+    if media is None:
+        try:
+            media = _extract(ffmpeg.probe(path))
+        except ffmpeg.Error as e:
+            stderr = e.stderr.decode(errors='replace')[-300:] if e.stderr else ''
+            raise ValueError(f'Unreadable media file: {stderr}') from e
+        save_media_probe(content_hash, media)
+        logger.info(f"Probed {path} in {time.monotonic() - started:.3f}s: {media}")
+
+    return dict(media, content_hash=content_hash)
+
+
+def check_constraints(media, platforms, transcode=False):
+    """
+    Check probed metadata against the target platforms.
+    With transcode enabled the codec is fixed on our side, so only the
+    duration and aspect ratio are checked. Returns a list of problems.
+    """
+    if not media.get('video_codec'):
+        return ['No video stream found']
+
+    problems = []
+    duration = media.get('duration') or 0
+    aspect = media['width'] / media['height'] if media.get('height') else 0
+
+    for platform in platforms:
+        limits = PLATFORM_CONSTRAINTS.get(platform.lower())
+        if limits is None:
+            continue
+
+        if duration < limits['min_duration']:
+            problems.append(f"{platform}: video is {duration:.1f}s, minimum is {limits['min_duration']}s")
+        elif duration > limits['max_duration']:
+            problems.append(f"{platform}: video is {duration:.1f}s, maximum is {limits['max_duration']}s")
+
+        if aspect and not limits['min_aspect'] <= aspect <= limits['max_aspect']:
+            problems.append(
+                f"{platform}: aspect ratio {media['width']}x{media['height']} is outside "
+                f"{limits['min_aspect']}-{limits['max_aspect']}"
+            )
+
+        if not transcode and media['video_codec'] not in limits['video_codecs']:
+            problems.append(f"{platform}: codec {media['video_codec']} is not supported")
+
+    return problems
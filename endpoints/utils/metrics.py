@@ -0,0 +1,69 @@
+import threading
+
+_lock = threading.Lock()
+_counters = {}
+_gauges = {}
+_help = {}
+_collectors = []
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def describe(name, metric_type, help_text):
+    """Register HELP/TYPE lines for a metric"""
+    _help[name] = (metric_type, help_text)
+
+
+def inc(name, value=1, **labels):
+    """Increment a counter"""
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def set_gauge(name, value, **labels):
+    """Set a gauge to an absolute value"""
+    with _lock:
+        _gauges[_key(name, labels)] = value
+
+
+def register_collector(collector):
+    """
+    Register a function that is called on every scrape.
+    It returns an iterable of (name, labels_dict, value) samples.
+    """
+    _collectors.append(collector)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    inner = ','.join(f'{k}="{str(v)}"' for k, v in labels)
+    return '{' + inner + '}'
+
+
+def render():
+    """Render all metrics in the Prometheus text exposition format"""
+    with _lock:
+        samples = list(_counters.items()) + list(_gauges.items())
+
+    for collector in _collectors:
+        for name, labels, value in collector():
+            samples.append((_key(name, labels), value))
+
+    by_name = {}
+    for (name, labels), value in samples:
+        by_name.setdefault(name, []).append((labels, value))
+
+    lines = []
+    for name in sorted(by_name):
+        if name in _help:
+            metric_type, help_text = _help[name]
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {metric_type}')
+        for labels, value in sorted(by_name[name]):
+            lines.append(f'{name}{_format_labels(labels)} {value}')
+
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,249 @@
+import os
+import logging
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from dotenv import load_dotenv
+from models.db import get_accounts_with_autoposting, get_replannable_jobs, get_scheduled_jobs_by_ids, reschedule_jobs
+from scheduling_core import parse_iso, format_utc, replan_times
+from utils.job_checker import UPLOAD_POST_API_URL, UPLOAD_POST_API_KEY
+from utils.jit_dispatch import JIT_DISPATCH_LEAD_MINUTES
+from utils.resilience import request as upstream_request, CircuitOpenError
+from utils.schedule_horizon import replan_horizons
+from utils import metrics
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Reschedule calls sent to Upload-Post per batch, the next batch starts once this one is done
+REPLAN_BATCH_SIZE = int(os.getenv('REPLAN_BATCH_SIZE', '20'))
+# Calls of a batch in flight at once
+REPLAN_WORKERS = int(os.getenv('REPLAN_WORKERS', '4'))
+# Posts due within this many minutes stay where they are, they may be on their way out
+REPLAN_FREEZE_MINUTES = int(os.getenv('REPLAN_FREEZE_MINUTES', '15'))
+
+metrics.describe('replan_calls_total', 'counter', 'Upload-Post reschedule and cancel calls of replans by outcome')
+
+
+class ReplanError(Exception):
+    """Raised when Upload-Post's scheduled jobs cannot be listed, a replan needs them"""
+
+
+def list_upstream_jobs():
+    """Every post Upload-Post holds for later under our API key, by job_id"""
+    response = upstream_request(
+        'upload_post', 'GET',
+        f'{UPLOAD_POST_API_URL}/schedule',
+        headers={'Authorization': f'Apikey {UPLOAD_POST_API_KEY}'}
+    )
+    if response.status_code != 200:
+        raise ReplanError(f'Listing scheduled jobs failed: {response.status_code} {response.text[:200]}')
+    data = response.json()
+    # A bare list of jobs, or wrapped in an object
+    jobs = data if isinstance(data, list) else data.get('jobs', [])
+    return {job['job_id']: job for job in jobs if job.get('job_id')}
+
+
+def cancel_upstream(job_id):
+    """Drop a post Upload-Post holds for later. Returns True if it is gone"""
+    response = upstream_request(
+        'upload_post', 'DELETE',
+        f'{UPLOAD_POST_API_URL}/schedule/{job_id}',
+        headers={'Authorization': f'Apikey {UPLOAD_POST_API_KEY}'}
+    )
+    # Already gone counts as cancelled
+    if response.status_code not in (200, 204, 404):
+        logger.error(f"Cancelling job {job_id} failed: {response.status_code} {response.text}")
+    return response.status_code in (200, 204, 404)
+
+
+def reschedule_upstream(job_id, scheduled_date):
+    """Move a post Upload-Post holds for later to a new date. Returns True if it was moved"""
+    response = upstream_request(
+        'upload_post', 'POST',
+        f'{UPLOAD_POST_API_URL}/schedule/{job_id}',
+        idempotent=True,
+        json={'scheduled_date': scheduled_date},
+        headers={'Authorization': f'Apikey {UPLOAD_POST_API_KEY}'}
+    )
+    if response.status_code != 200:
+        logger.error(f"Rescheduling job {job_id} failed: {response.status_code} {response.text}")
+    return response.status_code == 200
+
+
+def _reschedule(move):
+    try:
+        if move['new_date'] is None:
+            outcome = 'cancelled' if cancel_upstream(move['job_id']) else 'failed'
+        else:
+            outcome = 'moved' if reschedule_upstream(move['job_id'], move['new_date']) else 'failed'
+    except CircuitOpenError:
+        outcome = 'circuit_open'
+    except Exception as e:
+        logger.error(f"Rescheduling job {move['job_id']} failed: {e}")
+        outcome = 'failed'
+    metrics.inc('replan_calls_total', outcome=outcome)
+    return outcome
+
+
+def _move_upstream(moves):
+    """
+    Send the reschedule calls for moves of jobs Upload-Post holds (a cancel
+    for moves without new_date), in batches of REPLAN_BATCH_SIZE. Stops once
+    the Upload-Post circuit opens, the rest count as failed.
+    Returns (done, failed).
+    """
+    done, failed = [], []
+    if not moves:
+        return done, failed
+
+    with ThreadPoolExecutor(max_workers=REPLAN_WORKERS) as pool:
+        for start in range(0, len(moves), REPLAN_BATCH_SIZE):
+            batch = moves[start:start + REPLAN_BATCH_SIZE]
+            outcomes = list(pool.map(_reschedule, batch))
+            for move, outcome in zip(batch, outcomes):
+                (done if outcome in ('moved', 'cancelled') else failed).append(move)
+            if 'circuit_open' in outcomes:
+                failed.extend(moves[start + REPLAN_BATCH_SIZE:])
+                logger.warning(f"Upload-Post circuit open, {len(moves) - start - len(batch)} calls not sent")
+                break
+    return done, failed
+
+
+def _move(job, new_date, dispatch_at=None):
+    return {
+        'job_id': job['job_id'],
+        'user_id': job['user_id'],
+        'account_username': job['account_username'],
+        'status': job['status'],
+        'scheduled_date': job['scheduled_date'],
+        'new_date': new_date,
+        'dispatch_at': dispatch_at,
+    }
+
+
+def plan_moves(account, jobs, now):
+    """
+    The pending jobs of one account that need a new time under its current
+    autoposting settings, as reschedule_jobs moves. Jobs due within
+    REPLAN_FREEZE_MINUTES are left as they are, the others are re-timed in
+    one pass, keeping every job that already fits the cadence.
+    """
+    freeze = now + timedelta(minutes=REPLAN_FREEZE_MINUTES)
+    jobs = sorted(jobs, key=lambda job: parse_iso(job['scheduled_date']))
+    fixed = [job for job in jobs if parse_iso(job['scheduled_date']) <= freeze]
+    movable = jobs[len(fixed):]
+
+    after = fixed[-1]['scheduled_date'] if fixed else None
+    new_times = replan_times(account, [job['scheduled_date'] for job in movable], after)
+
+    moves = []
+    for job, new_date in zip(movable, new_times):
+        if new_date == job['scheduled_date']:
+            continue
+        dispatch_at = None
+        if job['status'] == 'held':
+            # Same dispatch time a freshly held post gets
+            slot = parse_iso(new_date).astimezone(timezone.utc).replace(tzinfo=None)
+            dispatch_at = (slot - timedelta(minutes=JIT_DISPATCH_LEAD_MINUTES)).isoformat()
+        moves.append(_move(job, new_date, dispatch_at))
+    return moves
+
+
+def _reconcile(user_id, names, local, upstream):
+    """
+    Match the local pending jobs against Upload-Post's scheduled ones.
+    Returns the jobs to plan per account (with Upload-Post's time where the
+    two sides drifted apart), the moves that bring those local times back in
+    line, the pending jobs Upload-Post no longer holds (published or
+    cancelled there, left to the job checker) and the cancel moves for jobs
+    Upload-Post still holds although they are no longer pending here.
+    """
+    jobs, missing, synced = defaultdict(list), defaultdict(list), []
+    for job in local:
+        if job['status'] == 'pending':
+            remote = upstream.get(job['job_id'])
+            if not remote:
+                missing[job['account_username']].append(job['job_id'])
+                continue
+            try:
+                remote_date = format_utc(parse_iso(remote.get('scheduled_date')))
+            except ValueError:
+                remote_date = job['scheduled_date']
+            if parse_iso(remote_date) != parse_iso(job['scheduled_date']):
+                synced.append(_move(job, remote_date))
+                job = dict(job, scheduled_date=remote_date)
+        jobs[job['account_username']].append(job)
+
+    known = {job['job_id'] for job in local}
+    stale = get_scheduled_jobs_by_ids(user_id, names, [job_id for job_id in upstream if job_id not in known])
+    cancels = [_move(job, None) for job in stale if job['status'] not in ('pending', 'held', 'dispatching')]
+    return jobs, synced, missing, cancels
+
+
+def replan_accounts(user_id, usernames, dry_run=False):
+    """
+    Re-time every pending post of the given autoposting accounts to their
+    current settings and replan their horizons after them. The plan starts
+    from Upload-Post's list of scheduled jobs: local times that drifted are
+    synced to it first, jobs it no longer holds are left out, and jobs it
+    still holds that are no longer pending here are cancelled. Held posts
+    are moved locally, posts Upload-Post holds with the fewest reschedule
+    calls. With dry_run nothing is changed. Raises ReplanError (or
+    CircuitOpenError) when Upload-Post's jobs cannot be listed.
+    Returns one summary per account: pending, kept, moved, failed (the
+    moves and cancels that did not go through), synced, cancelled and
+    missing_upstream.
+    """
+    accounts = [a for a in get_accounts_with_autoposting(user_id) if a['username'] in usernames]
+    if not accounts:
+        return []
+    names = [a['username'] for a in accounts]
+
+    upstream = list_upstream_jobs()
+    jobs, synced, missing, cancels = _reconcile(user_id, names, get_replannable_jobs(user_id, names), upstream)
+
+    now = datetime.now(timezone.utc)
+    plans = {a['username']: plan_moves(a, jobs[a['username']], now) for a in accounts}
+    moves = [move for username in names for move in plans[username]]
+
+    if dry_run:
+        applied = {move['job_id'] for move in moves + cancels}
+    else:
+        held = [move for move in moves if move['status'] == 'held']
+        done, _ = _move_upstream([move for move in moves if move['status'] == 'pending'] + cancels)
+        # Synced first, so a job moved as well ends up at its new time
+        applied = set(reschedule_jobs(synced + held + [move for move in done if move['new_date']]))
+        applied |= {move['job_id'] for move in done if not move['new_date']}
+        replan_horizons(user_id, names)
+
+    summaries = []
+    for username in names:
+        summary = {
+            'username': username,
+            'pending': len(jobs[username]),
+            'kept': len(jobs[username]) - len(plans[username]),
+            'moved': [],
+            'failed': [],
+            'synced': [{'job_id': move['job_id'], 'from': move['scheduled_date'], 'to': move['new_date']}
+                       for move in synced if move['account_username'] == username],
+            'cancelled': [],
+            'missing_upstream': missing[username],
+        }
+        for move in plans[username]:
+            entry = {'job_id': move['job_id'], 'from': move['scheduled_date'], 'to': move['new_date']}
+            summary['moved' if move['job_id'] in applied else 'failed'].append(entry)
+        for move in cancels:
+            if move['account_username'] != username:
+                continue
+            if move['job_id'] in applied:
+                summary['cancelled'].append(move['job_id'])
+            else:
+                summary['failed'].append({'job_id': move['job_id'], 'from': move['scheduled_date'], 'to': None})
+        summaries.append(summary)
+
+    logger.info(f"Replanned {len(names)} accounts of user {user_id}{' (dry run)' if dry_run else ''}: "
+                f"{len(applied & {move['job_id'] for move in moves})} of {len(moves)} posts moved, "
+                f"{len(synced)} synced, {len(cancels)} stale upstream jobs")
+    return summaries
@@ -0,0 +1,310 @@
+import os
+import time
+import random
+import threading
+import logging
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+from dotenv import load_dotenv
+from utils import metrics
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+CONNECT_TIMEOUT = float(os.getenv('UPSTREAM_CONNECT_TIMEOUT', '5'))
+READ_TIMEOUT = float(os.getenv('UPSTREAM_READ_TIMEOUT', '30'))
+MAX_RETRIES = int(os.getenv('UPSTREAM_MAX_RETRIES', '3'))
+BACKOFF_BASE = float(os.getenv('UPSTREAM_BACKOFF_BASE', '0.5'))
+BACKOFF_CAP = float(os.getenv('UPSTREAM_BACKOFF_CAP', '8'))
+BREAKER_FAILURE_THRESHOLD = int(os.getenv('UPSTREAM_BREAKER_FAILURES', '5'))
+BREAKER_RESET_SECONDS = float(os.getenv('UPSTREAM_BREAKER_RESET_SECONDS', '30'))
+
+# Statuses that mean "try again later"
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+# Subset that is safe to retry for non-idempotent calls, the upstream did not act on them
+UNSAFE_RETRYABLE_STATUS = {429, 503}
+
+CLOSED = 'closed'
+HALF_OPEN = 'half_open'
+OPEN = 'open'
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+metrics.describe('upstream_circuit_state', 'gauge', 'Circuit breaker state per upstream (0 closed, 1 half open, 2 open)')
+metrics.describe('upstream_circuit_failures', 'gauge', 'Consecutive failures counted by the circuit breaker')
+metrics.describe('upstream_requests_total', 'counter', 'Upstream call attempts by outcome')
+metrics.describe('upstream_retries_total', 'counter', 'Upstream call attempts that were retried')
+metrics.describe('upstream_circuit_rejections_total', 'counter', 'Calls rejected while the circuit was open')
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an upstream whose circuit is open"""
+
+    def __init__(self, upstream, retry_after):
+        super().__init__(f"Circuit for {upstream} is open, retry in {retry_after:.0f}s")
+        self.upstream = upstream
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker.
+    After `failure_threshold` failures the circuit opens and calls fail fast.
+    After `reset_seconds` a single trial call is let through (half open);
+    its outcome closes or re-opens the circuit.
+    """
+
+    def __init__(self, name, failure_threshold=BREAKER_FAILURE_THRESHOLD, reset_seconds=BREAKER_RESET_SECONDS):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        """Raise CircuitOpenError if the call may not go through"""
+        with self._lock:
+            if self.state == CLOSED:
+                return
+
+            elapsed = time.monotonic() - self.opened_at
+            if self.state == OPEN and elapsed >= self.reset_seconds:
+                self.state = HALF_OPEN
+                self._trial_in_flight = False
+                logger.info(f"Circuit for {self.name} is half open, sending a trial call")
+
+            if self.state == HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return
+
+        metrics.inc('upstream_circuit_rejections_total', upstream=self.name)
+        raise CircuitOpenError(self.name, max(self.reset_seconds - elapsed, 1))
+
+    def record_success(self):
+        with self._lock:
+            if self.state != CLOSED:
+                logger.info(f"Circuit for {self.name} closed")
+            self.state = CLOSED
+            self.failures = 0
+            self._trial_in_flight = False
+
+    def release_trial(self):
+        """Let another trial through when a call ended without telling us anything about the upstream"""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    logger.warning(f"Circuit for {self.name} opened after {self.failures} failures")
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+                self._trial_in_flight = False
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(upstream):
+    """Get or create the circuit breaker of an upstream"""
+    with _breakers_lock:
+        if upstream not in _breakers:
+            _breakers[upstream] = CircuitBreaker(upstream)
+        return _breakers[upstream]
+
+
+def _collect_breaker_metrics():
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    for breaker in breakers:
+        yield 'upstream_circuit_state', {'upstream': breaker.name}, STATE_VALUES[breaker.state]
+        yield 'upstream_circuit_failures', {'upstream': breaker.name}, breaker.failures
+
+
+metrics.register_collector(_collect_breaker_metrics)
+
+
+class TimeoutHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter that applies default (connect, read) timeouts to every request"""
+
+    def __init__(self, *args, timeout=None, **kwargs):
+        self.timeout = timeout or (CONNECT_TIMEOUT, READ_TIMEOUT)
+        super().__init__(*args, **kwargs)
+
+    def send(self, request, **kwargs):
+        if kwargs.get('timeout') is None:
+            kwargs['timeout'] = self.timeout
+        return super().send(request, **kwargs)
+
+
+def mount_timeouts(session, connect=CONNECT_TIMEOUT, read=READ_TIMEOUT):
+    """Give a requests.Session (e.g. inside a third party client) explicit timeouts"""
+    adapter = TimeoutHTTPAdapter(timeout=(connect, read))
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def _status_of(exc):
+    """Find an HTTP status code anywhere in an exception chain"""
+    while exc is not None:
+        response = getattr(exc, 'response', None)
+        if response is not None:
+            return response.status_code
+        exc = exc.__cause__
+    return None
+
+
+def _root_request_error(exc):
+    """Find the requests exception anywhere in an exception chain (clients wrap them)"""
+    while exc is not None:
+        if isinstance(exc, requests.RequestException):
+            return exc
+        exc = exc.__cause__
+    return None
+
+
+def _failed_to_connect(root):
+    """
+    Whether a requests exception happened while connecting, before any of the
+    request was sent. Other connection errors (aborted, remote disconnected)
+    can come after the whole body went out.
+    """
+    if isinstance(root, requests.ConnectTimeout):
+        return True
+    if not isinstance(root, requests.ConnectionError):
+        return False
+    reason = root.args[0] if root.args else None
+    # requests wraps urllib3's MaxRetryError, whose reason is the actual failure
+    return isinstance(getattr(reason, 'reason', reason), NewConnectionError)
+
+
+def is_retryable_error(exc, idempotent=True):
+    """
+    Classify an exception.
+    Failures to connect are always retryable, the request never reached the upstream.
+    Other connection errors, read timeouts and 5xx are only retryable for idempotent calls.
+    """
+    status = _status_of(exc)
+    if status is not None:
+        return status in (RETRYABLE_STATUS if idempotent else UNSAFE_RETRYABLE_STATUS)
+
+    root = _root_request_error(exc)
+    if isinstance(root, (requests.ConnectionError, requests.Timeout)):
+        return idempotent or _failed_to_connect(root)
+    return False
+
+
+def is_upstream_failure(exc):
+    """
+    Whether an exception says the upstream is in trouble (5xx, timeout,
+    unreachable), retryable or not. These count against the breaker.
+    """
+    status = _status_of(exc)
+    if status is not None:
+        return status >= 500
+    return isinstance(_root_request_error(exc), (requests.Timeout, requests.ConnectionError))
+
+
+def is_retryable_response(response, idempotent=True):
+    """Classify a response that came back without an exception"""
+    if not isinstance(response, requests.Response):
+        return False
+    return response.status_code in (RETRYABLE_STATUS if idempotent else UNSAFE_RETRYABLE_STATUS)
+
+
+def backoff_delay(attempt, retry_after=None):
+    """Exponential backoff with full jitter, honouring an upstream Retry-After"""
+    delay = random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * (2 ** attempt)))
+    if retry_after is not None:
+        delay = max(delay, min(retry_after, BACKOFF_CAP))
+    return delay
+
+
+def _retry_after_of(response):
+    if not isinstance(response, requests.Response):
+        return None
+    try:
+        return float(response.headers.get('Retry-After', ''))
+    except ValueError:
+        return None
+
+
+def call(upstream, func, *args, idempotent=True, retries=MAX_RETRIES, **kwargs):
+    """
+    Call func through the circuit breaker of `upstream`, retrying transient failures.
+
+    Returns whatever func returns. A requests.Response with a retryable status
+    is returned as-is once the retries are used up, so callers keep handling
+    status codes like before. Raises CircuitOpenError when the circuit is open.
+    """
+    breaker = get_breaker(upstream)
+
+    for attempt in range(retries + 1):
+        breaker.before_call()
+        last_attempt = attempt == retries
+
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            retryable = is_retryable_error(e, idempotent)
+            if not retryable:
+                if is_upstream_failure(e):
+                    # Not safe to repeat, but the upstream is still failing
+                    breaker.record_failure()
+                elif _status_of(e) is not None:
+                    # The upstream answered, the problem is on our side
+                    breaker.record_success()
+                else:
+                    breaker.release_trial()
+                metrics.inc('upstream_requests_total', upstream=upstream, outcome='error')
+                raise
+
+            breaker.record_failure()
+            metrics.inc('upstream_requests_total', upstream=upstream, outcome='transient_error')
+            if last_attempt:
+                raise
+
+            delay = backoff_delay(attempt)
+            logger.warning(f"{upstream} call failed ({e}), retry {attempt + 1}/{retries} in {delay:.2f}s")
+            metrics.inc('upstream_retries_total', upstream=upstream)
+            time.sleep(delay)
+            continue
+
+        if is_retryable_response(result, idempotent):
+            breaker.record_failure()
+            metrics.inc('upstream_requests_total', upstream=upstream, outcome='transient_status')
+            if last_attempt:
+                return result
+
+            delay = backoff_delay(attempt, _retry_after_of(result))
+            logger.warning(f"{upstream} returned {result.status_code}, retry {attempt + 1}/{retries} in {delay:.2f}s")
+            metrics.inc('upstream_retries_total', upstream=upstream)
+            time.sleep(delay)
+            continue
+
+        if isinstance(result, requests.Response) and result.status_code >= 500:
+            # A 5xx a non-idempotent call may not repeat still counts against the upstream
+            breaker.record_failure()
+            metrics.inc('upstream_requests_total', upstream=upstream, outcome='error')
+            return result
+
+        breaker.record_success()
+        metrics.inc('upstream_requests_total', upstream=upstream, outcome='success')
+        return result
+
+
+def request(upstream, method, url, idempotent=None, connect_timeout=CONNECT_TIMEOUT,
+            read_timeout=READ_TIMEOUT, **kwargs):
+    """requests.request with explicit timeouts, retries and a circuit breaker"""
+    if idempotent is None:
+        idempotent = method.upper() in ('GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE')
+    kwargs.setdefault('timeout', (connect_timeout, read_timeout))
+    return call(upstream, requests.request, method, url, idempotent=idempotent, **kwargs)
@@ -0,0 +1,210 @@
+import os
+import logging
+from datetime import datetime, timedelta, timezone
+from dotenv import load_dotenv
+from models.db import (
+    get_account_by_username, get_accounts_with_autoposting, append_schedule_slots, claim_schedule_slot,
+    release_schedule_slot, replace_schedule_horizons, update_account_last_upload_time
+)
+from scheduling_core import (
+    plan_upload_times, stream_platforms, min_spacing, downtime_window_end, get_zone, account_timezone,
+    parse_iso, format_utc, merge_streams, earliest_gap
+)
+from utils.bulk_planner import plan_streams
+from utils.schedule_load import smooth_slots, smooth_horizons
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Upcoming slots kept planned per platform of an autoposting account
+SCHEDULE_HORIZON_SIZE = int(os.getenv('SCHEDULE_HORIZON_SIZE', '20'))
+# Top a platform's stream back up once fewer slots than this are left
+SCHEDULE_HORIZON_LOW_WATERMARK = int(os.getenv('SCHEDULE_HORIZON_LOW_WATERMARK', '5'))
+# Most slots a preview may ask for, previews past the horizon plan ahead
+SCHEDULE_PREVIEW_MAX = int(os.getenv('SCHEDULE_PREVIEW_MAX', '100'))
+# Platforms due within this many minutes of the next slot go out with it as one post
+SCHEDULE_MERGE_MINUTES = int(os.getenv('SCHEDULE_MERGE_MINUTES', '10'))
+# Fill holes left in the schedule (failed or cancelled posts) before taking the next horizon slot
+SCHEDULE_FILL_GAPS = os.getenv('SCHEDULE_FILL_GAPS', 'true').lower() == 'true'
+# A hole is only filled this far ahead, so the upload has time to reach Upload-Post
+SCHEDULE_GAP_LEAD_MINUTES = int(os.getenv('SCHEDULE_GAP_LEAD_MINUTES', '10'))
+
+
+def _now():
+    return datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+def _upcoming(account, platform):
+    now = _now()
+    return [t for t, p in account.get('schedule_horizon') or [] if p == platform and t > now]
+
+
+def extend_horizon(account, size=SCHEDULE_HORIZON_SIZE):
+    """
+    Plan slots onto the end of each of an account's platform streams until
+    every one holds `size`. New slots follow the last slot ever planned for
+    the stream - also when reserved uploads emptied it - or the latest
+    scheduled time for a new stream, so only the new ones are computed.
+    New slots are spread over minutes with room across all accounts.
+    Returns the merged horizon.
+    """
+    tails = account.get('schedule_tails') or {}
+    slots = []
+    for platform in stream_platforms(account):
+        stream = _upcoming(account, platform)
+        missing = size - len(stream)
+        if missing > 0:
+            planned = plan_upload_times(account, missing, after=tails.get(platform), platform=platform)
+            planned = smooth_slots(account, platform, planned, after=tails.get(platform))
+            slots.extend([t, platform] for t in planned)
+
+    if not slots:
+        return account.get('schedule_horizon') or []
+    horizon = append_schedule_slots(account['user_id'], account['username'], slots)
+    logger.info(f"Planned {len(slots)} slots for {account['username']}, horizon ends {horizon[-1][0] if horizon else None}")
+    return horizon
+
+
+def refill_horizon(user_id, username):
+    """Top up the platform streams of an autoposting account that ran low, a no-op otherwise"""
+    account = get_account_by_username(user_id, username)
+    if not account or not account.get('autoposting_properties', {}).get('enabled'):
+        return []
+
+    if all(len(_upcoming(account, platform)) >= SCHEDULE_HORIZON_LOW_WATERMARK
+           for platform in stream_platforms(account)):
+        return account['schedule_horizon']
+    return extend_horizon(account)
+
+
+def _gap_finder(account, platforms):
+    """
+    find_gap for claim_schedule_slot: the earliest hole before the next
+    horizon slot that keeps the planner's minimum spacing (for the slowest
+    of the platforms) to every queued post and slot, outside downtime.
+    Only the times from shortly before the lead up to the next slot count,
+    a few dozen at most.
+    """
+    autopost = account.get('autoposting_properties') or {}
+    spacing = min_spacing(autopost, platforms)
+    zone = get_zone(account_timezone(account))
+    start, end = autopost.get('downtime_start'), autopost.get('downtime_end')
+    downtime = (lambda moment: downtime_window_end(moment, start, end, zone)) if start and end else None
+
+    def find_gap(scheduled_times, horizon_times, head):
+        after = datetime.now(timezone.utc) + timedelta(minutes=SCHEDULE_GAP_LEAD_MINUTES)
+        before = parse_iso(head)
+        # A quiet stretch reaching further back is idle time, not a hole in the plan
+        earliest = after - 2 * spacing
+        taken = []
+        for value in scheduled_times + horizon_times:
+            try:
+                moment = parse_iso(value)
+            except ValueError:
+                continue
+            if earliest <= moment <= before:
+                taken.append(moment)
+        gap = earliest_gap(sorted(taken), after, spacing, before, downtime)
+        return format_utc(gap) if gap else None
+
+    return find_gap
+
+
+def reserve_next_slot(user_id, username, platforms=None):
+    """
+    Claim the next slot of the given platforms (all when None) off an
+    account's horizon, together with the other platforms due within
+    SCHEDULE_MERGE_MINUTES of it. A hole left earlier in the schedule is
+    filled first (SCHEDULE_FILL_GAPS). The claim and the advanced
+    next_upload_time are one transaction, so parallel uploads of the same
+    account each get their own slot. Give it back with release_slot if the
+    upload fails.
+    Returns (slot, due, found, filled): slot is None with found True when the
+    account is behind and should post now. due lists the platforms the post
+    is for, None for all of them. found is False when the account has no
+    horizon (autoposting off or never planned) and the caller falls back to
+    next_upload_time. filled tells a hole from a horizon slot.
+    """
+    now = _now()
+    find_gap = None
+    if SCHEDULE_FILL_GAPS:
+        account = get_account_by_username(user_id, username)
+        if account and account.get('autoposting_properties', {}).get('enabled'):
+            find_gap = _gap_finder(account, platforms)
+
+    slot, due, overdue, remaining, filled = claim_schedule_slot(user_id, username, now, platforms,
+                                                                SCHEDULE_MERGE_MINUTES, find_gap=find_gap)
+
+    if not slot and not overdue:
+        # Empty - plan it right away, the first upload of an account lands here.
+        # Platforms without a stream of their own then take any stream's slot.
+        if not refill_horizon(user_id, username):
+            return None, None, False, False
+        slot, due, overdue, remaining, filled = claim_schedule_slot(user_id, username, now, platforms,
+                                                                    SCHEDULE_MERGE_MINUTES, any_platform=True,
+                                                                    find_gap=find_gap)
+        if not slot and not overdue:
+            return None, None, False, False
+
+    if overdue:
+        logger.info(f"{username} (user {user_id}) missed a slot for {due or 'all platforms'}, posting now")
+        update_account_last_upload_time(user_id, username, now)
+        return None, due, True, False
+
+    if filled:
+        logger.info(f"Filled a hole at {slot} for {username} (user {user_id}) on {due or 'all platforms'}")
+    else:
+        logger.info(f"Reserved slot {slot} for {username} (user {user_id}) on {due or 'all platforms'}, {remaining} left")
+    return slot, due, True, filled
+
+
+def release_slot(user_id, username, slot, platforms, filled=False):
+    """Return a reserved slot whose upload failed, so the next upload can use it"""
+    if not slot:
+        return False
+    released = release_schedule_slot(user_id, username, slot, platforms, _now(), filled)
+    if released:
+        logger.info(f"Released slot {slot} of {username} (user {user_id}) on {platforms or 'all platforms'}")
+    return released
+
+
+def preview_slots(user_id, username, count):
+    """
+    The next `count` [time, platform] slots of an account. Past the horizon
+    they are planned in memory only, the stored horizon stays as it is, so
+    those slots are not spread over the load yet and may still move.
+    """
+    account = get_account_by_username(user_id, username)
+    if not account:
+        return None
+    if not account.get('autoposting_properties', {}).get('enabled'):
+        return []
+
+    count = max(1, min(count, SCHEDULE_PREVIEW_MAX))
+    tails = account.get('schedule_tails') or {}
+    streams = {}
+    # Every stream holding `count` slots is enough for the first `count` merged ones
+    for platform in stream_platforms(account):
+        stream = _upcoming(account, platform)
+        missing = count - len(stream)
+        if missing > 0:
+            stream = stream + plan_upload_times(account, missing, after=tails.get(platform), platform=platform)
+        streams[platform] = stream
+    return merge_streams(streams)[:count]
+
+
+def replan_horizons(user_id=None, usernames=None):
+    """
+    Plan fresh horizons for every autoposting account (of user_id, and
+    only `usernames` of them, if given) in one vectorized pass, after a settings change or an outage left the
+    old slots stale, then spread them over minutes with room. Returns the
+    number of accounts replanned.
+    """
+    accounts = get_accounts_with_autoposting(user_id)
+    if usernames is not None:
+        accounts = [a for a in accounts if a['username'] in usernames]
+    horizons = smooth_horizons(accounts, plan_streams(accounts, SCHEDULE_HORIZON_SIZE))
+    replace_schedule_horizons([(a['user_id'], a['username'], slots) for a, slots in zip(accounts, horizons)])
+    logger.info(f"Replanned {len(accounts)} schedule horizons{f' for user {user_id}' if user_id else ''}")
+    return len(accounts)
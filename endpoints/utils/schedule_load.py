@@ -0,0 +1,145 @@
+import os
+import time
+import logging
+import threading
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from dotenv import load_dotenv
+from models.db import get_upcoming_slot_times
+from scheduling_core import parse_iso, format_utc, min_spacing, downtime_window_end, get_zone, account_timezone
+from utils import metrics
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Posts due in one UTC minute across all accounts before new slots are moved off it, 0 turns smoothing off
+SCHEDULE_MINUTE_CEILING = int(os.getenv('SCHEDULE_MINUTE_CEILING', '5'))
+# Furthest a new slot is moved off its planned minute, either way
+SCHEDULE_NUDGE_MAX_MINUTES = int(os.getenv('SCHEDULE_NUDGE_MAX_MINUTES', '15'))
+# The load picture is rebuilt from the DB once it is this old, other workers' slots show up then
+SCHEDULE_LOAD_REFRESH_SECONDS = int(os.getenv('SCHEDULE_LOAD_REFRESH_SECONDS', '60'))
+
+metrics.describe('schedule_slots_nudged_total', 'counter',
+                 'New slots planned into a full minute by outcome (nudged, over_ceiling)')
+
+_lock = threading.Lock()
+# UTC minute -> upcoming posts due in it across all accounts
+_load = Counter()
+_loaded_at = None
+
+
+def _minute(moment):
+    return moment.astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:00Z')
+
+
+def _count(rows, exclude=()):
+    """Posts per minute of get_upcoming_slot_times rows, without the horizons of `exclude` accounts"""
+    load = Counter()
+    for user_id, username, horizon, scheduled in rows:
+        times = scheduled if (user_id, username) in exclude else horizon + scheduled
+        for value in times:
+            try:
+                load[_minute(parse_iso(value))] += 1
+            except ValueError:
+                continue
+    return load
+
+
+def _refresh(exclude=()):
+    """Rebuild the load picture from the DB, caller holds the lock"""
+    global _load, _loaded_at
+    _load = _count(get_upcoming_slot_times(format_utc(datetime.now(timezone.utc))), exclude)
+    _loaded_at = time.monotonic()
+
+
+def load_histogram(start, end):
+    """Posts due per UTC minute in [start, end) across all accounts, read fresh from the DB"""
+    load = _count(get_upcoming_slot_times(format_utc(start - timedelta(seconds=1))))
+    first, last = _minute(start), _minute(end)
+    return {minute: count for minute, count in sorted(load.items()) if first <= minute < last}
+
+
+def _nudge(times, after, spacing, downtime, now):
+    """
+    Move each slot of one stream (aware datetimes, sorted) out of a minute
+    at the ceiling to the nearest minute with room, within
+    SCHEDULE_NUDGE_MAX_MINUTES. A moved slot keeps `spacing` to the slot
+    before it (as moved) and the one after it (as planned), stays out of
+    downtime and in the future. Counts the results into the load, caller
+    holds the lock.
+    """
+    result = []
+    previous = after
+    for i, moment in enumerate(times):
+        following = times[i + 1] if i + 1 < len(times) else None
+        chosen = moment
+        if _load[_minute(moment)] >= SCHEDULE_MINUTE_CEILING:
+            chosen = None
+            for step in range(1, SCHEDULE_NUDGE_MAX_MINUTES + 1):
+                for offset in (step, -step):
+                    candidate = moment + timedelta(minutes=offset)
+                    if (_load[_minute(candidate)] < SCHEDULE_MINUTE_CEILING and candidate > now
+                            and (previous is None or candidate - previous >= spacing)
+                            and (following is None or following - candidate >= spacing)
+                            and not (downtime and downtime(candidate))):
+                        chosen = candidate
+                        break
+                if chosen:
+                    break
+            metrics.inc('schedule_slots_nudged_total', outcome='nudged' if chosen else 'over_ceiling')
+            chosen = chosen or moment
+        _load[_minute(chosen)] += 1
+        result.append(chosen)
+        previous = chosen
+    return result
+
+
+def _stream_rules(account, platform):
+    autopost = account.get('autoposting_properties') or {}
+    zone = get_zone(account_timezone(account))
+    start, end = autopost.get('downtime_start'), autopost.get('downtime_end')
+    downtime = (lambda moment: downtime_window_end(moment, start, end, zone)) if start and end else None
+    return min_spacing(autopost, [platform] if platform else None), downtime
+
+
+def smooth_slots(account, platform, times, after=None):
+    """
+    Spread newly planned slots of an account's platform stream (UTC
+    strings, earliest first) so no minute gets more than
+    SCHEDULE_MINUTE_CEILING posts across all accounts. after is the
+    stream's slot before them, if any. Returns the slots as UTC strings.
+    """
+    if not SCHEDULE_MINUTE_CEILING or not times:
+        return times
+    spacing, downtime = _stream_rules(account, platform)
+    now = datetime.now(timezone.utc)
+
+    with _lock:
+        if _loaded_at is None or time.monotonic() - _loaded_at > SCHEDULE_LOAD_REFRESH_SECONDS:
+            _refresh()
+        smoothed = _nudge([parse_iso(t) for t in times], parse_iso(after) if after else None, spacing, downtime, now)
+    return [format_utc(moment) for moment in smoothed]
+
+
+def smooth_horizons(accounts, horizons):
+    """
+    Spread the fresh horizons ([time, platform] lists) of a bulk replan,
+    account by account against the load of everyone else's slots. The old
+    horizons of `accounts` do not count, they are being replaced.
+    """
+    if not SCHEDULE_MINUTE_CEILING:
+        return horizons
+    now = datetime.now(timezone.utc)
+    smoothed = []
+
+    with _lock:
+        _refresh(exclude={(a['user_id'], a['username']) for a in accounts})
+        for account, horizon in zip(accounts, horizons):
+            entries = []
+            for platform in dict.fromkeys(p for _, p in horizon):
+                spacing, downtime = _stream_rules(account, platform)
+                times = _nudge([parse_iso(t) for t, p in horizon if p == platform], None, spacing, downtime, now)
+                entries.extend([format_utc(moment), platform] for moment in times)
+            smoothed.append(sorted(entries, key=lambda entry: entry[0]))
+    return smoothed
@@ -0,0 +1,131 @@
+import os
+import mmap
+import uuid
+import requests
+from dotenv import load_dotenv
+from upload_post import UploadPostError
+from utils.bandwidth import shaped
+
+load_dotenv()
+
+UPLOAD_STREAMING = os.getenv('UPLOAD_STREAMING', 'true').lower() in ['true', '1', 'yes']
+STREAM_CHUNK_SIZE = 1024 * 1024
+
+
+def _quote(value):
+    """Escape a header parameter the way browsers do for multipart names"""
+    return value.replace('\\', '\\\\').replace('"', '%22').replace('\r', '%0D').replace('\n', '%0A')
+
+
+class MultipartFileBody:
+    """
+    multipart/form-data body whose file part is streamed from disk.
+
+    Iterating yields the encoded form fields, then zero-copy memoryview slices of
+    an mmap of the file, then the closing boundary - the body never exists as one
+    buffer in memory. len() is known upfront, so requests sends a Content-Length
+    instead of chunked encoding. Every iteration maps the file again, which keeps
+    the body replayable for retries. With a traffic_class, every chunk waits for
+    its share of the shared upload bandwidth before it is handed to the socket.
+    """
+
+    def __init__(self, fields, file_field, file_path, filename=None, content_type='application/octet-stream',
+                 chunk_size=STREAM_CHUNK_SIZE, traffic_class=None):
+        self.boundary = uuid.uuid4().hex
+        self.traffic_class = traffic_class
+        self.file_path = file_path
+        self.chunk_size = chunk_size
+        self.file_size = os.path.getsize(file_path)
+
+        parts = []
+        for name, value in fields:
+            parts.append(
+                f'--{self.boundary}\r\n'
+                f'Content-Disposition: form-data; name="{_quote(name)}"\r\n\r\n'
+                f'{value}\r\n'
+            )
+        parts.append(
+            f'--{self.boundary}\r\n'
+            f'Content-Disposition: form-data; name="{_quote(file_field)}"; '
+            f'filename="{_quote(filename or os.path.basename(file_path))}"\r\n'
+            f'Content-Type: {content_type}\r\n\r\n'
+        )
+        self.head = ''.join(parts).encode('utf-8')
+        self.tail = f'\r\n--{self.boundary}--\r\n'.encode('ascii')
+
+    @property
+    def content_type(self):
+        return f'multipart/form-data; boundary={self.boundary}'
+
+    def __len__(self):
+        return len(self.head) + self.file_size + len(self.tail)
+
+    def __iter__(self):
+        if self.traffic_class:
+            return shaped(self._chunks(), self.traffic_class)
+        return self._chunks()
+
+    def _chunks(self):
+        yield self.head
+
+        if self.file_size:
+            with open(self.file_path, 'rb') as f:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                view = memoryview(mapped)
+                try:
+                    can_advise = hasattr(mapped, 'madvise') and hasattr(mmap, 'MADV_DONTNEED')
+                    if can_advise:
+                        mapped.madvise(mmap.MADV_SEQUENTIAL)
+                    for offset in range(0, self.file_size, self.chunk_size):
+                        length = min(self.chunk_size, self.file_size - offset)
+                        yield view[offset:offset + length]
+                        # Sent - unmap the pages so RSS stays at one chunk (the page cache keeps them)
+                        if can_advise:
+                            mapped.madvise(mmap.MADV_DONTNEED, offset, length)
+                finally:
+                    view.release()
+                    try:
+                        mapped.close()
+                    except BufferError:
+                        # A slice is still referenced by the sender, the GC unmaps it
+                        pass
+
+        yield self.tail
+
+
+def _form_fields(title, user, platforms, kwargs):
+    """Same field encoding as UploadPostClient.upload_video"""
+    fields = [('title', title), ('user', user)]
+    fields += [('platform[]', p) for p in platforms]
+
+    for key, value in kwargs.items():
+        if isinstance(value, bool):
+            fields.append((key, str(value).lower()))
+        elif isinstance(value, list):
+            fields += [(f'{key}[]' if key.endswith('s') else key, str(v)) for v in value]
+        else:
+            fields.append((key, str(value)))
+    return fields
+
+
+def upload_video_streaming(client, video_path, title, user, platforms, traffic_class=None, **kwargs):
+    """
+    Drop-in replacement for client.upload_video that streams the file.
+    Uses the client's session, so its auth headers and mounted timeouts apply,
+    and raises UploadPostError with the original exception as cause like the client.
+    """
+    body = MultipartFileBody(_form_fields(title, user, platforms, kwargs), 'video', video_path,
+                             traffic_class=traffic_class)
+
+    try:
+        response = client.session.post(
+            f'{client.BASE_URL}/upload',
+            data=body,
+            headers={'Content-Type': body.content_type}
+        )
+        response.raise_for_status()
+        return response.json()
+    except requests.exceptions.RequestException as e:
+        raise UploadPostError(f"API request failed: {str(e)}") from e
+    except (ValueError, TypeError) as e:
+        raise UploadPostError(f"Invalid response format: {str(e)}") from e
@@ -0,0 +1,126 @@
+import os
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import ffmpeg
+from dotenv import load_dotenv
+from models.db import update_video_frames
+from utils.file_cache import file_sha256, cache_hit, prune_cache
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+THUMBNAIL_TIMESTAMP = float(os.getenv('THUMBNAIL_TIMESTAMP', '1.0'))
+THUMBNAIL_SIZE = int(os.getenv('THUMBNAIL_SIZE', '320'))
+THUMBNAIL_WORKERS = int(os.getenv('THUMBNAIL_WORKERS', '2'))
+FRAME_CACHE_MAX_AGE_DAYS = int(os.getenv('FRAME_CACHE_MAX_AGE_DAYS', '30'))
+
+_executor = None
+_executor_lock = threading.Lock()
+# (content, timestamp) keys queued or extracting, repeated requests don't queue ffmpeg again
+_in_flight = set()
+_in_flight_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # ffmpeg does the decoding in its own process, threads only wait on it
+            _executor = ThreadPoolExecutor(max_workers=THUMBNAIL_WORKERS)
+        return _executor
+
+
+def frame_paths(cache_dir, content_hash, timestamp):
+    """(cover, thumbnail) cache paths for a file and timestamp"""
+    stem = os.path.join(cache_dir, f'{content_hash}_{timestamp:g}s')
+    return f'{stem}_cover.jpg', f'{stem}_thumb{THUMBNAIL_SIZE}.jpg'
+
+
+def extract_frames(path, cache_dir, timestamp=THUMBNAIL_TIMESTAMP, duration=None, content_hash=None):
+    """
+    Extract a full resolution cover frame and a small thumbnail in one decode.
+    The timestamp is clamped into short videos. Returns (cover_path, thumb_path).
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    if duration:
+        timestamp = min(timestamp, duration / 2)
+    content_hash = content_hash or file_sha256(path)
+    cover_path, thumb_path = frame_paths(cache_dir, content_hash, timestamp)
+
+    if cache_hit(cover_path) and cache_hit(thumb_path):
+        return cover_path, thumb_path
+
+    started = time.monotonic()
+    # Unique per thread, two workers on the same video must not share tmp files
+    suffix = f'{os.getpid()}.{threading.get_ident()}.tmp.jpg'
+    cover_tmp, thumb_tmp = f'{cover_path}.{suffix}', f'{thumb_path}.{suffix}'
+    # Input seeking jumps to the nearest keyframe, only a few frames get decoded
+    frames = ffmpeg.input(path, ss=timestamp).video.filter_multi_output('split')
+    cover = frames[0].output(cover_tmp, vframes=1, **{'q:v': 2})
+    thumb = (
+        frames[1]
+        .filter('scale', THUMBNAIL_SIZE, THUMBNAIL_SIZE, force_original_aspect_ratio='decrease')
+        .output(thumb_tmp, vframes=1, **{'q:v': 4})
+    )
+
+    try:
+        ffmpeg.merge_outputs(cover, thumb).overwrite_output().run(quiet=True)
+    except ffmpeg.Error as e:
+        for tmp in (cover_tmp, thumb_tmp):
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        stderr = e.stderr.decode(errors='replace')[-300:] if e.stderr else ''
+        raise RuntimeError(f'ffmpeg failed: {stderr}') from e
+
+    if not os.path.exists(cover_tmp):
+        if os.path.exists(thumb_tmp):
+            os.remove(thumb_tmp)
+        raise RuntimeError(f'No frame at {timestamp:g}s')
+
+    os.replace(cover_tmp, cover_path)
+    os.replace(thumb_tmp, thumb_path)
+    logger.info(f"Extracted frames at {timestamp:g}s from {path} in {time.monotonic() - started:.2f}s")
+    return cover_path, thumb_path
+
+
+def _generate(key, video_id, path, cache_dir, timestamp, duration, content_hash, remove_after):
+    try:
+        cover_path, thumb_path = extract_frames(path, cache_dir, timestamp, duration, content_hash)
+        update_video_frames(video_id, cover_path, thumb_path)
+    except Exception as e:
+        logger.warning(f"Frame extraction for video {video_id} failed: {e}")
+    finally:
+        with _in_flight_lock:
+            _in_flight.discard(key)
+        if remove_after and os.path.exists(path):
+            os.remove(path)
+
+
+def generate_frames_async(video_id, path, cache_dir, timestamp=None, duration=None,
+                          content_hash=None, remove_after=False):
+    """
+    Extract frames in the background and record them on the video row.
+    With remove_after the job owns path (e.g. a hard link to an upload) and deletes it.
+    Returns False without queueing when the same content is already being extracted.
+    """
+    timestamp = THUMBNAIL_TIMESTAMP if timestamp is None else timestamp
+    key = (content_hash or path, timestamp)
+    with _in_flight_lock:
+        running = key in _in_flight
+        _in_flight.add(key)
+    if running:
+        if remove_after and os.path.exists(path):
+            os.remove(path)
+        return False
+    _get_executor().submit(
+        _generate, key, video_id, path, cache_dir, timestamp, duration, content_hash, remove_after
+    )
+    return True
+
+
+def prune_frame_cache(cache_dir, max_age_days=FRAME_CACHE_MAX_AGE_DAYS):
+    """Remove frames that were not served for max_age_days"""
+    return prune_cache(cache_dir, max_age_days)
@@ -0,0 +1,182 @@
+import os
+import time
+import logging
+import threading
+from concurrent.futures import ProcessPoolExecutor
+import ffmpeg
+from dotenv import load_dotenv
+from utils.file_cache import file_sha256, cache_hit, prune_cache
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+VIDEO_TRANSCODE = os.getenv('VIDEO_TRANSCODE', 'false').lower() in ['true', '1', 'yes']
+TRANSCODE_WORKERS = int(os.getenv('TRANSCODE_WORKERS', '2'))
+TRANSCODE_TIMEOUT = int(os.getenv('TRANSCODE_TIMEOUT', '900'))
+TRANSCODE_PRESET = os.getenv('TRANSCODE_PRESET', 'veryfast')
+VIDEO_CACHE_MAX_AGE_DAYS = int(os.getenv('VIDEO_CACHE_MAX_AGE_DAYS', '3'))
+
+# Per-platform limits. Edges are orientation independent (long/short side),
+# bitrates in kbit/s. Tweak here when a platform changes its specs.
+PLATFORM_PROFILES = {
+    'tiktok': {'long_edge': 1920, 'short_edge': 1080, 'max_video_kbps': 6000, 'max_fps': 60},
+    'instagram': {'long_edge': 1920, 'short_edge': 1080, 'max_video_kbps': 5000, 'max_fps': 60},
+    'youtube': {'long_edge': 1920, 'short_edge': 1080, 'max_video_kbps': 10000, 'max_fps': 60},
+    'facebook': {'long_edge': 1920, 'short_edge': 1080, 'max_video_kbps': 8000, 'max_fps': 60},
+    'threads': {'long_edge': 1920, 'short_edge': 1080, 'max_video_kbps': 5000, 'max_fps': 60},
+    'x': {'long_edge': 1920, 'short_edge': 1200, 'max_video_kbps': 6000, 'max_fps': 60},
+    'linkedin': {'long_edge': 1920, 'short_edge': 1080, 'max_video_kbps': 8000, 'max_fps': 60},
+    'pinterest': {'long_edge': 1920, 'short_edge': 1080, 'max_video_kbps': 6000, 'max_fps': 60},
+}
+DEFAULT_PROFILE = {'long_edge': 1920, 'short_edge': 1080, 'max_video_kbps': 8000, 'max_fps': 60}
+AUDIO_KBPS = 128
+CRF = 23
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(max_workers=TRANSCODE_WORKERS)
+        return _executor
+
+
+def profile_for(platforms):
+    """
+    One file goes to every platform of an upload, so it has to satisfy
+    the strictest limit of each kind.
+    """
+    profiles = [PLATFORM_PROFILES.get(p.lower(), DEFAULT_PROFILE) for p in platforms] or [DEFAULT_PROFILE]
+    return {key: min(p[key] for p in profiles) for key in DEFAULT_PROFILE}
+
+
+def profile_key(profile):
+    """Stable string identifying a profile, used in cache file names"""
+    return (
+        f"{profile['long_edge']}x{profile['short_edge']}_{profile['max_video_kbps']}k_"
+        f"{profile['max_fps']}fps_crf{CRF}_{TRANSCODE_PRESET}"
+    )
+
+
+def fit_dimensions(width, height, profile):
+    """Scale (width, height) down into the profile's edges, keeping aspect ratio and even sizes"""
+    long_side, short_side = max(width, height), min(width, height)
+    scale = min(1.0, profile['long_edge'] / long_side, profile['short_edge'] / short_side)
+    if scale >= 1.0:
+        return width, height
+    return max(2, int(width * scale) // 2 * 2), max(2, int(height * scale) // 2 * 2)
+
+
+def _frame_rate(stream):
+    try:
+        num, den = stream.get('avg_frame_rate', '0/1').split('/')
+        return float(num) / float(den) if float(den) else 0.0
+    except (ValueError, ZeroDivisionError):
+        return 0.0
+
+
+def _transcode(src_path, cache_dir, profile):
+    """
+    Runs in a worker process.
+    Remuxes with a faststart moov atom when the streams already fit the profile,
+    re-encodes to H.264/AAC otherwise. Returns (output_path, mode).
+    """
+    content_hash = file_sha256(src_path)
+    out_path = os.path.join(cache_dir, f'{content_hash}_{profile_key(profile)}.mp4')
+
+    if cache_hit(out_path):
+        return out_path, 'cached'
+
+    probe = ffmpeg.probe(src_path)
+    video = next((s for s in probe['streams'] if s.get('codec_type') == 'video'), None)
+    audio = next((s for s in probe['streams'] if s.get('codec_type') == 'audio'), None)
+    if video is None:
+        raise ValueError('No video stream found')
+
+    width, height = int(video['width']), int(video['height'])
+    target_width, target_height = fit_dimensions(width, height, profile)
+    fps = _frame_rate(video)
+    bitrate_kbps = int(video.get('bit_rate') or probe['format'].get('bit_rate') or 0) // 1000
+
+    conforming = (
+        video.get('codec_name') == 'h264'
+        and video.get('pix_fmt') == 'yuv420p'
+        and (target_width, target_height) == (width, height)
+        and fps <= profile['max_fps']
+        and 0 < bitrate_kbps <= profile['max_video_kbps']
+        and (audio is None or audio.get('codec_name') == 'aac')
+    )
+
+    tmp_path = f'{out_path}.{os.getpid()}.tmp'
+    source = ffmpeg.input(src_path)
+
+    if conforming:
+        mode = 'remux'
+        output = ffmpeg.output(source, tmp_path, c='copy', movflags='+faststart', f='mp4')
+    else:
+        mode = 'transcode'
+        stream = source.video
+        if (target_width, target_height) != (width, height):
+            stream = stream.filter('scale', target_width, target_height)
+        if fps > profile['max_fps']:
+            stream = stream.filter('fps', fps=profile['max_fps'])
+
+        video_args = {
+            'vcodec': 'libx264',
+            'preset': TRANSCODE_PRESET,
+            'crf': CRF,
+            'maxrate': f"{profile['max_video_kbps']}k",
+            'bufsize': f"{profile['max_video_kbps'] * 2}k",
+            'pix_fmt': 'yuv420p',
+            'movflags': '+faststart',
+            'f': 'mp4',
+        }
+        if audio is not None:
+            output = ffmpeg.output(stream, source.audio, tmp_path, acodec='aac',
+                                   audio_bitrate=f'{AUDIO_KBPS}k', **video_args)
+        else:
+            output = ffmpeg.output(stream, tmp_path, **video_args)
+
+    try:
+        output.overwrite_output().run(quiet=True)
+    except ffmpeg.Error as e:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        stderr = e.stderr.decode(errors='replace')[-500:] if e.stderr else ''
+        raise RuntimeError(f'ffmpeg failed: {stderr}') from e
+
+    os.replace(tmp_path, out_path)
+    return out_path, mode
+
+
+def transcode_video(path, platforms, cache_dir):
+    """
+    Make a video fit the platforms it is uploaded to.
+    Returns the path to upload. Falls back to the original file when
+    transcoding fails, so the upstream still gets a chance to accept it.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    profile = profile_for(platforms)
+
+    started = time.monotonic()
+    try:
+        future = _get_executor().submit(_transcode, path, cache_dir, profile)
+        out_path, mode = future.result(timeout=TRANSCODE_TIMEOUT)
+    except Exception as e:
+        logger.warning(f"Transcoding {path} failed, uploading original: {e}")
+        return path
+
+    logger.info(
+        f"Video {mode} for {profile_key(profile)} in {time.monotonic() - started:.2f}s "
+        f"({os.path.getsize(path)} -> {os.path.getsize(out_path)} bytes)"
+    )
+    return out_path
+
+
+def prune_video_cache(cache_dir, max_age_days=VIDEO_CACHE_MAX_AGE_DAYS):
+    """Remove transcoded videos that were not used for max_age_days"""
+    return prune_cache(cache_dir, max_age_days)
@@ -0,0 +1,142 @@
+"""
+Bookkeeping after an upload, as subscribers of the upload events.
+They run on the event thread in registration order: the video row first,
+then its status, jobs and schedule, then notifications.
+"""
+import logging
+from datetime import datetime, timedelta
+from models.db import (
+    create_video, update_video_media, update_video_status, update_video_post_url,
+    create_scheduled_job, add_scheduled_time, get_account_by_username, update_next_upload_time,
+    update_account_last_upload_time, record_posted_media
+)
+from scheduling_core import calculate_next_upload_time
+from utils.schedule_horizon import refill_horizon
+from utils.events import (
+    subscriber, UploadEvent, UploadScheduled, UploadAsyncAccepted, UploadCompleted, UploadFailed
+)
+
+logger = logging.getLogger(__name__)
+
+
+def calculate_and_update_next_upload_time(account):
+    # Calculate next upload time, based on scheduled times using the shared slot planner
+    next_upload_time = calculate_next_upload_time(account)
+    logger.info(f"Next upload time for {account['username']} is {next_upload_time}")
+
+    # Update next_upload_time
+    update_next_upload_time(account['user_id'], account['username'], next_upload_time)
+    logger.info(f"Updated next upload time for {account['username']} to {next_upload_time}")
+
+
+@subscriber(UploadEvent)
+def register_video(event):
+    """Videos that did not come through the bot are added to the DB, probe metadata goes on the row"""
+    if event.source != 'telegram':
+        create_video(video_id=event.video_id, caption=event.caption,
+                     user_id=event.user_id, status='external', reusable=False)
+    if event.media:
+        update_video_media(event.video_id, event.media)
+
+
+@subscriber(UploadScheduled, UploadAsyncAccepted, UploadCompleted, UploadFailed)
+def update_video_record(event):
+    if isinstance(event, UploadScheduled):
+        update_video_status(event.video_id, 'scheduled', scheduled_at=event.scheduled_date)
+        logger.info(f"Video {event.video_id} scheduled for {event.scheduled_date}")
+
+    elif isinstance(event, UploadAsyncAccepted):
+        update_video_status(event.video_id, 'uploading')
+        logger.info(f"Video {event.video_id} processing asynchronously with request_id: {event.request_id}")
+
+    elif isinstance(event, UploadCompleted):
+        update_video_status(event.video_id, 'partial' if event.partial else 'posted')
+        if event.post_urls:
+            # Join multiple URLs if multiple platforms
+            urls_str = ' | '.join([f"{p}: {url}" for p, url in event.post_urls.items()])
+            update_video_post_url(event.video_id, urls_str)
+            logger.info(f"Video {event.video_id} {'partially ' if event.partial else ''}posted with URLs: {urls_str}")
+        else:
+            logger.info(f"Video {event.video_id} {'partially ' if event.partial else ''}posted (couldn't fetch URL)")
+
+    else:
+        update_video_status(event.video_id, 'failed')
+        logger.error(f"Video {event.video_id} upload failed: {event.reason}")
+
+
+@subscriber(UploadScheduled, UploadAsyncAccepted)
+def track_job(event):
+    """Jobs the job checker follows up on"""
+    if isinstance(event, UploadScheduled):
+        if event.job_id:
+            create_scheduled_job(
+                job_id=event.job_id,
+                video_id=event.video_id,
+                account_username=event.account_username,
+                user_id=event.user_id,
+                scheduled_date=event.scheduled_date
+            )
+            logger.info(f"Created scheduled job {event.job_id} for video {event.video_id}")
+
+        # Add to scheduled_times array
+        add_scheduled_time(event.user_id, event.account_username, event.scheduled_date)
+        logger.info(f"✅ Added {event.scheduled_date} to {event.account_username}'s schedule queue")
+
+    elif event.request_id:
+        check_time = (datetime.utcnow() + timedelta(minutes=10)).isoformat() + 'Z'
+        create_scheduled_job(
+            job_id=event.request_id,
+            video_id=event.video_id,
+            account_username=event.account_username,
+            user_id=event.user_id,
+            scheduled_date=check_time,
+            is_async=True
+        )
+        logger.info(f"Created async tracking job {event.request_id} for video {event.video_id}")
+
+
+@subscriber(UploadScheduled, UploadAsyncAccepted, UploadCompleted)
+def record_posted(event):
+    """Remember the content hash for the duplicate check"""
+    platforms = event.succeeded_platforms if isinstance(event, UploadCompleted) and event.succeeded_platforms else event.platforms
+    if event.content_hash and platforms:
+        job_id = getattr(event, 'job_id', None) or getattr(event, 'request_id', None)
+        record_posted_media(event.content_hash, event.user_id, event.account_username,
+                            [p.lower() for p in platforms], event.video_id, job_id)
+
+
+@subscriber(UploadScheduled, UploadAsyncAccepted, UploadCompleted)
+def recompute_schedule(event):
+    """Uploads that went out move last_upload_time, every accepted upload moves next_upload_time"""
+    if not isinstance(event, UploadScheduled):
+        update_account_last_upload_time(event.user_id, event.account_username, event.occurred_at)
+
+    account = get_account_by_username(event.user_id, event.account_username)
+    if not account:
+        logger.info(f"No account {event.account_username} for user {event.user_id}, schedule left as is")
+        return
+    if not account.get('autoposting_properties', {}).get('enabled'):
+        return
+    # The horizon already holds the next slots, it only needs topping up once it runs low
+    if account['schedule_horizon']:
+        refill_horizon(event.user_id, event.account_username)
+        return
+    calculate_and_update_next_upload_time(account)
+
+
+@subscriber(UploadCompleted, UploadFailed)
+def notify_user(event):
+    """Telegram message for uploads nobody is waiting on"""
+    if not event.notify:
+        return
+
+    # Imported here, job_checker pulls in the Telegram config
+    from utils.job_checker import notify_user_completion, notify_user_failure
+
+    if isinstance(event, UploadFailed):
+        notify_user_failure(user_id=event.user_id, account=event.account_username, video_id=event.video_id)
+        return
+
+    for platform, url in (event.post_urls or {}).items():
+        notify_user_completion(user_id=event.user_id, account=event.account_username,
+                               platform=platform, post_url=url, video_id=event.video_id)
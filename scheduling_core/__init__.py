@@ -0,0 +1,22 @@
+"""
+Scheduling code shared by the endpoints and the Telegram bot: time zones,
+ISO time parsing and conversion, the upload slot planner and the search
+for holes to fill between taken slots.
+"""
+from scheduling_core.zones import DEFAULT_TIMEZONE, get_zone, is_valid_timezone, account_timezone
+from scheduling_core.isotime import (
+    UTC_FORMAT, parse_iso, format_utc, local_to_utc, utc_to_local, cet_to_utc, utc_to_cet
+)
+from scheduling_core.slots import (
+    calculate_next_upload_time, plan_upload_times, avoid_downtime, downtime_window_end, posts_per_day,
+    minutes_per_post, min_spacing, stream_platforms, merge_streams, replan_times
+)
+from scheduling_core.gaps import earliest_gap
+
+__all__ = [
+    'DEFAULT_TIMEZONE', 'get_zone', 'is_valid_timezone', 'account_timezone',
+    'UTC_FORMAT', 'parse_iso', 'format_utc', 'local_to_utc', 'utc_to_local', 'cet_to_utc', 'utc_to_cet',
+    'calculate_next_upload_time', 'plan_upload_times', 'avoid_downtime', 'downtime_window_end', 'posts_per_day',
+    'minutes_per_post', 'min_spacing', 'stream_platforms', 'merge_streams', 'replan_times',
+    'earliest_gap',
+]
@@ -0,0 +1,82 @@
+"""
+Micro-benchmarks for time parsing and zone conversion.
+
+Run from the repository root:
+    python -m scheduling_core.bench [--n 200000]
+
+Each case runs the shared implementation against the one it replaced
+(pytz zone built per call, parsing by '+'/'-' heuristics) on the same
+inputs and prints conversions per second.
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+import pytz
+from scheduling_core import parse_iso, utc_to_local, local_to_utc
+
+
+# ===== REPLACED IMPLEMENTATIONS =====
+
+def legacy_parse_iso_datetime(dt_string):
+    if dt_string.endswith('Z'):
+        return datetime.fromisoformat(dt_string.replace('Z', '+00:00'))
+    elif '+' in dt_string or dt_string.count('-') > 2:
+        return datetime.fromisoformat(dt_string)
+    else:
+        return datetime.fromisoformat(dt_string).replace(tzinfo=pytz.UTC)
+
+
+def legacy_utc_to_cet(utc_time_str):
+    cet = pytz.timezone('Europe/Berlin')
+    utc_dt = datetime.fromisoformat(utc_time_str.replace('Z', '+00:00'))
+    return utc_dt.astimezone(cet).strftime('%Y-%m-%dT%H:%M:%S')
+
+
+def legacy_cet_to_utc(cet_time_str):
+    cet = pytz.timezone('Europe/Berlin')
+    naive_dt = datetime.fromisoformat(cet_time_str.replace('Z', ''))
+    return cet.localize(naive_dt).astimezone(pytz.UTC).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+# ===== BENCHMARK =====
+
+def throughput(func, values):
+    started = time.perf_counter()
+    for value in values:
+        func(value)
+    return len(values) / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--n', type=int, default=200_000)
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    rnd = random.Random(args.seed)
+    start = datetime(2025, 1, 1)
+    moments = [start + timedelta(seconds=rnd.randint(0, 3 * 365 * 86400)) for _ in range(args.n)]
+    utc_strings = [m.strftime('%Y-%m-%dT%H:%M:%SZ') for m in moments]
+    local_strings = [m.strftime('%Y-%m-%dT%H:%M:%S') for m in moments]
+    # What the job checker and dispatcher see: a mix of Z, offset and naive times
+    mixed = [rnd.choice([m.strftime('%Y-%m-%dT%H:%M:%SZ'), m.isoformat() + '+00:00', m.isoformat() + '.123456'])
+             for m in moments]
+
+    cases = [
+        ('parse UTC "...Z"', legacy_parse_iso_datetime, parse_iso, utc_strings),
+        ('parse mixed formats', legacy_parse_iso_datetime, parse_iso, mixed),
+        ('UTC -> Europe/Berlin', legacy_utc_to_cet, utc_to_local, utc_strings),
+        ('Europe/Berlin -> UTC', legacy_cet_to_utc, local_to_utc, local_strings),
+    ]
+
+    print(f"{args.n} conversions per case\n")
+    print(f"{'case':<24} {'before /s':>12} {'after /s':>12} {'speedup':>8}")
+    for name, legacy, shared, values in cases:
+        before = throughput(legacy, values)
+        after = throughput(shared, values)
+        print(f"{name:<24} {before:>12,.0f} {after:>12,.0f} {after / before:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,26 @@
+from bisect import bisect_right
+
+
+def earliest_gap(times, after, spacing, before=None, downtime=None):
+    """
+    Earliest moment from `after` on (and before `before`, if given) at
+    least `spacing` (timedelta) away from every taken time in `times`
+    (aware datetimes, sorted) and inside a gap between two of them.
+    downtime, if given, maps a moment to the end of the downtime window it
+    falls into (None outside one): a gap is used from that end on.
+    Returns None when no gap fits.
+
+    Only gaps between two taken times are holes: the open ends before the
+    first and after the last time are left to the regular planner. The
+    gaps are walked from the one `after` falls into, which is cheap for the
+    few dozen times around the next slot.
+    """
+    for k in range(max(bisect_right(times, after) - 1, 0), len(times) - 1):
+        lo = max(after, times[k] + spacing)
+        if before is not None and lo >= before:
+            return None
+        if downtime:
+            lo = downtime(lo) or lo
+        if lo <= times[k + 1] - spacing and (before is None or lo < before):
+            return lo
+    return None
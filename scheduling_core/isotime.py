@@ -0,0 +1,72 @@
+import re
+import sys
+from datetime import datetime, timezone
+from scheduling_core.zones import get_zone, DEFAULT_TIMEZONE
+
+UTC_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
+LOCAL_FORMAT = '%Y-%m-%dT%H:%M:%S'
+
+# fromisoformat reads Z itself from Python 3.11 on, before that it has to become +00:00
+_NATIVE_Z = sys.version_info >= (3, 11)
+
+# Date and time with seconds and fraction optional, then Z, an offset or nothing (UTC)
+_ISO = re.compile(r'(\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2})(?::(\d{2})(?:\.(\d{1,6}))?)?(Z|[+-]\d{2}:\d{2})?')
+_LOCAL = re.compile(r'(\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2})(?::(\d{2})(?:\.(\d{1,6}))?)?Z?')
+
+
+def _iso_text(minutes, seconds, fraction):
+    """
+    The matched parts in the layout fromisoformat takes before Python 3.11
+    as well: seconds always and the fraction as 6 digits. Z is left to the
+    caller, as +00:00.
+    """
+    text = f"{minutes}:{seconds or '00'}"
+    return f"{text}.{fraction.ljust(6, '0')}" if fraction else text
+
+
+def parse_iso(value):
+    """
+    Parse an ISO 8601 datetime into an aware datetime. Times without an
+    offset are UTC. Anything but YYYY-MM-DDTHH:MM[:SS[.ffffff]][Z|±HH:MM]
+    raises ValueError.
+    """
+    if not isinstance(value, str):
+        raise ValueError(f'Invalid ISO datetime: {value!r}')
+    # Fast path for the API's own format, fromisoformat rejects anything but digits in between
+    if (len(value) == 20 and value[19] == 'Z' and value[10] == 'T' and value[4] == '-'
+            and value[7] == '-' and value[13] == ':' and value[16] == ':'):
+        return datetime.fromisoformat(value if _NATIVE_Z else value[:19] + '+00:00')
+    match = _ISO.fullmatch(value)
+    if not match:
+        raise ValueError(f'Invalid ISO datetime: {value!r}')
+    minutes, seconds, fraction, offset = match.groups()
+    if not offset or offset == 'Z':
+        offset = '+00:00'
+    return datetime.fromisoformat(_iso_text(minutes, seconds, fraction) + offset)
+
+
+def format_utc(dt):
+    """Aware datetime as the UTC string used across the API"""
+    return dt.astimezone(timezone.utc).strftime(UTC_FORMAT)
+
+
+def local_to_utc(local_time, tz=DEFAULT_TIMEZONE):
+    """Wall time in zone tz (a trailing Z is ignored) to a UTC string"""
+    match = _LOCAL.fullmatch(local_time) if isinstance(local_time, str) else None
+    if not match:
+        raise ValueError(f'Invalid local datetime: {local_time!r}')
+    naive = datetime.fromisoformat(_iso_text(*match.groups()))
+    return format_utc(naive.replace(tzinfo=get_zone(tz)))
+
+
+def utc_to_local(utc_time, tz=DEFAULT_TIMEZONE):
+    """UTC string to the wall time in zone tz"""
+    return parse_iso(utc_time).astimezone(get_zone(tz)).strftime(LOCAL_FORMAT)
+
+
+def cet_to_utc(cet_time):
+    return local_to_utc(cet_time, DEFAULT_TIMEZONE)
+
+
+def utc_to_cet(utc_time):
+    return utc_to_local(utc_time, DEFAULT_TIMEZONE)
@@ -0,0 +1,184 @@
+import heapq
+import random
+from datetime import datetime, timedelta, timezone, time
+from scheduling_core.isotime import parse_iso, format_utc
+from scheduling_core.zones import get_zone, account_timezone
+
+# Planned intervals vary by up to this fraction either way
+JITTER = 0.2
+
+
+def calculate_next_upload_time(account):
+    """
+    Calculate the next optimal upload time for an account.
+    """
+    return plan_upload_times(account, 1)[0]
+
+
+def posts_per_day(autopost, platform=None):
+    """
+    Daily posts of one platform's slot stream. Without a platform (or one
+    daily_posts does not list) it is the slowest platform's rate, 10 if unset.
+    """
+    daily_posts = autopost.get('daily_posts', {})
+    if platform in daily_posts:
+        return daily_posts[platform]
+    return min(daily_posts.values()) if daily_posts else 10
+
+
+def minutes_per_post(autopost, platform=None):
+    """Nominal interval of a platform's slot stream: its active hours spread over its daily posts"""
+    active_hours = 24 - autopost.get('downtime_hours', 8)
+    return (active_hours * 60) / posts_per_day(autopost, platform)
+
+
+def min_spacing(autopost, platforms=None):
+    """
+    The shortest interval the planner puts between two slots of any of
+    the platforms (all when None) - how close another post may come.
+    """
+    return timedelta(minutes=max(minutes_per_post(autopost, p) for p in platforms or [None]) * (1 - JITTER))
+
+
+def stream_platforms(account):
+    """
+    The platforms an account keeps a slot stream for, one per daily_posts
+    entry. [None] when it sets no daily_posts: a single stream for all of them.
+    """
+    daily_posts = (account.get('autoposting_properties') or {}).get('daily_posts') or {}
+    return sorted(daily_posts) or [None]
+
+
+def merge_streams(streams):
+    """
+    Merge per-platform slot streams ({platform: [UTC strings]}, each sorted)
+    into one [time, platform] list, earliest first.
+    """
+    return list(heapq.merge(*([[t, platform] for t in times] for platform, times in streams.items()),
+                            key=lambda entry: entry[0]))
+
+
+def plan_upload_times(account, count, after=None, platform=None):
+    """
+    Plan the next `count` upload times for an account, each one an interval
+    (with jitter, outside downtime) after the previous. The first is planned
+    from `after` (UTC string) if given, else from the latest scheduled time or
+    the last upload. With a platform the interval follows that platform's
+    daily_posts, else the slowest platform's. Returns UTC strings, earliest first.
+    """
+    autopost = account.get('autoposting_properties', {})
+
+    if not autopost.get('enabled'):
+        raise ValueError("Autoposting not enabled for this account")
+
+    zone = get_zone(account_timezone(account))
+    now = datetime.now(timezone.utc)
+
+    # Determine the base time to calculate from
+    base_time_dt = now
+
+    # Scheduled times are kept sorted as UTC strings, the last one is the latest
+    scheduled_times = account.get('scheduled_times', [])
+    if after:
+        base_time_dt = parse_iso(after)
+    elif scheduled_times:
+        base_time_dt = parse_iso(max(scheduled_times))
+    elif account.get('last_upload_time'):
+        # Fall back to last_upload_time
+        base_time_dt = parse_iso(account['last_upload_time'])
+
+    # Ensure base_time is not in the past
+    if base_time_dt < now:
+        base_time_dt = now
+
+    # Calculate interval
+    interval = minutes_per_post(autopost, platform)
+
+    downtime_start = autopost.get('downtime_start')
+    downtime_end = autopost.get('downtime_end')
+
+    upload_times = []
+    for _ in range(count):
+        # Add random fluctuation (±20%), in UTC so DST changes do not shift the interval
+        fluctuation = random.uniform(-JITTER, JITTER)
+        next_upload = base_time_dt + timedelta(minutes=interval * (1 + fluctuation))
+
+        if downtime_start and downtime_end:
+            next_upload = avoid_downtime(next_upload, downtime_start, downtime_end, zone)
+
+        upload_times.append(format_utc(next_upload))
+        base_time_dt = next_upload
+
+    return upload_times
+
+
+def replan_times(account, times, after=None):
+    """
+    Fit an account's pending post times (UTC strings, earliest first) to
+    its current cadence in one pass. A time is kept if it lies within the
+    jittered interval after the post before it (`after` for the first, as
+    a UTC string, else the last upload) and outside downtime, otherwise it
+    moves to a slot planned from that post. Pending posts may go to any
+    platform, so the slowest platform's interval applies.
+    Returns the new times, same order.
+    """
+    autopost = account.get('autoposting_properties', {})
+    zone = get_zone(account_timezone(account))
+    interval = timedelta(minutes=minutes_per_post(autopost))
+    downtime_start = autopost.get('downtime_start')
+    downtime_end = autopost.get('downtime_end')
+    now = datetime.now(timezone.utc)
+
+    previous = after or account.get('last_upload_time')
+    result = []
+    for value in times:
+        moment = parse_iso(value)
+        base = max(parse_iso(previous), now) if previous else now
+        earliest = parse_iso(previous) + interval * (1 - JITTER) if previous else None
+        fits = ((earliest is None or moment >= earliest) and moment <= base + interval * (1 + JITTER)
+                and not (downtime_start and downtime_end
+                         and downtime_window_end(moment, downtime_start, downtime_end, zone)))
+        if not fits:
+            value = plan_upload_times(account, 1, after=format_utc(base))[0]
+        result.append(value)
+        previous = value
+    return result
+
+
+def _downtime_window(day, start, end, zone):
+    """Downtime starting on local `day` as UTC datetimes, an end before the start is the next day"""
+    end_day = day + timedelta(days=1) if end < start else day
+    return (datetime.combine(day, start, tzinfo=zone).astimezone(timezone.utc),
+            datetime.combine(end_day, end, tzinfo=zone).astimezone(timezone.utc))
+
+
+def downtime_window_end(upload_time, downtime_start, downtime_end, zone):
+    """
+    End (UTC) of the downtime window (HH:MM wall times in zone) an aware
+    upload time falls into, None outside of it.
+    """
+    start_hour, start_min = map(int, downtime_start.split(':'))
+    end_hour, end_min = map(int, downtime_end.split(':'))
+    start, end = time(start_hour, start_min), time(end_hour, end_min)
+
+    upload_time = upload_time.astimezone(timezone.utc)
+    day = upload_time.astimezone(zone).date()
+
+    # The window that starts today, or the one from yesterday running past midnight
+    for window_day in (day, day - timedelta(days=1)):
+        window_start, window_end = _downtime_window(window_day, start, end, zone)
+        if window_start <= upload_time < window_end:
+            return window_end
+
+    return None
+
+
+def avoid_downtime(upload_time, downtime_start, downtime_end, zone):
+    """
+    Move an upload time out of the downtime window (HH:MM wall times in zone)
+    to a few random minutes after it ends. Works on aware datetimes, returns UTC.
+    """
+    window_end = downtime_window_end(upload_time, downtime_start, downtime_end, zone)
+    if window_end:
+        return window_end + timedelta(minutes=random.randint(5, 30))
+    return upload_time.astimezone(timezone.utc)
@@ -0,0 +1,27 @@
+from functools import lru_cache
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+# Zone for accounts that do not set one, downtime windows used to be CET only
+DEFAULT_TIMEZONE = 'Europe/Berlin'
+
+
+@lru_cache(maxsize=None)
+def get_zone(name=DEFAULT_TIMEZONE):
+    """ZoneInfo for an IANA name, built once per name"""
+    return ZoneInfo(name)
+
+
+def is_valid_timezone(name):
+    if not isinstance(name, str) or not name:
+        return False
+    try:
+        get_zone(name)
+        return True
+    except (ZoneInfoNotFoundError, ValueError):
+        return False
+
+
+def account_timezone(account):
+    """The zone an account's downtime window and times are read in"""
+    autopost = account.get('autoposting_properties') or {}
+    return autopost.get('timezone') or DEFAULT_TIMEZONE
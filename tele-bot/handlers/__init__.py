@@ -8,9 +8,10 @@ from .account import (
 )
 from .settings import (
     settings_start, settings_choice, update_is_ai, update_autopost_enabled,
-    update_autopost_frequency, update_autopost_daily_posts, update_platforms, update_downtime_hours,
+    update_autopost_frequency, update_autopost_daily_posts, update_platforms, update_downtime_hours, update_timezone,
     WAITING_SETTING_CHOICE, WAITING_IS_AI_UPDATE, WAITING_AUTOPOST_ENABLED_UPDATE,
-    WAITING_AUTOPOST_FREQUENCY_UPDATE, WAITING_AUTOPOST_DAILY_POSTS_UPDATE, WAITING_PLATFORMS_UPDATE, WAITING_DOWNTIME_HOURS
+    WAITING_AUTOPOST_FREQUENCY_UPDATE, WAITING_AUTOPOST_DAILY_POSTS_UPDATE, WAITING_PLATFORMS_UPDATE, WAITING_DOWNTIME_HOURS,
+    WAITING_TIMEZONE_UPDATE
 )
 from .ai import list_models, select_model, ai_command
 from .common import start, cancel, list_commands, conversation_timeout
@@ -40,7 +41,7 @@ __all__ = [
     'add_account_is_ai', 'add_account_autopost_enabled', 'add_account_autopost_frequency',
     'add_account_autopost_daily_posts', 'list_accounts', 'delete_account',
     'settings_start', 'settings_choice', 'update_is_ai', 'update_autopost_enabled', 'update_downtime_hours',
-    'update_autopost_frequency', 'update_autopost_daily_posts', 'update_platforms',
+    'update_autopost_frequency', 'update_autopost_daily_posts', 'update_platforms', 'update_timezone',
     'list_models', 'select_model', 'ai_command',
     'upload_start', 'upload_receive_video', 'upload_ai_choice', 'upload_ai_prompt', 'upload_caption',
     'schedule_start', 'schedule_ai_choice', 'schedule_ai_prompt', 'schedule_keep_caption', 'schedule_new_caption',
@@ -52,6 +53,6 @@ __all__ = [
     'WAITING_VIDEO', 'WAITING_CAPTION', 'WAITING_USERNAME', 'WAITING_PLATFORMS',
     'WAITING_IS_AI', 'WAITING_AUTOPOST_ENABLED', 'WAITING_AUTOPOST_FREQUENCY', 'WAITING_AUTOPOST_DAILY_POSTS',
     'WAITING_SETTING_CHOICE', 'WAITING_IS_AI_UPDATE', 'WAITING_AUTOPOST_ENABLED_UPDATE', 'WAITING_DOWNTIME_HOURS',
-    'WAITING_AUTOPOST_FREQUENCY_UPDATE', 'WAITING_AUTOPOST_DAILY_POSTS_UPDATE', 'WAITING_PLATFORMS_UPDATE',
+    'WAITING_AUTOPOST_FREQUENCY_UPDATE', 'WAITING_AUTOPOST_DAILY_POSTS_UPDATE', 'WAITING_PLATFORMS_UPDATE', 'WAITING_TIMEZONE_UPDATE',
     'WAITING_GROUP_NAME', 'WAITING_GROUP_ACCOUNTS', 'WAITING_GROUP_VIDEO'
 ]
\ No newline at end of file
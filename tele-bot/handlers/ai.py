@@ -4,6 +4,7 @@ from telegram import Update
 from telegram.ext import ContextTypes
 from auth import require_auth
 from dotenv import load_dotenv
+from utils.api_client import post_with_backoff
 
 load_dotenv()
 
@@ -68,7 +69,7 @@ async def ai_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     model = user_models.get(user_id, 'x-ai/grok-4-fast')
     
     try:
-        response = requests.post(
+        response = await post_with_backoff(
             f'{API_URL}/inference',
             json={'text': text, 'model': model},
             headers={'Authorization': f'Bearer {API_TOKEN}'}
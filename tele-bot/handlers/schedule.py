@@ -7,7 +7,8 @@ from telegram import Update
 from telegram.ext import ContextTypes, ConversationHandler
 from handlers.ai import user_models
 from utils.upload_parser import response_formatting
-from utils.determine_time import cet_to_utc
+from utils.api_client import post_idempotent, post_with_backoff, new_idempotency_key
+from scheduling_core import local_to_utc, account_timezone
 
 load_dotenv()
 
@@ -98,13 +99,14 @@ async def schedule_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
             scheduled_date = 'auto'
             await message.reply_text('🤖 Auto-scheduling enabled (backend will calculate optimal time)')
         else:
+            timezone = account_timezone(account)
             try:
-                scheduled_date = cet_to_utc(scheduled_date_input)  # Still convert CET → UTC
-                await message.reply_text(f'📅 Scheduled for: {scheduled_date_input} CET')
+                scheduled_date = local_to_utc(scheduled_date_input, timezone)  # Account's local time → UTC
+                await message.reply_text(f'📅 Scheduled for: {scheduled_date_input} ({timezone})')
             except Exception as e:
                 await message.reply_text(
                     '❌ Invalid datetime format.\n'
-                    'Use: YYYY-MM-DDTHH:MM:SS (CET)\n'
+                    f'Use: YYYY-MM-DDTHH:MM:SS ({timezone})\n'
                     'Example: 2025-11-18T17:30:00\n'
                     f'Error: {e}'
                 )
@@ -188,7 +190,7 @@ async def schedule_ai_prompt(update: Update, context: ContextTypes.DEFAULT_TYPE)
     try:
         await message.reply_text('🤖 Generating caption...')
         
-        response = requests.post(
+        response = await post_with_backoff(
             f'{API_URL}/inference',
             json={'text': full_prompt, 'model': model},
             headers={'Authorization': f'Bearer {API_TOKEN}'}
@@ -247,57 +249,50 @@ async def finalize_schedule(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
     
     try:
-        file = await context.bot.get_file(video['video_id'])
-        video_path = f'/tmp/{video["video_id"]}.mp4'
-        await file.download_to_drive(video_path)
+        upload_key = new_idempotency_key()
+        optional_params = {}
+        if account.get('is_ai'):
+            optional_params['is_aigc'] = True
         
-        try:
-            optional_params = {}
-            if account.get('is_ai'):
-                optional_params['is_aigc'] = True
-            
-            with open(video_path, 'rb') as f:
-                upload_response = requests.post(
-                    f'{API_URL}/upload-video',
-                    files={'video': (f'{video["video_id"]}.mp4', f, 'video/mp4')},
-                    data={
-                        'title': caption,
-                        'user': account['username'],
-                        'user_id': str(user_id),
-                        'platforms': json.dumps(account['platforms']),
-                        'video_id': video['video_id'],
-                        'scheduled_date': scheduled_date,
-                        'params': json.dumps(optional_params) if optional_params else None
-                    },
-                    headers={
-                        'Authorization': f'Bearer {API_TOKEN}',
-                        'X-Source': 'telegram'
-                    }
-                )
-                
-                result = upload_response.json()
-                if upload_response.status_code == 202 and result.get('job_id'):
-                    job_id = result['job_id']
-                    
-                    # Store job in database
-                    requests.post(
-                        f'{API_URL}/track-job',
-                        json={
-                            'job_id': job_id,
-                            'video_id': video['video_id'],
-                            'account_username': account['username'],
-                            'user_id': str(user_id),
-                            'scheduled_date': scheduled_date
-                        },
-                        headers={'Authorization': f'Bearer {API_TOKEN}'}
-                    )
-                
-            msg = response_formatting(upload_response)
-            await message.reply_text(msg)
+        # The endpoint serves the file from its media library (or fetches it from Telegram)
+        upload_response = await post_idempotent(
+            f'{API_URL}/upload-video',
+            upload_key,
+            data={
+                'title': caption,
+                'user': account['username'],
+                'user_id': str(user_id),
+                'platforms': json.dumps(account['platforms']),
+                'video_id': video['video_id'],
+                'scheduled_date': scheduled_date,
+                'params': json.dumps(optional_params) if optional_params else None
+            },
+            headers={
+                'Authorization': f'Bearer {API_TOKEN}',
+                'X-Source': 'telegram'
+            }
+        )
+        
+        result = upload_response.json()
+        if upload_response.status_code == 202 and result.get('job_id'):
+            job_id = result['job_id']
             
-        finally:
-            if os.path.exists(video_path):
-                os.remove(video_path)
+            # Store job in database
+            await post_idempotent(
+                f'{API_URL}/track-job',
+                f'track-{job_id}',
+                json={
+                    'job_id': job_id,
+                    'video_id': video['video_id'],
+                    'account_username': account['username'],
+                    'user_id': str(user_id),
+                    'scheduled_date': scheduled_date
+                },
+                headers={'Authorization': f'Bearer {API_TOKEN}'}
+            )
+        
+        msg = response_formatting(upload_response, account_timezone(account))
+        await message.reply_text(msg)
                 
     except Exception as e:
         await message.reply_text(f'❌ Error: {str(e)}')
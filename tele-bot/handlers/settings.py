@@ -3,6 +3,7 @@ import requests
 from telegram import Update
 from telegram.ext import ContextTypes, ConversationHandler
 from auth import require_auth
+from scheduling_core import utc_to_local, account_timezone, is_valid_timezone
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -17,6 +18,7 @@ WAITING_AUTOPOST_FREQUENCY_UPDATE = 4
 WAITING_AUTOPOST_DAILY_POSTS_UPDATE = 5
 WAITING_PLATFORMS_UPDATE = 6
 WAITING_DOWNTIME_HOURS = 7
+WAITING_TIMEZONE_UPDATE = 8
 
 # Platform daily post limits
 PLATFORM_LIMITS = {
@@ -80,12 +82,14 @@ async def settings_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         is_ai = '🤖 Yes' if account.get('is_ai') else '❌ No'
         autopost = account.get('autoposting_properties', {})
         autopost_enabled = '🔄 Enabled' if autopost.get('enabled') else '❌ Disabled'
+        timezone = account_timezone(account)
         
         settings_text = (
             f'⚙️ Settings for {username}\n\n'
             f'Platforms: {platforms}\n'
             f'AI Content: {is_ai}\n'
             f'Autoposting: {autopost_enabled}\n'
+            f'Timezone: {timezone}\n'
         )
         
         if autopost.get('enabled'):
@@ -95,12 +99,29 @@ async def settings_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 f'  • Frequency: {autopost.get("posting_frequency")}\n'
                 f'  • Posts/day: {posts_summary}\n'
             )
-        
+
+            # Upcoming slots come precomputed from the account's schedule horizon
+            preview = requests.get(
+                f'{API_URL}/schedule-preview',
+                params={'user_id': str(user_id), 'username': username, 'count': 3},
+                headers={'Authorization': f'Bearer {API_TOKEN}'}
+            )
+            if preview.status_code == 200 and preview.json().get('slots'):
+                data = preview.json()
+                # Each slot belongs to one platform's stream, None when the account has a single one
+                platforms = data.get('platforms') or [None] * len(data['slots'])
+                slots = ', '.join(
+                    utc_to_local(s, timezone)[5:16].replace('T', ' ') + (f' {p}' if p else '')
+                    for s, p in zip(data['slots'], platforms)
+                )
+                settings_text += f'  • Next slots ({timezone}): {slots}\n'
+
         settings_text += (
             '\nWhat would you like to change?\n\n'
             '1️⃣ AI Content setting\n'
             '2️⃣ Autoposting settings\n'
             '3️⃣ Platforms\n'  
+            '4️⃣ Timezone\n'
             '❌ Cancel\n\n'
             'Reply with the number:'
         )
@@ -154,8 +175,18 @@ async def settings_choice(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
         return WAITING_PLATFORMS_UPDATE
     
+    elif choice == '4':
+        # Update timezone, downtime and scheduled times are read in it
+        account = context.user_data.get('settings_account', {})
+        await message.reply_text(
+            f'Current timezone: {account_timezone(account)}\n\n'
+            f'Enter a timezone name:\n'
+            f'Example: Europe/Berlin, America/New_York, Asia/Tokyo'
+        )
+        return WAITING_TIMEZONE_UPDATE
+    
     else:
-        await message.reply_text('Invalid choice. Reply with 1, 2, or 3:')
+        await message.reply_text('Invalid choice. Reply with 1, 2, 3, or 4:')
         return WAITING_SETTING_CHOICE
 
 
@@ -332,9 +363,10 @@ async def update_downtime_hours(update: Update, context: ContextTypes.DEFAULT_TY
         context.user_data['downtime_start'] = downtime_start
         context.user_data['downtime_end'] = downtime_end
         
+        account = context.user_data.get('settings_account', {})
         await message.reply_text(
             f'✅ Downtime set: {downtime_hours} hours\n'
-            f'Window: {downtime_start} - {downtime_end} CET\n\n'
+            f'Window: {downtime_start} - {downtime_end} {account_timezone(account)}\n\n'
             f'Finalizing settings...'
         )
         
@@ -400,6 +432,51 @@ async def update_platforms(update: Update, context: ContextTypes.DEFAULT_TYPE):
     return ConversationHandler.END
 
 
+async def update_timezone(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Update the account's timezone"""
+    message = update.effective_message
+    if not message or not message.text or not update.effective_user or not context.user_data:
+        return WAITING_TIMEZONE_UPDATE
+    
+    timezone = message.text.strip()
+    if not is_valid_timezone(timezone):
+        await message.reply_text(
+            f'❌ Unknown timezone: {timezone}\n\n'
+            f'Use a name like Europe/Berlin or America/New_York.\n'
+            f'Please try again:'
+        )
+        return WAITING_TIMEZONE_UPDATE
+    
+    # The rest of the autoposting settings stay as they are
+    account = context.user_data.get('settings_account', {})
+    autoposting_properties = dict(account.get('autoposting_properties') or {})
+    autoposting_properties['timezone'] = timezone
+    username = context.user_data.get('settings_username')
+    user_id = update.effective_user.id
+    
+    try:
+        response = requests.patch(
+            f'{API_URL}/update-account',
+            json={
+                'user_id': str(user_id),
+                'username': username,
+                'autoposting_properties': autoposting_properties
+            },
+            headers={'Authorization': f'Bearer {API_TOKEN}'}
+        )
+        
+        if response.status_code == 200:
+            await message.reply_text(f'✅ Timezone updated to: {timezone}')
+        else:
+            await message.reply_text(f'❌ Error: {response.json().get("error")}')
+    
+    except Exception as e:
+        await message.reply_text(f'❌ Error: {str(e)}')
+    
+    context.user_data.clear()
+    return ConversationHandler.END
+
+
 async def finalize_autopost_update(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Save autoposting settings"""
     message = update.effective_message
@@ -424,6 +501,12 @@ async def finalize_autopost_update(update: Update, context: ContextTypes.DEFAULT
         autoposting_properties['downtime_start'] = context.user_data.get('downtime_start')  # ADD
         autoposting_properties['downtime_end'] = context.user_data.get('downtime_end')  # ADD
     
+    # Keep the account's timezone, it is changed on its own
+    account = context.user_data.get('settings_account', {})
+    timezone = account_timezone(account)
+    if (account.get('autoposting_properties') or {}).get('timezone'):
+        autoposting_properties['timezone'] = timezone
+    
     try:
         response = requests.patch(
             f'{API_URL}/update-account',
@@ -441,7 +524,7 @@ async def finalize_autopost_update(update: Update, context: ContextTypes.DEFAULT
             if autopost_enabled:
                 summary += 'Status: Enabled\n'
                 summary += f'Frequency: {autoposting_properties["posting_frequency"]}\n'
-                summary += f'Downtime: {autoposting_properties.get("downtime_start")} - {autoposting_properties.get("downtime_end")} CET\n'
+                summary += f'Downtime: {autoposting_properties.get("downtime_start")} - {autoposting_properties.get("downtime_end")} {timezone}\n'
                 summary += 'Posts/day:\n'
                 for platform, count in autoposting_properties['daily_posts'].items():
                     summary += f'  • {platform}: {count}\n'
@@ -7,6 +7,8 @@ from telegram import Update
 from telegram.ext import ContextTypes, ConversationHandler
 from handlers.ai import user_models
 from utils.upload_parser import response_formatting
+from scheduling_core import account_timezone
+from utils.api_client import post_idempotent, post_with_backoff, new_idempotency_key, video_media
 
 load_dotenv()
 
@@ -102,6 +104,7 @@ async def upload_receive_video(update: Update, context: ContextTypes.DEFAULT_TYP
     
     assert context.user_data is not None
     context.user_data['upload_video_id'] = message.video.file_id
+    context.user_data['upload_video_media'] = video_media(video)
     
     await message.reply_text('Generate caption with AI? (yes/no):')
     return WAITING_UPLOAD_AI_CHOICE
@@ -140,7 +143,7 @@ async def upload_ai_prompt(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
         await message.reply_text('🤖 Generating caption...')
         
-        response = requests.post(
+        response = await post_with_backoff(
             f'{API_URL}/inference',
             json={'text': full_prompt, 'model': model},
             headers={'Authorization': f'Bearer {API_TOKEN}'}
@@ -199,7 +202,8 @@ async def finalize_upload(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 'video_id': video_id,
                 'caption': caption,
                 'user_id': str(user_id),
-                'status': 'uploading'
+                'status': 'uploading',
+                **context.user_data.get('upload_video_media', {})
             },
             headers={'Authorization': f'Bearer {API_TOKEN}'}
         )
@@ -208,39 +212,31 @@ async def finalize_upload(update: Update, context: ContextTypes.DEFAULT_TYPE):
             await message.reply_text('❌ Failed to register video')
             return ConversationHandler.END
         
-        file = await context.bot.get_file(video_id)
-        video_path = f'/tmp/{video_id}.mp4'
-        await file.download_to_drive(video_path)
+        upload_key = new_idempotency_key()
+        optional_params = {}
+        if account.get('is_ai'):
+            optional_params['is_aigc'] = True
         
-        try:
-            optional_params = {}
-            if account.get('is_ai'):
-                optional_params['is_aigc'] = True
-            
-            with open(video_path, 'rb') as f:
-                upload_response = requests.post(
-                    f'{API_URL}/upload-video',
-                    files={'video': (f'{video_id}.mp4', f, 'video/mp4')},
-                    data={
-                        'title': caption,
-                        'user': account['username'],
-                        'user_id': str(user_id),
-                        'platforms': json.dumps(account['platforms']),
-                        'video_id': video_id,
-                        'params': json.dumps(optional_params) if optional_params else None
-                    },
-                    headers={
-                        'Authorization': f'Bearer {API_TOKEN}',
-                        'X-Source': 'telegram'
-                    }
-                )
-            
-            msg = response_formatting(upload_response)
-            await message.reply_text(msg)
-            
-        finally:
-            if os.path.exists(video_path):
-                os.remove(video_path)
+        # The endpoint serves the file from its media library (or fetches it from Telegram)
+        upload_response = await post_idempotent(
+            f'{API_URL}/upload-video',
+            upload_key,
+            data={
+                'title': caption,
+                'user': account['username'],
+                'user_id': str(user_id),
+                'platforms': json.dumps(account['platforms']),
+                'video_id': video_id,
+                'params': json.dumps(optional_params) if optional_params else None
+            },
+            headers={
+                'Authorization': f'Bearer {API_TOKEN}',
+                'X-Source': 'telegram'
+            }
+        )
+        
+        msg = response_formatting(upload_response, account_timezone(account))
+        await message.reply_text(msg)
                 
     except Exception as e:
         await message.reply_text(f'❌ Error: {str(e)}')
@@ -1,10 +1,12 @@
 import os
+import asyncio
 
 import requests
 from auth import require_auth
 from dotenv import load_dotenv
-from telegram import Update
+from telegram import Update, InputMediaPhoto
 from telegram.ext import ContextTypes, ConversationHandler
+from utils.api_client import video_media
 
 load_dotenv()
 
@@ -42,6 +44,42 @@ async def fetch_accounts(user_id):
     return None
 
 
+def fetch_thumbnail(video_id):
+    """Thumbnail bytes from the API, None if it has none (yet)"""
+    try:
+        response = requests.get(
+            f'{API_URL}/video-thumbnail/{video_id}',
+            headers={'Authorization': f'Bearer {API_TOKEN}'},
+            timeout=10
+        )
+    except requests.RequestException:
+        return None
+    
+    if response.status_code == 200:
+        return response.content
+    return None
+
+
+async def send_thumbnails(message, videos):
+    """Show thumbnails of the first listed videos, numbered like the text list"""
+    videos = videos[:10]
+    # Fetched in parallel off the event loop, other chats keep being served meanwhile
+    thumbnails = await asyncio.gather(*(
+        asyncio.to_thread(fetch_thumbnail, video['video_id']) if video.get('thumbnail_path')
+        else asyncio.sleep(0, result=None)
+        for video in videos
+    ))
+    media = []
+    for i, (video, thumbnail) in enumerate(zip(videos, thumbnails), 1):
+        if thumbnail:
+            media.append(InputMediaPhoto(thumbnail, caption=f"{i}. {video['caption'][:100]}"))
+    
+    if len(media) > 1:
+        await message.reply_media_group(media)
+    elif media:
+        await message.reply_photo(media[0].media, caption=media[0].caption)
+
+
 # ==== ADD VIDEO ====
 @require_auth
 async def add_video_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -82,6 +120,7 @@ async def add_video_receive(update: Update, context: ContextTypes.DEFAULT_TYPE):
     # Store video info
     video_id = video.file_id
     context.user_data['video_id'] = video_id # type: ignore
+    context.user_data['video_media'] = video_media(video) # type: ignore
     
     return WAITING_CAPTION
 
@@ -122,7 +161,8 @@ async def add_video_reusable(update: Update, context: ContextTypes.DEFAULT_TYPE)
                 'video_id': video_id,
                 'caption': caption,
                 'user_id': str(user_id),
-                'reusable': reusable  # ADD THIS
+                'reusable': reusable,  # ADD THIS
+                **context.user_data.get('video_media', {})
             },
             headers={'Authorization': f'Bearer {API_TOKEN}'}
         )
@@ -171,6 +211,7 @@ async def list_videos(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 message += f"{i}. {caption}\n ID: {video['video_id'][:]}\n\n"
                 
             await update.message.reply_text(message)
+            await send_thumbnails(update.message, videos)
         else:
             await update.message.reply_text('Failed to fetch videos')
             
@@ -8,7 +8,7 @@ from handlers import (
     add_account_start, add_account_username, add_account_platforms, add_account_is_ai,
     add_account_autopost_enabled, add_account_autopost_frequency, add_account_autopost_daily_posts,
     list_accounts, delete_account,
-    settings_start, settings_choice, update_is_ai, update_autopost_enabled, update_platforms, update_downtime_hours,
+    settings_start, settings_choice, update_is_ai, update_autopost_enabled, update_platforms, update_downtime_hours, update_timezone,
     update_autopost_frequency, update_autopost_daily_posts,
     list_models, select_model, ai_command,
     upload_start, upload_receive_video, upload_ai_choice, upload_ai_prompt, upload_caption,
@@ -21,7 +21,7 @@ from handlers import (
     WAITING_VIDEO, WAITING_CAPTION, WAITING_USERNAME, WAITING_PLATFORMS, WAITING_REUSABLE,
     WAITING_IS_AI, WAITING_AUTOPOST_ENABLED, WAITING_AUTOPOST_FREQUENCY, WAITING_AUTOPOST_DAILY_POSTS,
     WAITING_SETTING_CHOICE, WAITING_IS_AI_UPDATE, WAITING_AUTOPOST_ENABLED_UPDATE, WAITING_DOWNTIME_HOURS,
-    WAITING_AUTOPOST_FREQUENCY_UPDATE, WAITING_AUTOPOST_DAILY_POSTS_UPDATE, WAITING_PLATFORMS_UPDATE,
+    WAITING_AUTOPOST_FREQUENCY_UPDATE, WAITING_AUTOPOST_DAILY_POSTS_UPDATE, WAITING_PLATFORMS_UPDATE, WAITING_TIMEZONE_UPDATE,
     WAITING_GROUP_NAME, WAITING_GROUP_ACCOUNTS, WAITING_GROUP_VIDEO
 )
 
@@ -74,6 +74,7 @@ def main():
             WAITING_AUTOPOST_DAILY_POSTS_UPDATE: [MessageHandler(filters.TEXT & ~filters.COMMAND, update_autopost_daily_posts)],
             WAITING_DOWNTIME_HOURS: [MessageHandler(filters.TEXT & ~filters.COMMAND, update_downtime_hours)],
             WAITING_PLATFORMS_UPDATE: [MessageHandler(filters.TEXT & ~filters.COMMAND, update_platforms)],
+            WAITING_TIMEZONE_UPDATE: [MessageHandler(filters.TEXT & ~filters.COMMAND, update_timezone)],
             ConversationHandler.TIMEOUT: [MessageHandler(filters.ALL, conversation_timeout)]
         },
         fallbacks=[CommandHandler('cancel', cancel)],
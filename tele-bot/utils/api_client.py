@@ -0,0 +1,93 @@
+import uuid
+import asyncio
+import datetime as dtm
+import requests
+
+RETRIES = 2
+RETRY_DELAY = 2
+# Longer waits than this are reported to the user instead of blocking the handler
+MAX_RETRY_AFTER = 30
+
+
+def new_idempotency_key():
+    """One key per logical operation, reused across its retries"""
+    return str(uuid.uuid4())
+
+
+def video_media(video):
+    """Stable id and metadata Telegram already reports for a video, in the shape /add-video takes"""
+    duration = video.duration
+    if isinstance(duration, dtm.timedelta):
+        duration = duration.total_seconds()
+    return {
+        'file_unique_id': video.file_unique_id,
+        'duration': duration,
+        'width': video.width,
+        'height': video.height
+    }
+
+
+def retry_after(response):
+    """
+    Seconds the API asked to wait before retrying - on 429 (shedding load) and
+    503 (upstream down). None if the response should not be retried.
+    """
+    value = response.headers.get('Retry-After')
+    if response.status_code not in [429, 503] or value is None:
+        return None
+    try:
+        seconds = float(value)
+    except ValueError:
+        return None
+    return seconds if seconds <= MAX_RETRY_AFTER else None
+
+
+async def post_with_backoff(url, retries=RETRIES, **kwargs):
+    """
+    POST that waits out Retry-After on 429/503, for requests without side
+    effects. The request and the wait run off the event loop, so other
+    users' updates keep being handled.
+    """
+    for attempt in range(retries + 1):
+        response = await asyncio.to_thread(requests.post, url, **kwargs)
+        wait = retry_after(response)
+        if wait is None or attempt == retries:
+            return response
+        await asyncio.sleep(wait)
+
+
+async def post_idempotent(url, idempotency_key, headers=None, files=None, retries=RETRIES, **kwargs):
+    """
+    POST with an Idempotency-Key header, retrying on network errors and
+    honouring Retry-After on 409, 429 and 503.
+    The API replays the first response for a repeated key, so a retry after a
+    lost response does not upload the video twice.
+    """
+    headers = dict(headers or {})
+    headers['Idempotency-Key'] = idempotency_key
+
+    for attempt in range(retries + 1):
+        if files and attempt:
+            for value in files.values():
+                if isinstance(value, tuple) and hasattr(value[1], 'seek'):
+                    value[1].seek(0)
+        try:
+            response = await asyncio.to_thread(requests.post, url, headers=headers, files=files, **kwargs)
+        except (requests.ConnectionError, requests.Timeout):
+            if attempt == retries:
+                raise
+            await asyncio.sleep(RETRY_DELAY * (attempt + 1))
+            continue
+
+        # The first attempt is still running on the server, wait for its result
+        if response.status_code == 409 and 'Retry-After' in response.headers and attempt < retries:
+            await asyncio.sleep(float(response.headers['Retry-After']))
+            continue
+
+        # Shed or upstream down - rejected before anything was sent, so the same key is safe to reuse
+        wait = retry_after(response)
+        if wait is not None and attempt < retries:
+            await asyncio.sleep(wait)
+            continue
+
+        return response
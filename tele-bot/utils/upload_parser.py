@@ -1,5 +1,5 @@
 import requests
-from .determine_time import utc_to_cet
+from scheduling_core import DEFAULT_TIMEZONE, utc_to_local
 
 
 def format_warnings(warnings: list) -> str:
@@ -22,7 +22,7 @@ def format_warnings(warnings: list) -> str:
     return '\n\n' + '\n'.join(warning_lines)
 
 
-def response_formatting(response: requests.Response) -> str:
+def response_formatting(response: requests.Response, timezone: str = DEFAULT_TIMEZONE) -> str:
     try:
         result = response.json()
     except Exception:
@@ -36,7 +36,7 @@ def response_formatting(response: requests.Response) -> str:
         # Check if this is a scheduled upload
         if result.get('scheduled') or (result.get('job_id') and result.get('scheduled_date')):
             scheduled_date = result.get('scheduled_date', 'Unknown')
-            scheduled_date = utc_to_cet(scheduled_date)
+            scheduled_date = utc_to_local(scheduled_date, timezone)
             return f"📅 Scheduled!\n\nWill be posted at: {scheduled_date}{warnings_text}"
         
         # Check if this is an async background upload